@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+解析耗时基准测试：完整页面 vs 裁剪后的仓库列表片段
+默认使用仓库自带的 github_trending_structure.html
+
+运行: python3 bench_parse.py [HTML文件] [重复次数]
+"""
+
+import gzip
+import statistics
+import sys
+import time
+
+from github_trending_scraper_with_telegram import parse_repositories
+from page_trim import trim_repo_list
+
+DEFAULT_SAMPLE = "github_trending_structure.html"
+
+
+def timed(func, rounds):
+    """返回每轮耗时（毫秒）列表"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SAMPLE
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with open(path, "rb") as f:
+        html = f.read()
+    trimmed = trim_repo_list(html)
+
+    full_repos = parse_repositories(html, trim=False)
+    trimmed_repos = parse_repositories(html)
+    if [r.to_dict() for r in full_repos] != [r.to_dict() for r in trimmed_repos]:
+        print("❌ 裁剪前后解析结果不一致")
+        sys.exit(1)
+
+    print("=" * 60)
+    print(f"Parse benchmark: {path} ({len(full_repos)} repos, {rounds} rounds)")
+    print("=" * 60)
+    print(f"page size     {len(html):>9,} bytes  (gzip {len(gzip.compress(html)):,} bytes on the wire)")
+    print(f"trimmed slice {len(trimmed):>9,} bytes  ({len(trimmed) / len(html):.1%} of page)")
+
+    trim_ms = statistics.median(timed(lambda: trim_repo_list(html), rounds))
+    full_ms = statistics.median(timed(lambda: parse_repositories(html, trim=False), rounds))
+    trimmed_ms = statistics.median(timed(lambda: parse_repositories(html), rounds))
+    print(f"byte scan     {trim_ms:9.3f} ms")
+    print(f"full parse    {full_ms:9.2f} ms")
+    print(f"trimmed parse {trimmed_ms:9.2f} ms  ({full_ms / trimmed_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
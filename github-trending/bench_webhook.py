@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+轮询模式 vs Webhook 模式的 "更新 -> 回复" 延迟基准测试
+使用本地模拟的 Telegram 服务（fake_telegram.py），不访问外部网络
+
+运行: python3 bench_webhook.py [更新数量]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes
+
+from fake_telegram import FakeTelegramServer, make_command_update
+from webhook_server import WebhookServer
+
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_SECRET = "bench-secret"
+
+
+async def pong(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text("pong")
+
+
+def build_application(fake):
+    application = Application.builder().token(FAKE_TOKEN).base_url(fake.base_url).build()
+    application.add_handler(CommandHandler("help", pong))
+    return application
+
+
+async def measure(fake, count):
+    """逐条投递 /help 更新，记录从投递到收到 sendMessage 的延迟（毫秒）"""
+    latencies = []
+    for i in range(count):
+        chat_id = 10_000 + i
+        reply = fake.expect_message(chat_id)
+        started = time.perf_counter()
+        await fake.push_update(make_command_update(fake.next_update_id(), chat_id))
+        received_at = await asyncio.wait_for(reply, timeout=30)
+        latencies.append((received_at - started) * 1000)
+    return latencies
+
+
+async def bench_polling(count):
+    fake = await FakeTelegramServer().start()
+    application = build_application(fake)
+    await application.initialize()
+    await application.updater.start_polling(poll_interval=0.0, timeout=10)
+    await application.start()
+    try:
+        return await measure(fake, count)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await fake.stop()
+
+
+async def bench_webhook(count):
+    fake = await FakeTelegramServer().start()
+    application = build_application(fake)
+    server = WebhookServer(application, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    await application.initialize()
+    await application.start()
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    await application.bot.set_webhook(f"http://127.0.0.1:{port}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET)
+    try:
+        return await measure(fake, count)
+    finally:
+        await server.stop()
+        await application.stop()
+        await application.shutdown()
+        await fake.stop()
+
+
+def summarize(name, latencies):
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<8} n={len(latencies):<5} "
+          f"mean={statistics.fmean(latencies):7.2f}ms  p50={quantiles[49]:7.2f}ms  "
+          f"p95={quantiles[94]:7.2f}ms  p99={quantiles[98]:7.2f}ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("=" * 60)
+    print("Update -> reply latency: polling vs webhook")
+    print("=" * 60)
+    summarize("polling", asyncio.run(bench_polling(count)))
+    summarize("webhook", asyncio.run(bench_webhook(count)))
+
+
+if __name__ == "__main__":
+    main()
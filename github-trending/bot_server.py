@@ -6,17 +6,58 @@ Telegram Bot for GitHub Trending Scraper
 """
 
 import requests
-from bs4 import BeautifulSoup
-import re
 from datetime import datetime
 import os
 import subprocess
-import json
+import hashlib
+import asyncio
+import functools
+import math
+import time
 from pathlib import Path
 
+from render_engine import render_all, ALL_FORMATS, VOLATILE_LINES
+from history_export import append_snapshot
+from output_writer import OutputWriter, write_if_changed
+from feed import update_feed
+from site_generator import update_site
+from history_store import HistoryStore
+from notified_set import NotifiedSet
+from fetch_layer import TrendingFetcher
+from trending_parser import parse_repositories
+from parse_executor import configure_shared_executor, shared_executor, shutdown_shared_executor
+from repo_merge import DEFAULT_SLICE, SliceMerger, slice_cache_path, slice_url
+from http_cassette import CASSETTE_MODES, eject_cassette, use_cassette
+from tracing import setup_tracing, span, trace_event
+from matchers import DEFAULT_AI_KEYWORDS, exclusion_index, keyword_matcher
+from config_watcher import RESTART_REQUIRED_KEYS, ConfigWatcher
+from inline_index import PrefixIndex
+from webhook_server import run_webhook
+from job_queue import JobQueue
+from leader_election import LeaderElector, LeadershipLost
+from profiler import StackSampler, profile_call, to_thread
+from throttle import PipelineSlots, Throttle
+from lane_dispatch import LaneUpdateProcessor
+from chart_service import MATPLOTLIB_AVAILABLE, ChartService
+
 # python-telegram-bot 库
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputMediaPhoto,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.ext import (
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    InlineQueryHandler,
+    MessageHandler,
+    filters,
+)
 
 try:
     from dotenv import load_dotenv
@@ -26,6 +67,9 @@ except ImportError:
     print("⚠️  python-dotenv 未安装，将使用系统环境变量")
     print("   安装: pip install python-dotenv")
 
+DEFAULT_TELEGRAM_API_BASE = "https://api.telegram.org"
+DEFAULT_GITHUB_TRENDING_URL = "https://github.com/trending"
+
 # --- Configuration Loading (Copied from original script) ---
 def load_environment():
     """从.env文件或环境变量加载配置"""
@@ -35,8 +79,54 @@ def load_environment():
         "git_auto_push": True,
         "git_commit_message": "自动更新每日 GitHub 趋势数据",
         "exclude_repos": ["openclaw/openclaw"],
+        "ai_keywords": list(DEFAULT_AI_KEYWORDS),
         "max_repos_in_telegram": 5,
-        "save_filename": "github_trending_ai.md"
+        "save_filename": "github_trending_ai.md",
+        "history_parquet_dir": "",
+        "render_formats": ["markdown", "telegram", "json"],
+        "feed_filename": "github_trending_ai.atom",
+        "feed_state_filename": "github_trending_feed_state.json",
+        "feed_max_items": 50,
+        "feed_seen_days": 90,
+        "site_dir": "",
+        "history_db": "github_trending_history.db",
+        "notify_new_only": False,
+        "notified_dir": "notified",
+        "bot_mode": "polling",
+        "webhook_url": None,
+        "webhook_listen": "0.0.0.0",
+        "webhook_port": 8443,
+        "webhook_path": "/telegram",
+        "webhook_secret": None,
+        "job_queue_db": "",
+        "leader_db": "",
+        "leader_lease_ttl": 30,
+        "scrape_interval_minutes": 0,
+        "telegram_api_base": DEFAULT_TELEGRAM_API_BASE,
+        "github_trending_url": DEFAULT_GITHUB_TRENDING_URL,
+        "trending_slices": [],
+        "parse_workers": 0,
+        "http_cassette": "",
+        "http_cassette_mode": "replay",
+        "trace_file": "",
+        "trace_otlp_endpoint": "",
+        "trace_console": True,
+        "config_watch_files": [".env"],
+        "config_reload_interval": 5,
+        "admin_user_ids": [],
+        "profile_sampler_file": "",
+        "profile_sampler_window": 300,
+        "git_user_burst": 2,
+        "git_user_refill_seconds": 300,
+        "git_chat_burst": 5,
+        "git_chat_refill_seconds": 120,
+        "git_max_concurrent": 1,
+        "fast_lane_concurrency": 32,
+        "heavy_lane_concurrency": 2,
+        "heavy_lane_queue": 8,
+        "star_chart_count": 3,
+        "chart_cache_dir": os.path.join(".cache", "charts"),
+        "chart_cache_max_files": 500
     }
     
     # 尝试从.env文件加载
@@ -62,6 +152,11 @@ def load_environment():
     if exclude_repos_str:
         config["exclude_repos"] = [repo.strip() for repo in exclude_repos_str.split(",") if repo.strip()]
     
+    # AI 相关关键词（逗号分隔，不区分大小写，匹配名称或描述中的子串）
+    ai_keywords_str = os.getenv("AI_KEYWORDS", "")
+    if ai_keywords_str:
+        config["ai_keywords"] = [kw.strip().lower() for kw in ai_keywords_str.split(",") if kw.strip()]
+    
     # 其他配置
     max_repos = os.getenv("MAX_REPOS_IN_TELEGRAM")
     if max_repos and max_repos.isdigit():
@@ -69,196 +164,226 @@ def load_environment():
     
     config["save_filename"] = os.getenv("SAVE_FILENAME", config["save_filename"])
     
-    return config
-
-# --- Scraping Logic (Copied from original script) ---
-def scrape_github_trending():
-    """抓取GitHub Trending页面"""
-    url = "https://github.com/trending"
-    headers = {"User-Agent": "Mozilla/5.0"}
+    # 列式历史导出目录（为空则不导出）
+    config["history_parquet_dir"] = os.getenv("HISTORY_PARQUET_DIR", config["history_parquet_dir"])
     
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.Timeout:
-        print("❌ 请求超时，请检查网络连接")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 获取页面失败: {e}")
-        return None
-
-def parse_repositories(html_content):
-    """解析HTML内容，提取仓库信息"""
-    soup = BeautifulSoup(html_content, "html.parser")
-    repo_elements = soup.find_all("article", class_="Box-row")
+    # 输出格式（markdown/telegram/json 始终生成，可额外启用 html、rss）
+    render_formats_str = os.getenv("RENDER_FORMATS", "")
+    if render_formats_str:
+        extra = [fmt.strip().lower() for fmt in render_formats_str.split(",") if fmt.strip().lower() in ALL_FORMATS]
+        config["render_formats"] = list(dict.fromkeys(config["render_formats"] + extra))
     
-    repositories = []
+    # Atom 订阅源（FEED_FILENAME 为空则不生成）
+    config["feed_filename"] = os.getenv("FEED_FILENAME", config["feed_filename"])
+    config["feed_state_filename"] = os.getenv("FEED_STATE_FILENAME", config["feed_state_filename"])
+    feed_max_items = os.getenv("FEED_MAX_ITEMS")
+    if feed_max_items and feed_max_items.isdigit():
+        config["feed_max_items"] = int(feed_max_items)
+    feed_seen_days = os.getenv("FEED_SEEN_DAYS")
+    if feed_seen_days and feed_seen_days.isdigit():
+        config["feed_seen_days"] = int(feed_seen_days)
     
-    for repo in repo_elements:
-        info = extract_repository_info(repo)
-        if info:
-            repositories.append(info)
+    # 静态归档站点目录（为空则不生成）
+    config["site_dir"] = os.getenv("SITE_DIR", config["site_dir"])
     
-    return repositories
-
-def extract_repository_info(repo_element):
-    """从仓库元素中提取详细信息"""
-    try:
-        # 提取名称和URL
-        h2 = repo_element.find("h2", class_="h3")
-        if not h2:
-            return None
-        
-        a = h2.find("a")
-        if not a:
-            return None
-        
-        name = a.get_text(strip=True).replace(" ", "")
-        url = "https://github.com" + a["href"]
-        
-        # 验证URL
-        if not re.match(r'^https://github\.com/[^/]+/[^/]+$', url):
-            return None
-        
-        # 提取描述
-        description = "N/A"
-        p = repo_element.find("p", class_="col-9")
-        if p:
-            description = p.get_text(strip=True)
-        
-        # 提取星数
-        stars = "0"
-        star_link = repo_element.find("a", href=lambda x: x and "/stargazers" in x)
-        if star_link:
-            stars_text = star_link.get_text(strip=True)
-            stars = stars_text.replace(",", "")
-            if not stars.isdigit():
-                stars = "0"
-        
-        return {
-            "name": name,
-            "url": url,
-            "description": description,
-            "stars": stars
-        }
-    except Exception as e:
-        print(f"⚠️ 提取仓库信息时出错: {e}")
-        return None
-
-def filter_ai_repositories(repositories):
-    """过滤AI/LLM/Agent相关仓库"""
-    ai_keywords = [
-        "ai", "llm", "agent", "machine learning", "deep learning",
-        "neural network", "transformer", "gpt", "chatgpt", "openai",
-        "anthropic", "claude", "gemini", "vector", "embedding", "rag",
-        "language model", "large language model", "ai agent"
-    ]
+    # SQLite 历史库（全文搜索等功能使用，为空则不保存）
+    config["history_db"] = os.getenv("HISTORY_DB", config["history_db"])
     
-    filtered = []
+    # 订阅通知只发送该聊天尚未收到过的仓库（按聊天保存的布隆过滤器目录）
+    notify_new_only = os.getenv("NOTIFY_NEW_ONLY", "false").lower()
+    config["notify_new_only"] = notify_new_only in ("true", "1", "yes", "y")
+    config["notified_dir"] = os.getenv("NOTIFIED_DIR", config["notified_dir"])
     
-    for repo in repositories:
-        desc_lower = repo["description"].lower()
-        name_lower = repo["name"].lower()
-        
-        for keyword in ai_keywords:
-            if keyword in desc_lower or keyword in name_lower:
-                filtered.append(repo)
-                break
+    # Bot 运行模式：polling（默认）或 webhook
+    bot_mode = os.getenv("BOT_MODE", config["bot_mode"]).lower()
+    config["bot_mode"] = bot_mode if bot_mode in ("polling", "webhook") else "polling"
+    config["webhook_url"] = os.getenv("WEBHOOK_URL")
+    config["webhook_listen"] = os.getenv("WEBHOOK_LISTEN", config["webhook_listen"])
+    webhook_port = os.getenv("WEBHOOK_PORT")
+    if webhook_port and webhook_port.isdigit():
+        config["webhook_port"] = int(webhook_port)
+    config["webhook_path"] = os.getenv("WEBHOOK_PATH", config["webhook_path"])
+    config["webhook_secret"] = os.getenv("WEBHOOK_SECRET")
     
-    return filtered
-
-def exclude_repositories(repositories, exclude_names):
-    """排除特定仓库"""
-    if not exclude_names:
-        return repositories
-    
-    filtered = []
-    
-    for repo in repositories:
-        exclude = False
-        for exclude_name in exclude_names:
-            if exclude_name.lower() in repo["name"].lower():
-                exclude = True
-                break
-        
-        if not exclude:
-            filtered.append(repo)
+    # 任务队列（设置后 /git 只入队，由 job_queue.py 工作进程执行）
+    config["job_queue_db"] = os.getenv("JOB_QUEUE_DB", config["job_queue_db"])
     
-    return filtered
-
-def create_markdown_table(repositories):
-    """生成Markdown表格"""
-    if not repositories:
-        return "# GitHub Trending\n\n未找到相关仓库。"
+    # 多副本选主（共享的租约数据库，为空则视为单副本）
+    config["leader_db"] = os.getenv("LEADER_DB", config["leader_db"])
+    lease_ttl = os.getenv("LEADER_LEASE_TTL")
+    if lease_ttl and lease_ttl.isdigit():
+        config["leader_lease_ttl"] = int(lease_ttl)
     
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # 定时抓取间隔（分钟，0 表示关闭，仅主节点执行）
+    interval = os.getenv("SCRAPE_INTERVAL_MINUTES")
+    if interval and interval.isdigit():
+        config["scrape_interval_minutes"] = int(interval)
     
-    # 表格标题
-    markdown = f"# GitHub Trending (AI/LLM/Agent相关) - {current_date}\n\n"
-    markdown += "| 仓库名称 | URL | 描述（功能） | 星数 |\n"
-    markdown += "|----------|-----|--------------|------|\n"
+    # 外部服务地址（指向本地模拟服务即可离线运行）
+    config["telegram_api_base"] = os.getenv("TELEGRAM_API_BASE", config["telegram_api_base"]).rstrip("/")
+    config["github_trending_url"] = os.getenv("GITHUB_TRENDING_URL", config["github_trending_url"])
     
-    # 表格内容
-    for repo in repositories:
-        name = repo["name"].replace("|", "\|")
-        url = repo["url"]
-        desc = repo["description"].replace("|", "\|").replace("\n", " ")
-        stars = repo["stars"]
-        
-        markdown += f"| {name} | [{url}]({url}) | {desc} | {stars} |\n"
+    # 要抓取并合并的 trending 分片（逗号分隔，如 daily,weekly,python:daily；为空只抓取主页面）
+    slices_str = os.getenv("TRENDING_SLICES", "")
+    if slices_str:
+        config["trending_slices"] = list(dict.fromkeys(name.strip().lower() for name in slices_str.split(",") if name.strip()))
+    # 多个分片并行解析的进程数（0 表示按 CPU 核数）
+    parse_workers = os.getenv("PARSE_WORKERS")
+    if parse_workers and parse_workers.isdigit():
+        config["parse_workers"] = int(parse_workers)
     
-    # 统计信息
-    markdown += f"\n**总计: {len(repositories)} 个仓库**\n"
-    markdown += f"**更新时间: {current_date}**\n"
+    # HTTP 录制/回放文件（为空则关闭），模式为 record 或 replay
+    config["http_cassette"] = os.getenv("HTTP_CASSETTE", config["http_cassette"])
+    cassette_mode = os.getenv("HTTP_CASSETTE_MODE", config["http_cassette_mode"]).lower()
+    config["http_cassette_mode"] = cassette_mode if cassette_mode in CASSETTE_MODES else "replay"
     
-    return markdown
-
-def create_telegram_message(repositories, max_repos=5):
-    """创建适合Telegram的消息（限制在4096字符内）"""
-    if not repositories:
-        return "GitHub Trending: 今天没有找到AI/LLM/Agent相关仓库。"
+    # 管理员用户ID（逗号分隔，/profile 等命令仅对其开放）
+    admin_ids_str = os.getenv("ADMIN_USER_IDS", "")
+    if admin_ids_str:
+        config["admin_user_ids"] = [int(uid.strip()) for uid in admin_ids_str.split(",") if uid.strip().lstrip("-").isdigit()]
     
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    # 持续采样的折叠栈文件（为空则关闭），保留最近 N 秒的样本
+    config["profile_sampler_file"] = os.getenv("PROFILE_SAMPLER_FILE", config["profile_sampler_file"])
+    sampler_window = os.getenv("PROFILE_SAMPLER_WINDOW")
+    if sampler_window and sampler_window.isdigit():
+        config["profile_sampler_window"] = int(sampler_window)
     
-    # 创建消息头
-    message = f"🚀 *GitHub Trending (AI/LLM/Agent相关) - {current_date}*\n\n"
+    # /git 限流：每个用户/聊天的令牌桶容量和补充一个令牌的秒数（容量为 0 表示不限制），同时运行的流水线上限（0 表示不限制）
+    for key in ("git_user_burst", "git_user_refill_seconds", "git_chat_burst", "git_chat_refill_seconds", "git_max_concurrent"):
+        value = os.getenv(key.upper())
+        if value and value.isdigit():
+            config[key] = int(value)
+    for key in ("git_user_refill_seconds", "git_chat_refill_seconds"):
+        config[key] = max(1, config[key])
     
-    # 添加前几个仓库（避免消息过长）
-    max_repos = min(max_repos, len(repositories))
-    for i, repo in enumerate(repositories[:max_repos], 1):
-        # 缩短描述以避免消息过长
-        short_desc = repo["description"][:80] + "..." if len(repo["description"]) > 80 else repo["description"]
-        message += f"{i}. *{repo['name']}*\n"
-        message += f"   ⭐ {repo['stars']} | {short_desc}\n"
-        message += f"   🔗 {repo['url']}\n\n"
+    # 更新分发：快通道（/start、/help、搜索等）和重通道（/git、/profile）的并发上限，重通道最多排队的更新数
+    for key in ("fast_lane_concurrency", "heavy_lane_concurrency"):
+        value = os.getenv(key.upper())
+        if value and value.isdigit() and int(value) > 0:
+            config[key] = int(value)
+    heavy_queue = os.getenv("HEAVY_LANE_QUEUE")
+    if heavy_queue and heavy_queue.isdigit():
+        config["heavy_lane_queue"] = int(heavy_queue)
     
-    if len(repositories) > max_repos:
-        message += f"... 还有 {len(repositories) - max_repos} 个仓库\n\n"
+    # 星数历史小图：为前 N 个仓库附上图片（0 表示关闭，需要 matplotlib 和历史库），PNG 缓存目录及其最多保留的图片数
+    chart_count = os.getenv("STAR_CHART_COUNT")
+    if chart_count and chart_count.isdigit():
+        config["star_chart_count"] = min(int(chart_count), 10)
+    config["chart_cache_dir"] = os.getenv("CHART_CACHE_DIR", config["chart_cache_dir"])
+    chart_cache_max_files = os.getenv("CHART_CACHE_MAX_FILES")
+    if chart_cache_max_files and chart_cache_max_files.isdigit():
+        config["chart_cache_max_files"] = int(chart_cache_max_files)
     
-    message += f"📊 总计: {len(repositories)} 个仓库"
+    # 链路追踪：JSON 行文件和/或 OTLP collector 地址（为空则关闭），是否同时输出到控制台
+    config["trace_file"] = os.getenv("TRACE_FILE", config["trace_file"])
+    config["trace_otlp_endpoint"] = os.getenv("TRACE_OTLP_ENDPOINT", config["trace_otlp_endpoint"])
+    trace_console = os.getenv("TRACE_CONSOLE", "true").lower()
+    config["trace_console"] = trace_console in ("true", "1", "yes", "y")
     
-    # 检查消息长度（Telegram限制4096字符）
-    if len(message) > 4000:
-        # 如果太长，进一步缩短
-        message = message[:3900] + "\n\n...（消息过长，已截断）"
+    # 配置热加载：监视的 dotenv 文件（逗号分隔）和轮询间隔（秒，0 表示关闭）
+    watch_files_str = os.getenv("CONFIG_WATCH_FILES", "")
+    if watch_files_str:
+        config["config_watch_files"] = [path.strip() for path in watch_files_str.split(",") if path.strip()]
+    reload_interval = os.getenv("CONFIG_RELOAD_INTERVAL")
+    if reload_interval and reload_interval.isdigit():
+        config["config_reload_interval"] = int(reload_interval)
     
-    return message
+    return config
 
-def send_telegram_message(bot_token, chat_id, message):
+# --- Scraping Logic (Copied from original script) ---
+# 对冲请求 + 重试 + 熔断，失败时返回上一次成功的缓存页面
+trending_fetcher = TrendingFetcher(DEFAULT_GITHUB_TRENDING_URL, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+# 各分片的抓取器（按需创建，共享主抓取器的 session）
+slice_fetchers = {}
+
+def configure_fetcher(config):
+    """按配置设置抓取地址和解析进程池大小，并按需挂载 HTTP 录制/回放"""
+    trending_fetcher.url = config["github_trending_url"]
+    configure_shared_executor(config["parse_workers"])
+    slice_fetchers.clear()
+    if config["http_cassette"]:
+        use_cassette(trending_fetcher.session, config["http_cassette"], config["http_cassette_mode"])
+        trace_event(f"📼 HTTP cassette: {config['http_cassette']} ({config['http_cassette_mode']})")
+    else:
+        eject_cassette(trending_fetcher.session)
+
+def scrape_github_trending():
+    """抓取GitHub Trending页面（返回带 .content 的结果，失败且无缓存时返回 None）"""
+    return trending_fetcher.fetch()
+
+def slice_fetcher(name):
+    """返回分片对应的抓取器（各自独立的熔断状态和页面缓存）"""
+    fetcher = slice_fetchers.get(name)
+    if fetcher is None:
+        fetcher = TrendingFetcher(slice_url(trending_fetcher.url, name), headers={"User-Agent": "Mozilla/5.0"},
+                                  timeout=30, cache_path=slice_cache_path(name), session=trending_fetcher.session)
+        slice_fetchers[name] = fetcher
+    return fetcher
+
+def scrape_trending_slices(slices):
+    """抓取各个分片，返回 [(分片名, 抓取结果)]，失败且无缓存的分片被跳过；未配置分片时只抓取主页面"""
+    if not slices:
+        response = scrape_github_trending()
+        return [(DEFAULT_SLICE, response)] if response else []
+    pages = []
+    for name in slices:
+        response = slice_fetcher(name).fetch()
+        if response:
+            pages.append((name, response))
+        else:
+            trace_event(f"⚠️  分片 {name} 抓取失败，跳过", slice=name)
+    return pages
+
+def scrape_and_merge(slices):
+    """抓取并解析全部分片，按 owner/repo 合并为唯一仓库；全部抓取失败时返回 None"""
+    pages = scrape_trending_slices(slices)
+    if not pages:
+        return None
+    with span("parse", pages=len(pages), bytes=sum(len(response.content) for _, response in pages)) as parse_span:
+        if len(pages) == 1:
+            parsed = {pages[0][0]: parse_repositories(pages[0][1].content)}
+        else:
+            parsed = shared_executor().parse_all((name, response.content) for name, response in pages)
+        # 按配置顺序合并：抓取时间相同时，靠前的分片的指标优先
+        merger = SliceMerger()
+        for name, response in pages:
+            merger.add(name, parsed[name], response.fetched_at, response.from_cache)
+        parse_span.set(rows=merger.rows, repos=len(merger), cached_slices=len(merger.cached_slices))
+    return merger
+
+def filter_ai_repositories(repositories, keywords=DEFAULT_AI_KEYWORDS):
+    """过滤AI/LLM/Agent相关仓库（名称或描述包含任一关键词）"""
+    return keyword_matcher(tuple(keywords)).filter(repositories)
+
+def exclude_repositories(repositories, exclude_names):
+    """排除特定仓库（名称包含任一排除项，不区分大小写）"""
+    if not exclude_names:
+        return repositories
+    return exclusion_index(tuple(exclude_names)).apply(repositories)
+
+def create_markdown_table(repositories):
+    """生成Markdown表格"""
+    return render_all(repositories, formats=("markdown",))["markdown"]
+
+def create_telegram_message(repositories, max_repos=5):
+    """创建适合Telegram的消息（限制在4096字符内）"""
+    return render_all(repositories, formats=("telegram",), max_telegram_repos=max_repos)["telegram"]
+
+def send_telegram_message(bot_token, chat_id, message, parse_mode="Markdown", api_base=DEFAULT_TELEGRAM_API_BASE):
     """通过Telegram Bot发送消息"""
     if not bot_token or not chat_id:
-        print("⚠️  Telegram配置不完整，跳过发送消息")
+        trace_event("⚠️  Telegram配置不完整，跳过发送消息")
         return False
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    api_url = f"{api_base}/bot{bot_token}/sendMessage"
     
     payload = {
         "chat_id": chat_id,
         "text": message,
-        "parse_mode": "Markdown",
         "disable_web_page_preview": True
     }
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
     
     try:
         response = requests.post(api_url, json=payload, timeout=30)
@@ -266,41 +391,70 @@ def send_telegram_message(bot_token, chat_id, message):
         
         result = response.json()
         if result.get("ok"):
-            print(f"✅ Telegram消息发送成功！消息ID: {result['result']['message_id']}")
+            trace_event(f"✅ Telegram消息发送成功！消息ID: {result['result']['message_id']}")
             return True
         else:
-            print(f"❌ Telegram API返回错误: {result.get('description', 'Unknown error')}")
+            trace_event(f"❌ Telegram API返回错误: {result.get('description', 'Unknown error')}")
             return False
             
     except requests.exceptions.Timeout:
-        print("❌ 发送Telegram消息超时")
+        trace_event("❌ 发送Telegram消息超时")
         return False
     except requests.exceptions.RequestException as e:
-        print(f"❌ 发送Telegram消息失败: {e}")
+        trace_event(f"❌ 发送Telegram消息失败: {e}")
         return False
     except Exception as e:
-        print(f"❌ 处理Telegram响应时出错: {e}")
+        trace_event(f"❌ 处理Telegram响应时出错: {e}")
         return False
 
 def save_markdown(content, filename="github_trending_ai.md"):
     """保存Markdown文件"""
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"✅ 数据已保存到 {filename}")
+        if write_if_changed(filename, content, ignore=VOLATILE_LINES):
+            trace_event(f"✅ 数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
         return True
     except Exception as e:
-        print(f"❌ 保存文件失败: {e}")
+        trace_event(f"❌ 保存文件失败: {e}")
         return False
 
-def test_telegram_bot(bot_token, chat_id):
+def extra_format_files(rendered, base_filename="github_trending_ai.md"):
+    """额外启用的输出格式（HTML/RSS）对应的 {文件名: 内容}，文件名沿用Markdown文件名"""
+    suffixes = {"html": ".html", "rss": ".xml"}
+    return {
+        str(Path(base_filename).with_suffix(suffix)): rendered[fmt]
+        for fmt, suffix in suffixes.items()
+        if fmt in rendered
+    }
+
+def save_outputs(outputs):
+    """批量保存 {文件名: 内容}，相同内容只编码和哈希一次，除生成时间外未变化的文件跳过写入"""
+    writer = OutputWriter(ignore=VOLATILE_LINES)
+    for filename, content in outputs.items():
+        writer.add(filename, content)
+    
+    try:
+        results = writer.flush()
+    except Exception as e:
+        trace_event(f"❌ 保存文件失败: {e}")
+        return False
+    
+    for filename, written in results.items():
+        if written:
+            trace_event(f"✅ 数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
+    return True
+
+def test_telegram_bot(bot_token, chat_id, api_base=DEFAULT_TELEGRAM_API_BASE):
     """测试Telegram Bot连接"""
     if not bot_token or not chat_id:
         return False
     
-    print("🔍 测试Telegram Bot连接...")
+    trace_event("🔍 测试Telegram Bot连接...")
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/getMe"
+    api_url = f"{api_base}/bot{bot_token}/getMe"
     
     try:
         response = requests.get(api_url, timeout=10)
@@ -309,21 +463,21 @@ def test_telegram_bot(bot_token, chat_id):
         result = response.json()
         if result.get("ok"):
             bot_info = result["result"]
-            print(f"✅ Bot连接成功！")
-            print(f"   Bot名称: {bot_info.get('first_name', 'N/A')}")
-            print(f"   Bot用户名: @{bot_info.get('username', 'N/A')}")
+            trace_event(f"✅ Bot连接成功！")
+            trace_event(f"   Bot名称: {bot_info.get('first_name', 'N/A')}")
+            trace_event(f"   Bot用户名: @{bot_info.get('username', 'N/A')}")
             return True
         else:
-            print(f"❌ Bot测试失败: {result.get('description', 'Unknown error')}")
+            trace_event(f"❌ Bot测试失败: {result.get('description', 'Unknown error')}")
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ 测试Bot连接失败: {e}")
+        trace_event(f"❌ 测试Bot连接失败: {e}")
         return False
 
 def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
     """自动执行Git添加、提交和推送操作"""
-    print("\n🔧 开始自动Git操作...")
+    trace_event("\n🔧 开始自动Git操作...")
     
     commands = [
         ["git", "add", "."],
@@ -335,7 +489,7 @@ def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
     
     for i, cmd in enumerate(commands):
         cmd_name = " ".join(cmd)
-        print(f"  执行: {cmd_name}")
+        trace_event(f"  执行: {cmd_name}")
         
         try:
             result = subprocess.run(
@@ -346,34 +500,34 @@ def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
             )
             
             if result.returncode == 0:
-                print(f"  ✅ 成功: {cmd_name}")
+                trace_event(f"  ✅ 成功: {cmd_name}")
                 results.append(True)
             else:
-                print(f"  ⚠️  警告: {cmd_name} 返回非零状态码")
-                print(f"     错误: {result.stderr[:200]}")
+                trace_event(f"  ⚠️  警告: {cmd_name} 返回非零状态码")
+                trace_event(f"     错误: {result.stderr[:200]}")
                 results.append(False)
                 
                 # 如果是git add失败，可能是没有更改
                 if i == 0 and "nothing to commit" in result.stdout.lower():
-                    print("  ℹ️  没有需要提交的更改")
+                    trace_event("  ℹ️  没有需要提交的更改")
                     return False
                     
         except subprocess.TimeoutExpired:
-            print(f"  ❌ 超时: {cmd_name} 执行超时")
+            trace_event(f"  ❌ 超时: {cmd_name} 执行超时")
             results.append(False)
         except FileNotFoundError:
-            print(f"  ❌ 错误: Git未安装或不在PATH中")
+            trace_event(f"  ❌ 错误: Git未安装或不在PATH中")
             results.append(False)
         except Exception as e:
-            print(f"  ❌ 异常: {cmd_name} 执行出错: {e}")
+            trace_event(f"  ❌ 异常: {cmd_name} 执行出错: {e}")
             results.append(False)
     
     # 检查所有命令是否成功
     if all(results):
-        print("✅ Git自动推送完成！")
+        trace_event("✅ Git自动推送完成！")
         return True
     else:
-        print("⚠️  Git操作部分失败，请手动检查")
+        trace_event("⚠️  Git操作部分失败，请手动检查")
         return False
 
 def check_git_repository():
@@ -388,29 +542,65 @@ def check_git_repository():
     except:
         return False
 
-def save_data_json(repositories, filename="github_trending_data.json"):
-    """保存原始数据为JSON文件（用于历史记录）"""
+def save_data_json(repositories, filename="github_trending_data.json", content=None):
+    """保存原始数据为JSON文件（用于历史记录），content 为渲染引擎已生成的JSON文本"""
     if not repositories:
         return False
     
     try:
-        data = {
-            "timestamp": datetime.now().isoformat(),
-            "total_repos": len(repositories),
-            "repositories": repositories
-        }
-        
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if content is None:
+            content = render_all(repositories, formats=("json",))["json"]
         
-        print(f"✅ 原始数据已保存到 {filename}")
+        if write_if_changed(filename, content, ignore=VOLATILE_LINES):
+            trace_event(f"✅ 原始数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
         return True
     except Exception as e:
-        print(f"❌ 保存JSON数据失败: {e}")
+        trace_event(f"❌ 保存JSON数据失败: {e}")
         return False
 
 # --- Telegram Bot Logic ---
 config = load_environment() # Load config globally for the bot
+# Hot reload rebinds `config` to a new snapshot; runs already in progress keep the one they started with
+config_watcher = ConfigWatcher(load_environment, config["config_watch_files"], config)
+config = config_watcher.current.config
+configure_fetcher(config)
+setup_tracing(config["trace_file"], config["trace_otlp_endpoint"], config["trace_console"])
+history_store = HistoryStore(config["history_db"]) if config["history_db"] else None
+job_queue = JobQueue(config["job_queue_db"]) if config["job_queue_db"] else None
+leader = LeaderElector(config["leader_db"], ttl=config["leader_lease_ttl"]) if config["leader_db"] else None
+
+# In-memory prefix index for inline queries, seeded from history and refreshed after each scrape
+# (in job-queue mode the workers scrape, so it is refreshed from the history DB on a timer instead)
+inline_index = PrefixIndex()
+inline_refreshed_on = None
+if history_store:
+    inline_index.add_records(history_store.all_repos())
+    inline_refreshed_on = datetime.now().strftime("%Y-%m-%d")
+
+# Only one /profile run at a time (cProfile and tracemalloc are process-wide); the sampler starts in post_init
+profile_lock = asyncio.Lock()
+stack_sampler = None
+
+# Per-chat "already announced" Bloom filters, opened on first use
+notified_set = None
+
+# /git throttling: token buckets per user and per chat, a cap on concurrent pipelines,
+# and the last summary, which throttled callers get instead of a new run
+git_throttle = Throttle(config["git_user_burst"], config["git_user_refill_seconds"],
+                        config["git_chat_burst"], config["git_chat_refill_seconds"])
+pipeline_slots = PipelineSlots(config["git_max_concurrent"])
+last_summary = None
+
+# Star-history sparklines, rendered in a process pool on first use
+chart_service = None
+
+SEARCH_PAGE_SIZE = 5
+TOP_DEFAULT_LIMIT = 10
+TOP_MAX_LIMIT = 50
+INLINE_RESULT_LIMIT = 20
+INLINE_REFRESH_SECONDS = 60
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a message when the command /start is issued."""
@@ -421,79 +611,584 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a message when the command /help is issued."""
-    await update.message.reply_text("Send /git to scrape GitHub trending repositories and get a summary.")
+    await update.message.reply_text(
+        "Send /git to scrape GitHub trending repositories and get a summary.\n"
+        "Send /search <query> [days:N] to search the trending history.\n"
+        "Send /top [day|week|month] [n] to see the biggest repositories of a period."
+    )
+
+async def reply_from_cache(update: Update, reason: str) -> None:
+    """Answers a throttled caller with the last summary instead of running the pipeline."""
+    if last_summary is None:
+        await update.message.reply_text(f"⏳ {reason}. Please try again later.")
+        return
+    text, created = last_summary
+    await update.message.reply_text(
+        f"⏳ {reason}; served from cache, age {int(time.monotonic() - created)}s.\n\n{text}",
+        parse_mode='Markdown',
+        disable_web_page_preview=True
+    )
+
+async def run_throttled(update: Update, run, heavy: bool) -> None:
+    """Awaits run() behind the concurrent pipeline cap (when heavy) and the per-user/per-chat token buckets."""
+    if heavy and not pipeline_slots.try_acquire():
+        await reply_from_cache(update, "A /git run is already in progress")
+        return
+    try:
+        user = update.effective_user
+        retry_after = git_throttle.acquire(user.id if user else None, update.effective_chat.id)
+        if retry_after is not None:
+            await reply_from_cache(update, f"Rate limited, next run allowed in {math.ceil(retry_after)}s")
+            return
+        await run()
+    finally:
+        if heavy:
+            pipeline_slots.release()
+
+def throttled(handler):
+    """Puts the concurrent pipeline cap and the per-user/per-chat token buckets in front of handler."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # Enqueueing a job is cheap; only in-process pipelines count against the cap
+        await run_throttled(update, lambda: handler(update, context), heavy=job_queue is None)
+    return wrapper
 
 async def git_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /git command to trigger scraping, sending message, and git push."""
-    await update.message.reply_text("🚀 Starting GitHub Trending scraping and processing...")
+    if job_queue:
+        with span("git.enqueue") as enqueue_span:
+            # Workers continue the same trace through the payload
+            job_id = job_queue.enqueue("scrape", {"chat_id": update.effective_chat.id, "trace_id": enqueue_span.trace_id})
+        await update.message.reply_text(f"📥 Job #{job_id} queued. Results will be sent here when the workers finish.")
+        return
+
+    await run_pipeline(update.message.reply_text, send_charts=chart_sender(context.bot, update.effective_chat.id))
+
+async def run_pipeline(reply, chat_id=None, send_charts=None) -> None:
+    """Runs scrape -> save -> notify -> git push, reporting progress through reply(text, **kwargs).
+
+    Only the leader replica (or a single replica without LEADER_DB) writes shared files and pushes;
+    other replicas still scrape and reply. The whole run is one trace with a span per stage.
+    The config snapshot is taken once here, so a reload during the run does not affect it.
+    With NOTIFY_NEW_ONLY, passing the subscriber's chat_id limits the summary to repos not yet announced there.
+    send_charts (see chart_sender) receives star-history charts for the top repos after the summary.
+    """
+    is_writer = leader is None or leader.is_leader
+    snapshot = config_watcher.current
+    with span("pipeline.run", source="bot", writer=is_writer, config_version=snapshot.version):
+        await run_pipeline_stages(reply, is_writer, snapshot, chat_id, send_charts)
+
+def write_shared_outputs(cfg, rendered, ai_repos, fencing_token=None) -> None:
+    """Writer-only stage: output files, feed, archive site and history stores (blocking, runs in a thread).
+
+    With leader election, the fencing token is re-checked before every write; a deposed leader
+    stops with LeadershipLost instead of overwriting the new leader's files.
+    """
+    def fence():
+        if leader:
+            leader.ensure_token(fencing_token)
+
+    markdown_content = rendered["markdown"]
+    outputs = {
+        cfg["save_filename"]: markdown_content,
+        "trending_today.md": markdown_content, # Save trending_today.md
+        "github_trending_data.json": rendered["json"],
+    }
+    outputs.update(extra_format_files(rendered, cfg["save_filename"]))
+    fence()
+    with span("save", files=len(outputs)):
+        save_outputs(outputs)
+    if cfg["feed_filename"]:
+        fence()
+        with span("feed"):
+            new_items = update_feed(ai_repos, cfg["feed_filename"], cfg["feed_state_filename"], cfg["feed_max_items"],
+                                    seen_days=cfg["feed_seen_days"])
+            trace_event(f"📰 订阅源新增 {new_items} 个仓库", new_items=new_items)
+    if cfg["site_dir"]:
+        fence()
+        with span("site"):
+            pages = update_site(ai_repos, site_dir=cfg["site_dir"])
+            trace_event(f"🌐 归档站点更新了 {pages} 个页面", pages=pages)
+    if cfg["history_parquet_dir"]:
+        fence()
+        with span("history.parquet"):
+            append_snapshot(ai_repos, root=cfg["history_parquet_dir"])
+    if history_store:
+        fence()
+        with span("history.sqlite"):
+            history_store.add_snapshot(ai_repos)
+
+async def run_pipeline_stages(reply, is_writer, snapshot, chat_id, send_charts) -> None:
+    global last_summary
+    cfg = snapshot.config
+    fencing_token = leader.token if leader else None
+
+    await reply("🚀 Starting GitHub Trending scraping and processing...")
 
-    # Perform scraping logic
-    response = scrape_github_trending()
-    if not response:
-        await update.message.reply_text("❌ Failed to fetch GitHub Trending page. Please check network.")
+    # Blocking stages (network, parsing, file and git I/O) run in worker threads so the
+    # event loop keeps serving fast-lane commands; to_thread carries the current span along
+    merged = await to_thread(scrape_and_merge, cfg["trending_slices"])
+    if merged is None:
+        await reply("❌ Failed to fetch GitHub Trending page. Please check network.")
         return
     
-    all_repos = parse_repositories(response.content)
+    all_repos = merged.records()
     if not all_repos:
-        await update.message.reply_text("❌ No repositories found. Page structure might have changed.")
+        await reply("❌ No repositories found. Page structure might have changed.")
         return
 
-    ai_repos = filter_ai_repositories(all_repos)
-    if config["exclude_repos"]:
-        ai_repos = exclude_repositories(ai_repos, config["exclude_repos"])
+    # The fetch layer falls back to the last good page when GitHub is unreachable;
+    # stale data must not become a new snapshot, feed entry or commit
+    cache_age = merged.cache_age()
+    if cache_age is not None:
+        trace_event(f"⚠️  使用 {cache_age} 秒前的缓存页面，跳过写入和推送", cache_age=cache_age)
+        await reply(f"⚠️ GitHub Trending could not be fetched; showing cached data from {cache_age}s ago. Nothing will be saved or pushed.")
+
+    with span("filter") as filter_span:
+        ai_repos = snapshot.exclusions.apply(snapshot.matcher.filter(all_repos))
+        filter_span.set(repos=len(ai_repos))
     
     if not ai_repos:
         telegram_message = "GitHub Trending: 今天没有找到AI/LLM/Agent相关仓库。"
-        await update.message.reply_text(telegram_message)
+        await reply(telegram_message)
         return
 
-    # Generate Markdown and save file
-    markdown_content = create_markdown_table(ai_repos)
-    save_markdown(markdown_content, config["save_filename"])
-    save_markdown(markdown_content, "trending_today.md") # Save trending_today.md
-    save_data_json(ai_repos, "github_trending_data.json")
+    # Render every configured format in a single pass, then save files
+    with span("render", formats=",".join(cfg["render_formats"])):
+        rendered = render_all(ai_repos, formats=cfg["render_formats"], max_telegram_repos=cfg["max_repos_in_telegram"])
+    if cache_age is None:
+        last_summary = (rendered["telegram"], time.monotonic())
+    if is_writer and cache_age is None:
+        try:
+            await to_thread(write_shared_outputs, cfg, rendered, ai_repos, fencing_token)
+        except LeadershipLost as e:
+            trace_event(f"⚠️  主节点身份已失效，停止写入共享文件: {e}")
+            await reply("⚠️ Leadership was lost during this run. Skipping shared writes.")
+            is_writer = False
+    elif not is_writer:
+        trace_event("ℹ️  非主节点，跳过写入共享文件")
+    inline_index.add_records(ai_repos)
 
     # Send Telegram notification
-    telegram_message = create_telegram_message(ai_repos, config["max_repos_in_telegram"])
-    await update.message.reply_text(telegram_message, parse_mode='Markdown', disable_web_page_preview=True)
+    telegram_message = rendered["telegram"]
+    announced = ai_repos
+    new_only = chat_id is not None and cfg["notify_new_only"]
+    if new_only:
+        # Diff-style: list only repos this chat has not been sent before
+        notified = get_notified_set(cfg)
+        announced = notified.unseen(chat_id, ai_repos)
+        if announced:
+            telegram_message = render_all(announced, formats=("telegram",), max_telegram_repos=cfg["max_repos_in_telegram"])["telegram"]
+    if announced:
+        with span("notify", repos=len(announced)):
+            await reply(telegram_message, parse_mode='Markdown', disable_web_page_preview=True)
+        if new_only:
+            notified.mark(chat_id, [repo.key for repo in announced[:cfg["max_repos_in_telegram"]]])
+    else:
+        trace_event("ℹ️  没有新的仓库，跳过通知")
+
+    service = get_chart_service(cfg) if announced and send_charts else None
+    if service:
+        with span("charts") as charts_span:
+            top = announced[:min(cfg["star_chart_count"], cfg["max_repos_in_telegram"])]
+            try:
+                history = await to_thread(history_store.star_history, [repo.key for repo in top])
+                charts = await service.charts([(repo.name, history.get(repo.key, [])) for repo in top])
+                charts_span.set(charts=len(charts), cache_hits=service.hits, renders=service.misses)
+                if charts:
+                    await send_charts(charts)
+            except Exception as e:
+                # Charts are decoration; never fail the run because of them
+                trace_event(f"⚠️  星数历史图发送失败: {e}")
 
     # Auto Git Push
-    if config["git_auto_push"]:
-        if check_git_repository():
-            await update.message.reply_text("🔧 Performing Git add, commit, and push...")
-            success = git_auto_push(config["git_commit_message"])
+    if cfg["git_auto_push"]:
+        if cache_age is not None:
+            await reply("ℹ️ Data came from the cache. Skipping Git push.")
+        elif not is_writer:
+            await reply("ℹ️ This replica is not the leader. Skipping Git push.")
+        elif leader and not await to_thread(leader.check_token, fencing_token):
+            await reply("⚠️ Leadership was lost during this run. Skipping Git push.")
+        elif await to_thread(check_git_repository):
+            await reply("🔧 Performing Git add, commit, and push...")
+            with span("git.push"):
+                success = await to_thread(git_auto_push, cfg["git_commit_message"])
             if success:
-                await update.message.reply_text("✅ Git push completed successfully!")
+                await reply("✅ Git push completed successfully!")
             else:
-                await update.message.reply_text("⚠️ Git push failed. Please check logs manually.")
+                await reply("⚠️ Git push failed. Please check logs manually.")
         else:
-            await update.message.reply_text("⚠️ Current directory is not a Git repository. Skipping auto push.")
+            await reply("⚠️ Current directory is not a Git repository. Skipping auto push.")
     else:
-        await update.message.reply_text("ℹ️ Git auto push is disabled.")
+        await reply("ℹ️ Git auto push is disabled.")
     
-    await update.message.reply_text("✅ Process completed!")
+    await reply("✅ Process completed!")
 
+def parse_search_args(args):
+    """Splits /search arguments into (query, since_days); a days:N token limits the time range."""
+    terms = []
+    since_days = None
+    for arg in args:
+        if arg.lower().startswith("days:") and arg[5:].isdigit():
+            since_days = int(arg[5:])
+        else:
+            terms.append(arg)
+    return " ".join(terms), since_days
 
-def main() -> None:
-    """Start the bot."""
-    if not config["bot_token"]:
-        print("❌ TELEGRAM_BOT_TOKEN is not set. Please set it in .env file or environment variables.")
+def format_search_results(query, results, total, page):
+    """Builds the plain-text reply for one page of search results."""
+    pages = max(1, -(-total // SEARCH_PAGE_SIZE))
+    lines = [f"🔍 \"{query}\": {total} results (page {page}/{pages})", ""]
+    start = (page - 1) * SEARCH_PAGE_SIZE
+    for i, repo in enumerate(results, start + 1):
+        desc = repo["description"]
+        short_desc = desc[:80] + "..." if len(desc) > 80 else desc
+        lines.append(f"{i}. {repo['name']} ⭐ {repo['stars']}")
+        lines.append(f"   {short_desc}")
+        lines.append(f"   📅 {repo['first_seen']} ~ {repo['last_seen']}")
+        lines.append(f"   🔗 {repo['url']}")
+        lines.append("")
+    return "\n".join(lines).rstrip(), pages
+
+def search_keyboard(query, since_days, page, pages):
+    """Previous/next buttons; omitted when the query does not fit into callback_data (64 bytes)."""
+    buttons = []
+    for label, target in (("⬅️ Prev", page - 1), ("Next ➡️", page + 1)):
+        if 1 <= target <= pages:
+            data = f"search:{target}:{since_days or 0}:{query}"
+            if len(data.encode("utf-8")) > 64:
+                return None
+            buttons.append(InlineKeyboardButton(label, callback_data=data))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /search <query> [days:N] with BM25-ranked results from the history database."""
+    if not history_store:
+        await update.message.reply_text("ℹ️ Search is disabled (HISTORY_DB is not set).")
+        return
+
+    query, since_days = parse_search_args(context.args)
+    if not query:
+        await update.message.reply_text("Usage: /search <query> [days:N]\nExample: /search rag days:30")
+        return
+
+    results, total = await asyncio.to_thread(history_store.search, query, page=1, page_size=SEARCH_PAGE_SIZE, since_days=since_days)
+    if not total:
+        await update.message.reply_text(f"🔍 No trending repositories found for \"{query}\".")
+        return
+
+    text, pages = format_search_results(query, results, total, 1)
+    await update.message.reply_text(
+        text,
+        disable_web_page_preview=True,
+        reply_markup=search_keyboard(query, since_days, 1, pages)
+    )
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the pagination buttons of /search results."""
+    callback = update.callback_query
+    await callback.answer()
+
+    _, page, since_days, query = callback.data.split(":", 3)
+    page, since_days = int(page), int(since_days) or None
+    results, total = await asyncio.to_thread(history_store.search, query, page=page, page_size=SEARCH_PAGE_SIZE, since_days=since_days)
+    if not results:
+        return
+
+    text, pages = format_search_results(query, results, total, page)
+    await callback.edit_message_text(
+        text,
+        disable_web_page_preview=True,
+        reply_markup=search_keyboard(query, since_days, page, pages)
+    )
+
+async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /top [day|week|month] [n] from the precomputed leaderboard tables."""
+    if not history_store:
+        await update.message.reply_text("ℹ️ Leaderboards are disabled (HISTORY_DB is not set).")
+        return
+
+    window = "week"
+    limit = TOP_DEFAULT_LIMIT
+    for arg in context.args:
+        if arg.lower() in ("day", "week", "month"):
+            window = arg.lower()
+        elif arg.isdigit():
+            limit = max(1, min(int(arg), TOP_MAX_LIMIT))
+        else:
+            await update.message.reply_text("Usage: /top [day|week|month] [n]")
+            return
+
+    period, rows = await asyncio.to_thread(history_store.top, window, limit)
+    if not rows:
+        await update.message.reply_text("ℹ️ No trending history yet. Run /git first.")
+        return
+
+    lines = [f"🏆 Top {len(rows)} repositories ({window} {period})", ""]
+    for i, repo in enumerate(rows, 1):
+        lines.append(f"{i}. {repo['name']} ⭐ +{repo['star_gain']} ({repo['last_stars']})")
+        lines.append(f"   📈 {repo['appearances']} appearances | best rank #{repo['peak_rank']}")
+        lines.append(f"   🔗 {repo['url']}")
+    await update.message.reply_text("\n".join(lines), disable_web_page_preview=True)
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers @bot <text> inline queries from the in-memory prefix index."""
+    query = update.inline_query.query.strip()
+    records = inline_index.search(query, limit=INLINE_RESULT_LIMIT) if query else []
+
+    results = []
+    for record in records:
+        desc = record.description
+        short_desc = desc[:80] + "..." if len(desc) > 80 else desc
+        results.append(InlineQueryResultArticle(
+            id=hashlib.md5(record.key.encode("utf-8")).hexdigest(),
+            title=record.name,
+            description=f"⭐ {record.stars} | {short_desc}",
+            url=record.url,
+            input_message_content=InputTextMessageContent(
+                f"{record.name}\n⭐ {record.stars} | {short_desc}\n🔗 {record.url}",
+                disable_web_page_preview=True
+            ),
+        ))
+    await update.inline_query.answer(results, cache_time=300)
+
+async def scheduled_scrape_loop(application: Application) -> None:
+    """Runs the pipeline every SCRAPE_INTERVAL_MINUTES on the leader replica only."""
+    interval = config["scrape_interval_minutes"] * 60
+
+    async def reply(text, **kwargs):
+        if config["chat_id"]:
+            await application.bot.send_message(chat_id=config["chat_id"], text=text, **kwargs)
+        else:
+            trace_event(text)
+
+    while True:
+        await asyncio.sleep(interval)
+        if leader and not leader.is_leader:
+            continue
+        try:
+            if job_queue:
+                with span("scheduled.enqueue") as enqueue_span:
+                    job_queue.enqueue("scrape", {"chat_id": config["chat_id"], "new_only": True, "trace_id": enqueue_span.trace_id})
+            elif pipeline_slots.try_acquire():
+                try:
+                    await run_pipeline(reply, chat_id=config["chat_id"],
+                                       send_charts=chart_sender(application.bot, config["chat_id"]) if config["chat_id"] else None)
+                finally:
+                    pipeline_slots.release()
+            else:
+                trace_event("⏭️  已有流水线在运行，跳过本次定时抓取")
+        except Exception as e:
+            trace_event(f"❌ 定时抓取失败: {e}", error=str(e))
+
+def refresh_inline_index() -> int:
+    """Adds repos saved to the history DB since the last refresh (by other processes) to the inline index."""
+    global inline_refreshed_on
+    today = datetime.now().strftime("%Y-%m-%d")
+    # last_seen has day granularity, so today's repos are re-read; unchanged ones are skipped by the index
+    updated = inline_index.add_records(history_store.all_repos(since=inline_refreshed_on))
+    inline_refreshed_on = today
+    return updated
+
+async def inline_refresh_loop() -> None:
+    """Keeps the inline index current while job-queue workers do the scraping."""
+    while True:
+        await asyncio.sleep(INLINE_REFRESH_SECONDS)
+        try:
+            updated = await asyncio.to_thread(refresh_inline_index)
+            if updated:
+                trace_event(f"🔎 内联索引更新了 {updated} 个仓库", updated=updated)
+        except Exception as e:
+            trace_event(f"❌ 刷新内联索引失败: {e}")
+
+def get_notified_set(cfg):
+    """Returns the notified set for NOTIFIED_DIR, reopening it if a reload changed the directory."""
+    global notified_set
+    if notified_set is None or notified_set.directory != cfg["notified_dir"]:
+        if notified_set:
+            notified_set.close()
+        notified_set = NotifiedSet(cfg["notified_dir"], exact=history_store)
+    return notified_set
+
+def get_chart_service(cfg):
+    """Returns the chart service, or None when charts are disabled or matplotlib / the history DB is missing."""
+    global chart_service
+    if not cfg["star_chart_count"] or not history_store or not MATPLOTLIB_AVAILABLE:
+        return None
+    if chart_service is None or chart_service.cache_dir != cfg["chart_cache_dir"]:
+        if chart_service:
+            chart_service.shutdown()
+        chart_service = ChartService(cfg["chart_cache_dir"], max_files=cfg["chart_cache_max_files"])
+    chart_service.max_files = cfg["chart_cache_max_files"]
+    return chart_service
+
+def chart_sender(bot, chat_id):
+    """Returns send(charts) posting [(name, png)] as one sendMediaGroup batch (a single chart goes out as a photo)."""
+    async def send(charts):
+        if len(charts) == 1:
+            name, png = charts[0]
+            await bot.send_photo(chat_id=chat_id, photo=png, caption=name)
+        else:
+            await bot.send_media_group(chat_id=chat_id, media=[InputMediaPhoto(png, caption=name) for name, png in charts])
+    return send
+
+def apply_config(snapshot, changed) -> None:
+    """Publishes a reloaded config snapshot and reconfigures the parts that can change at runtime."""
+    global config
+    config = snapshot.config
+    changed = set(changed)
+    if changed & {"github_trending_url", "http_cassette", "http_cassette_mode", "parse_workers"}:
+        configure_fetcher(config)
+    if changed & {"trace_file", "trace_otlp_endpoint", "trace_console"}:
+        setup_tracing(config["trace_file"], config["trace_otlp_endpoint"], config["trace_console"])
+    git_throttle.configure(config["git_user_burst"], config["git_user_refill_seconds"],
+                           config["git_chat_burst"], config["git_chat_refill_seconds"])
+    pipeline_slots.limit = config["git_max_concurrent"]
+    trace_event(f"🔄 配置已重新加载 (v{snapshot.version}): {', '.join(sorted(changed))}",
+                version=snapshot.version, changed=",".join(sorted(changed)))
+    restart = sorted(changed & set(RESTART_REQUIRED_KEYS))
+    if restart:
+        trace_event(f"⚠️  以下配置需要重启才能生效: {', '.join(restart)}", keys=",".join(restart))
+
+async def config_reload_loop() -> None:
+    """Polls the watched config files every CONFIG_RELOAD_INTERVAL seconds."""
+    while config["config_reload_interval"]:
+        await asyncio.sleep(config["config_reload_interval"])
+        try:
+            result = config_watcher.check()
+        except Exception as e:
+            trace_event(f"❌ 检查配置文件失败: {e}", error=str(e))
+            continue
+        if result:
+            apply_config(*result)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin only: runs one full /git pipeline under cProfile and tracemalloc and sends the report as a document.
+
+    The run goes through the same pipeline slots and rate limits as /git, so it never races a concurrent run.
+    """
+    if update.effective_user is None or update.effective_user.id not in config["admin_user_ids"]:
+        await update.message.reply_text("⛔ /profile is only available to admins.")
         return
+    if profile_lock.locked():
+        await update.message.reply_text("⏳ A profiling run is already in progress.")
+        return
+
+    async def profile_run() -> None:
+        await update.message.reply_text("🔬 Profiling one full /git run...")
+        report, summary = await profile_call(run_pipeline(update.message.reply_text))
+        filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+        await update.message.reply_document(
+            document=report.encode("utf-8"),
+            filename=filename,
+            caption=f"📈 {summary}"
+        )
+
+    async with profile_lock:
+        # The profiled pipeline always runs in this process, so it always takes a slot, even in job-queue mode
+        await run_throttled(update, profile_run, heavy=True)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin only: shows per-lane concurrency and queue depth, and the /git pipeline slots."""
+    if update.effective_user is None or update.effective_user.id not in config["admin_user_ids"]:
+        await update.message.reply_text("⛔ /stats is only available to admins.")
+        return
+    lines = ["📊 Dispatch lanes"]
+    for name, lane in context.application.update_processor.metrics().items():
+        lines.append(
+            f"{name}: {lane['active']}/{lane['limit']} active, {lane['waiting']} waiting (peak {lane['peak_waiting']}), "
+            f"{lane['processed']} done, {lane['rejected']} rejected, wait p50 {lane['wait_ms_p50']} ms / p99 {lane['wait_ms_p99']} ms"
+        )
+    lines.append(f"/git pipelines running: {pipeline_slots.active}/{pipeline_slots.limit or '∞'}")
+    await update.message.reply_text("\n".join(lines))
+
+async def post_init(application: Application) -> None:
+    """Starts the leader heartbeat, the stack sampler, the scheduled scrape, config reload and inline index refresh tasks once the bot is initialized."""
+    global stack_sampler
+    if config["profile_sampler_file"]:
+        # Samples every thread, so pipeline stages running in to_thread workers show up too
+        stack_sampler = StackSampler(config["profile_sampler_file"], window=config["profile_sampler_window"])
+        stack_sampler.start()
+        trace_event(f"🔥 Stack sampler writing to {config['profile_sampler_file']} (last {config['profile_sampler_window']}s)")
+    if leader:
+        leader.start_heartbeat()
+        trace_event(f"🗳️  Leader election enabled (replica {leader.holder_id}, leader: {leader.is_leader})",
+                    replica=leader.holder_id, leader=leader.is_leader)
+    if config["scrape_interval_minutes"]:
+        application.create_task(scheduled_scrape_loop(application))
+    if config["config_reload_interval"]:
+        application.create_task(config_reload_loop())
+    if job_queue and history_store:
+        application.create_task(inline_refresh_loop())
 
-    # Create the Application and pass it your bot's token.
-    application = Application.builder().token(config["bot_token"]).build()
+async def post_shutdown(application: Application) -> None:
+    """Releases the leader lease so another replica can take over immediately, stops the sampler, unmaps the notified set and stops the chart and parse pools."""
+    if leader:
+        leader.stop()
+    if stack_sampler:
+        stack_sampler.stop()
+    if notified_set:
+        notified_set.close()
+    if chart_service:
+        chart_service.shutdown()
+    shutdown_shared_executor()
+
+def build_application(token=None, base_url=None) -> Application:
+    """Builds the Application with every handler registered (shared by main() and load_test.py)."""
+    application = (
+        Application.builder()
+        .token(token or config["bot_token"])
+        .base_url(base_url or f"{config['telegram_api_base']}/bot")
+        .concurrent_updates(LaneUpdateProcessor(
+            fast_limit=config["fast_lane_concurrency"],
+            heavy_limit=config["heavy_lane_concurrency"],
+            heavy_queue=config["heavy_lane_queue"]
+        ))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # on different commands - answer in Telegram
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("git", git_command))
+    application.add_handler(CommandHandler("git", throttled(git_command)))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern="^search:"))
+    application.add_handler(CommandHandler("top", top_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(InlineQueryHandler(inline_query))
 
     # on non command i.e message - echo the message on Telegram
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, help_command)) # Simple catch-all
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
+    if not config["bot_token"]:
+        print("❌ TELEGRAM_BOT_TOKEN is not set. Please set it in .env file or environment variables.")
+        return
+
+    application = build_application()
 
     # Run the bot until the user presses Ctrl-C
-    print("🤖 Bot started. Listening for commands...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if config["bot_mode"] == "webhook":
+        if not config["webhook_secret"]:
+            print("⚠️  WEBHOOK_SECRET is not set; webhook requests will not be authenticated.")
+        print("🤖 Bot started in webhook mode.")
+        asyncio.run(run_webhook(
+            application,
+            config["webhook_url"],
+            listen=config["webhook_listen"],
+            port=config["webhook_port"],
+            path=config["webhook_path"],
+            secret_token=config["webhook_secret"]
+        ))
+    else:
+        print("🤖 Bot started. Listening for commands...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+星数历史小图（sparkline）渲染服务
+matplotlib（Agg 后端）绘图是 CPU 密集型的，放到进程池中执行，不阻塞机器人的事件循环；
+生成的 PNG 按绘图数据（仓库名和星数序列）的哈希缓存到磁盘，数据没有变化时直接复用，不再重新渲染；
+缓存目录最多保留 max_files 张图，超出时按最近使用时间（命中时刷新 mtime）淘汰最旧的
+
+运行: python3 chart_service.py <历史库> owner/repo [owner/repo ...]
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from output_writer import write_atomic
+
+try:
+    import matplotlib
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "charts")
+# 修改绘图样式时递增，使旧缓存失效
+CHART_STYLE = 1
+WIDTH, HEIGHT, DPI = 480, 160, 100
+MIN_POINTS = 2
+DEFAULT_MAX_FILES = 500
+
+
+def series_hash(name, points):
+    """绘图输入（仓库名 + 星数序列 + 样式版本）的内容哈希
+
+    时间不参与绘图，也不参与哈希：同样的星数在不同时间抓取到时复用同一张图
+    """
+    stars = [value for _, value in points]
+    payload = json.dumps([CHART_STYLE, name, stars], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_sparkline(name, points, width=WIDTH, height=HEIGHT, dpi=DPI):
+    """子进程：把 (时间, 星数) 序列画成 PNG，返回字节"""
+    import io
+
+    matplotlib.use("Agg")
+    # 直接使用 Figure，避免 pyplot 的全局状态
+    from matplotlib.figure import Figure
+
+    stars = [value for _, value in points]
+    figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    axes = figure.add_axes((0.02, 0.08, 0.96, 0.68))
+    axes.plot(range(len(stars)), stars, color="#2f81f7", linewidth=2)
+    axes.fill_between(range(len(stars)), stars, min(stars), color="#2f81f7", alpha=0.15)
+    axes.scatter([len(stars) - 1], [stars[-1]], color="#2f81f7", s=18, zorder=3)
+    axes.set_axis_off()
+    gain = stars[-1] - stars[0]
+    figure.text(0.02, 0.84, name, fontsize=11, weight="bold")
+    figure.text(0.98, 0.84, f"★ {stars[-1]:,} ({gain:+,} in {len(stars)} snapshots)", fontsize=9, ha="right")
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class ChartService:
+    """进程池渲染 + 按内容哈希的 PNG 缓存（按最近使用时间淘汰）"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_workers=2, max_files=DEFAULT_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+        # 同一份数据同时被请求多次时只渲染一次
+        self._inflight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def prune(self):
+        """缓存超过 max_files 张时删除最久未使用的 PNG，返回删除的数量"""
+        if not self.max_files:
+            return 0
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".png"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        pass
+        excess = len(entries) - self.max_files
+        if excess <= 0:
+            return 0
+        entries.sort()
+        for _, path in entries[:excess]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return excess
+
+    async def chart(self, name, points):
+        """返回序列对应的 PNG（优先读缓存），数据点不足时返回 None"""
+        if len(points) < MIN_POINTS:
+            return None
+        digest = series_hash(name, points)
+        path = os.path.join(self.cache_dir, f"{digest}.png")
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            # mtime 记录最近使用时间，供 prune() 淘汰
+            os.utime(path)
+            self.hits += 1
+            return png
+        except FileNotFoundError:
+            pass
+
+        future = self._inflight.get(digest)
+        if future is None:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            future = self._inflight[digest] = loop.run_in_executor(self.pool, render_sparkline, name, points)
+            try:
+                png = await future
+                write_atomic(path, png)
+                self.prune()
+            finally:
+                self._inflight.pop(digest, None)
+            return png
+        return await future
+
+    async def charts(self, series):
+        """series 为 (仓库名, 序列) 列表，并行渲染，返回 [(仓库名, PNG)]（跳过数据不足的仓库）"""
+        pngs = await asyncio.gather(*(self.chart(name, points) for name, points in series))
+        return [(name, png) for (name, _), png in zip(series, pngs) if png]
+
+
+def main():
+    """从历史库读取仓库的星数历史并渲染到缓存目录"""
+    if len(sys.argv) < 3:
+        print("用法: python3 chart_service.py <历史库> owner/repo [owner/repo ...]")
+        return
+    if not MATPLOTLIB_AVAILABLE:
+        print("❌ 需要 matplotlib: pip install matplotlib")
+        return
+    from history_store import HistoryStore
+
+    store = HistoryStore(sys.argv[1])
+    keys = [name.lower() for name in sys.argv[2:]]
+    history = store.star_history(keys)
+    store.close()
+    service = ChartService()
+    try:
+        charts = asyncio.run(service.charts([(name, history.get(name.lower(), [])) for name in sys.argv[2:]]))
+    finally:
+        service.shutdown()
+    print(f"🖼️  {len(charts)} 张图（缓存命中 {service.hits}，渲染 {service.misses}），保存在 {service.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
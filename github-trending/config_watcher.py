@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+配置热加载
+ConfigWatcher 轮询 .env 等 dotenv 格式文件的 mtime/大小，变化时重新读取文件、重新执行 load_environment()，
+然后整体替换为一个新的 ConfigSnapshot（旧快照不被修改，已经开始的流水线继续使用它开始时拿到的快照）。
+快照里的关键词匹配器和排除索引按内容缓存（见 matchers.py），只有内容变化的那一个会被重新编译。
+只有来自配置文件的环境变量会被热加载更新或移除，进程启动时已有的环境变量始终优先
+"""
+
+import os
+
+from matchers import exclusion_index, keyword_matcher
+from tracing import trace_event
+
+try:
+    from dotenv import dotenv_values
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False
+
+# 导入本模块时（早于任何 load_dotenv()）已有的环境变量视为外部设置，配置文件不覆盖也不删除它们
+_EXTERNAL_KEYS = frozenset(os.environ)
+
+# 运行期间无法替换、需要重启进程才会生效的配置
+RESTART_REQUIRED_KEYS = (
+    "bot_token", "bot_mode", "webhook_url", "webhook_listen", "webhook_port", "webhook_path", "webhook_secret",
+    "job_queue_db", "leader_db", "leader_lease_ttl", "history_db", "telegram_api_base",
+    "profile_sampler_file", "profile_sampler_window", "scrape_interval_minutes", "config_watch_files",
+)
+
+
+class ConfigSnapshot:
+    """某一版本的完整配置，以及按它编译好的匹配器和排除索引（创建后不再修改）"""
+
+    __slots__ = ("config", "version", "matcher", "exclusions")
+
+    def __init__(self, config, version=1):
+        self.config = config
+        self.version = version
+        self.matcher = keyword_matcher(tuple(config["ai_keywords"]))
+        self.exclusions = exclusion_index(tuple(config["exclude_repos"]))
+
+
+def _read_dotenv(path):
+    if not DOTENV_AVAILABLE or not os.path.exists(path):
+        return {}
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+class ConfigWatcher:
+    """监视配置文件，变化时生成新的 ConfigSnapshot"""
+
+    def __init__(self, loader, paths=(".env",), config=None):
+        self.loader = loader
+        self.paths = [os.path.abspath(path) for path in paths]
+        self._stamps = self._stat()
+        # 记录每个文件管理的变量：只有这些会随文件更新，文件里删除时也从环境中移除
+        self._file_keys = {}
+        applied = False
+        for path in self.paths:
+            values = _read_dotenv(path)
+            owned = set()
+            for key, value in values.items():
+                if key in _EXTERNAL_KEYS:
+                    continue
+                # 与 load_dotenv() 相同：启动时不覆盖已有的值（load_dotenv() 已设置的相同值仍归文件管理）
+                if key not in os.environ:
+                    os.environ[key] = value
+                    applied = True
+                elif os.environ[key] != value:
+                    continue
+                owned.add(key)
+            self._file_keys[path] = owned
+        if config is None or applied:
+            config = loader()
+        self.current = ConfigSnapshot(config)
+
+    def _stat(self):
+        stamps = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def _apply_file(self, path):
+        """重新读取文件：更新由该文件管理的变量，文件里已删除的从环境中移除；外部设置的环境变量保持不变"""
+        values = _read_dotenv(path)
+        owned = self._file_keys.get(path, set())
+        shared = set().union(*(keys for other, keys in self._file_keys.items() if other != path))
+        for key in owned - set(values) - shared:
+            os.environ.pop(key, None)
+
+        updated = set()
+        for key, value in values.items():
+            # 新出现的变量只有在环境中还没有时才归该文件管理
+            if key in _EXTERNAL_KEYS or (key not in owned and key in os.environ):
+                continue
+            os.environ[key] = value
+            updated.add(key)
+        self._file_keys[path] = updated
+
+    def check(self):
+        """文件有变化时重新加载，返回 (新快照, 变化的配置项列表)；没有变化返回 None"""
+        stamps = self._stat()
+        if stamps == self._stamps:
+            return None
+        changed_files = [path for path in self.paths if stamps[path] != self._stamps[path]]
+        self._stamps = stamps
+        for path in changed_files:
+            self._apply_file(path)
+
+        try:
+            config = self.loader()
+        except Exception as e:
+            # 文件可能正在被写入，保留旧快照，下次变化时再试
+            trace_event(f"⚠️  重新加载配置失败，继续使用 v{self.current.version}: {e}",
+                        version=self.current.version, error=str(e))
+            return None
+
+        previous = self.current.config
+        changed = sorted(key for key in config.keys() | previous.keys() if config.get(key) != previous.get(key))
+        if not changed:
+            return None
+        # 先完整构建新快照，再一次性替换引用
+        snapshot = ConfigSnapshot(config, self.current.version + 1)
+        self.current = snapshot
+        return snapshot, changed
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+本地 GitHub Trending 模拟服务
+从 HTML fixture（默认 github_trending_structure.html）返回 /trending 及 /trending/<语言> 页面，
+支持 gzip 压缩和可配置的响应延迟，配合 GITHUB_TRENDING_URL 可以离线运行整条流水线
+
+运行: python3 fake_github.py [端口]
+"""
+
+import asyncio
+import gzip
+import sys
+from urllib.parse import urlsplit
+
+from webhook_server import read_http_request, write_http_response
+
+DEFAULT_FIXTURE = "github_trending_structure.html"
+
+
+class FakeGitHubServer:
+    """模拟 github.com/trending 的本地 HTTP 服务"""
+
+    def __init__(self, fixtures=None, default_fixture=DEFAULT_FIXTURE, latency=0.0):
+        # fixtures: {路径: HTML文件}，未列出的 /trending/* 路径使用 default_fixture
+        self.fixtures = dict(fixtures or {})
+        self.default_fixture = default_fixture
+        self.latency = latency
+        self.host = "127.0.0.1"
+        self.port = None
+        self.requests = 0
+        self._pages = {}
+        self._server = None
+
+    @property
+    def trending_url(self):
+        """传给 GITHUB_TRENDING_URL / TrendingFetcher 的地址"""
+        return f"http://{self.host}:{self.port}/trending"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.host = host
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _page(self, path):
+        """读取并缓存 fixture，返回 (原始内容, gzip内容)；没有对应页面时返回 None"""
+        filename = self.fixtures.get(path)
+        if filename is None and (path == "/trending" or path.startswith("/trending/")):
+            filename = self.default_fixture
+        if filename is None:
+            return None
+        if filename not in self._pages:
+            with open(filename, "rb") as f:
+                content = f.read()
+            self._pages[filename] = (content, gzip.compress(content))
+        return self._pages[filename]
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_http_request(reader)
+                if request is None:
+                    break
+                method, path, headers, _ = request
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                page = self._page(urlsplit(path).path.rstrip("/") or "/")
+                if method != "GET" or page is None:
+                    write_http_response(writer, 404, "Not Found", content_type="text/plain")
+                elif "gzip" in headers.get("accept-encoding", ""):
+                    write_http_response(writer, 200, page[1], content_type="text/html; charset=utf-8",
+                                        headers={"Content-Encoding": "gzip"})
+                else:
+                    write_http_response(writer, 200, page[0], content_type="text/html; charset=utf-8")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(port):
+    server = await FakeGitHubServer().start(port=port)
+    print(f"🚀 GitHub 模拟服务已启动: GITHUB_TRENDING_URL={server.trending_url}")
+    await asyncio.Event().wait()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    try:
+        asyncio.run(serve(port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
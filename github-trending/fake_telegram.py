@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+本地 Telegram Bot API 模拟服务
+实现 getMe、sendMessage、getUpdates（长轮询）、setWebhook 等方法，支持可配置的响应延迟和 429 限流，
+用于在不访问 api.telegram.org 的情况下测试和压测机器人（配合 TELEGRAM_API_BASE）
+
+运行: python3 fake_telegram.py [端口] [延迟秒数] [每N次返回429]
+"""
+
+import asyncio
+import itertools
+import json
+import sys
+import time
+from email import policy
+from email.parser import BytesParser
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+from webhook_server import SECRET_HEADER, read_http_request, write_http_response
+
+FAKE_BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "Fake Bot", "username": "fake_trending_bot"}
+
+
+def _decode_value(value):
+    """python-telegram-bot 把非字符串参数编码成JSON字符串"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_params(path, headers, body):
+    """解析查询串、JSON、表单或 multipart 请求参数"""
+    params = {key: _decode_value(value) for key, value in parse_qsl(urlsplit(path).query)}
+    content_type = headers.get("content-type", "")
+
+    if not body:
+        return params
+    if content_type.startswith("application/json"):
+        params.update(json.loads(body))
+    elif content_type.startswith("application/x-www-form-urlencoded"):
+        params.update({key: _decode_value(value) for key, value in parse_qsl(body.decode("utf-8"))})
+    elif content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if part.get_filename():
+                params[name] = {"filename": part.get_filename(), "size": len(payload)}
+            else:
+                params[name] = _decode_value(payload.decode("utf-8"))
+    return params
+
+
+def make_command_update(update_id, chat_id, text="/help"):
+    """构造一条私聊命令消息的更新（与 Telegram 返回的JSON结构一致）"""
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+class FakeTelegramServer:
+    """模拟 Bot API 的本地 HTTP 服务"""
+
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=1, rate_limited_methods=("sendMessage",)):
+        # 每个请求的额外延迟（秒）；每 rate_limit_every 次受限方法调用返回一次 429
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rate_limited_methods = set(rate_limited_methods)
+        self.rate_limited = 0
+        self.host = "127.0.0.1"
+        self.port = None
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.sent_messages = []
+        self.calls = {}
+        self._pending = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates_changed = None
+        self._waiters = {}
+        self._server = None
+        self._client = None
+
+    @property
+    def api_base(self):
+        """传给 TELEGRAM_API_BASE 的地址"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def base_url(self):
+        """传给 Application.builder().base_url() 的地址"""
+        return f"{self.api_base}/bot"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.host = host
+        self._updates_changed = asyncio.Condition()
+        self._client = httpx.AsyncClient(timeout=30)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._client:
+            await self._client.aclose()
+
+    def next_update_id(self):
+        return next(self._update_ids)
+
+    async def push_update(self, update):
+        """投递一条更新：已设置 webhook 时直接 POST，否则排队等待 getUpdates"""
+        if self.webhook_url:
+            headers = {SECRET_HEADER: self.webhook_secret} if self.webhook_secret else {}
+            await self._client.post(self.webhook_url, json=update, headers=headers)
+            return
+        async with self._updates_changed:
+            self._pending.append(update)
+            self._updates_changed.notify_all()
+
+    def expect_message(self, chat_id, predicate=None):
+        """返回一个 Future，在机器人向 chat_id 发送下一条（满足 predicate(text) 的）消息时完成（值为接收时间）"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((future, predicate))
+        return future
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_http_request(reader)
+                if request is None:
+                    break
+                status, payload = await self._dispatch(*request)
+                headers = {"Retry-After": self.retry_after} if status == 429 else None
+                write_http_response(writer, status, json.dumps(payload), headers=headers)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 服务关闭时仍在长轮询的连接
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, body):
+        parts = urlsplit(path).path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+        api_method = parts[1]
+        params = parse_params(path, headers, body)
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._should_rate_limit(api_method):
+            self.rate_limited += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        handler = getattr(self, f"_api_{api_method}", None)
+        result = await handler(params) if handler else True
+        return 200, {"ok": True, "result": result}
+
+    def _should_rate_limit(self, api_method):
+        if not self.rate_limit_every or api_method not in self.rate_limited_methods:
+            return False
+        return self.calls[api_method] % self.rate_limit_every == 0
+
+    async def _api_getMe(self, params):
+        return FAKE_BOT_USER
+
+    def _record_message(self, chat_id, **fields):
+        """保存机器人发出的消息并唤醒等待该会话的 Future"""
+        received_at = time.perf_counter()
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": FAKE_BOT_USER,
+            **fields,
+        }
+        self.sent_messages.append(message)
+        waiting = []
+        for future, predicate in self._waiters.pop(chat_id, []):
+            if future.done():
+                continue
+            if predicate is None or predicate(message.get("text") or message.get("caption", "")):
+                future.set_result(received_at)
+            else:
+                waiting.append((future, predicate))
+        if waiting:
+            self._waiters[chat_id] = waiting
+        return message
+
+    async def _api_sendMessage(self, params):
+        return self._record_message(int(params["chat_id"]), text=str(params.get("text", "")))
+
+    async def _api_sendDocument(self, params):
+        document = params.get("document") or {}
+        return self._record_message(
+            int(params["chat_id"]),
+            caption=str(params.get("caption", "")),
+            document={"file_id": f"doc{document.get('size', 0)}", "file_unique_id": "doc",
+                      "file_name": document.get("filename"), "file_size": document.get("size")},
+        )
+
+    def _photo(self, attached):
+        attached = attached if isinstance(attached, dict) else {}
+        size = attached.get("size", 0)
+        return [{"file_id": f"photo{size}", "file_unique_id": "photo", "width": 480, "height": 160, "file_size": size}]
+
+    async def _api_sendPhoto(self, params):
+        return self._record_message(int(params["chat_id"]), caption=str(params.get("caption", "")),
+                                    photo=self._photo(params.get("photo")))
+
+    async def _api_sendMediaGroup(self, params):
+        # media 中的 "attach://<字段名>" 指向 multipart 里的文件
+        messages = []
+        for item in params.get("media") or []:
+            attached = params.get(str(item.get("media", "")).removeprefix("attach://"))
+            messages.append(self._record_message(int(params["chat_id"]), caption=str(item.get("caption", "")),
+                                                 photo=self._photo(attached)))
+        return messages
+
+    async def _api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        async with self._updates_changed:
+            self._pending = [u for u in self._pending if u["update_id"] >= offset]
+            if not self._pending and timeout:
+                try:
+                    await asyncio.wait_for(self._updates_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            limit = int(params.get("limit") or 100)
+            return self._pending[:limit]
+
+    async def _api_setWebhook(self, params):
+        self.webhook_url = params.get("url") or None
+        self.webhook_secret = params.get("secret_token")
+        return True
+
+    async def _api_deleteWebhook(self, params):
+        self.webhook_url = None
+        self.webhook_secret = None
+        return True
+
+    async def _api_getWebhookInfo(self, params):
+        return {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": len(self._pending)}
+
+
+async def serve(port, latency, rate_limit_every):
+    server = await FakeTelegramServer(latency=latency, rate_limit_every=rate_limit_every).start(port=port)
+    print(f"🚀 Telegram 模拟服务已启动: TELEGRAM_API_BASE={server.api_base}")
+    await asyncio.Event().wait()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8082
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    rate_limit_every = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    try:
+        asyncio.run(serve(port, latency, rate_limit_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+新上榜AI仓库的增量 Atom 订阅源
+每次运行只追加之前没出现过的仓库，条目数量有上限；
+连续 seen_days 天没有上榜的仓库会从已见集合中移除，之后再上榜时视为新仓库，状态文件不会无限增长。
+没有新仓库时输出与上次逐字节相同，下游可以直接用 ETag/If-None-Match 做条件请求
+"""
+
+import json
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+from output_writer import write_if_changed
+from repo_record import records_from_dicts
+
+DEFAULT_FEED_FILENAME = "github_trending_ai.atom"
+DEFAULT_STATE_FILENAME = "github_trending_feed_state.json"
+DEFAULT_MAX_ITEMS = 50
+DEFAULT_SEEN_DAYS = 90
+
+FEED_HEADER = (
+    "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n"
+    "<feed xmlns=\"http://www.w3.org/2005/Atom\">\n"
+    "  <title>GitHub Trending (AI/LLM/Agent相关) - 新上榜仓库</title>\n"
+    "  <id>https://github.com/trending#ai</id>\n"
+    "  <link href=\"https://github.com/trending\"/>\n"
+    "  <updated>{updated}</updated>\n"
+).format
+FEED_ENTRY = (
+    "  <entry>\n"
+    "    <title>{title}</title>\n"
+    "    <id>{url}</id>\n"
+    "    <link href={url_attr}/>\n"
+    "    <updated>{first_seen}</updated>\n"
+    "    <summary>⭐ {stars} | {summary}</summary>\n"
+    "  </entry>\n"
+).format
+FEED_FOOTER = "</feed>\n"
+
+
+def load_feed_state(state_path=DEFAULT_STATE_FILENAME):
+    """读取订阅源状态：已见过的仓库（最后一次上榜的日期）和当前窗口内的条目"""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {"seen": {}, "items": []}
+    state.setdefault("seen", {})
+    state.setdefault("items", [])
+    return state
+
+
+def render_feed(items):
+    """把条目渲染为 Atom XML（更新时间取最新条目，保证无变化时输出稳定）"""
+    updated = items[0]["first_seen"] if items else "1970-01-01T00:00:00+00:00"
+    parts = [FEED_HEADER(updated=updated)]
+    for item in items:
+        parts.append(FEED_ENTRY(
+            title=escape(item["name"]),
+            url=escape(item["url"]),
+            url_attr=quoteattr(item["url"]),
+            first_seen=item["first_seen"],
+            stars=item["stars"],
+            summary=escape(item["description"]),
+        ))
+    parts.append(FEED_FOOTER)
+    return "".join(parts)
+
+
+def update_feed(repositories, feed_path=DEFAULT_FEED_FILENAME, state_path=DEFAULT_STATE_FILENAME,
+                max_items=DEFAULT_MAX_ITEMS, now=None, seen_days=DEFAULT_SEEN_DAYS):
+    """把本次抓取中新出现的仓库追加到订阅源，返回新增条目数"""
+    state = load_feed_state(state_path)
+    seen = state["seen"]
+    now = (now or datetime.now()).astimezone()
+    first_seen = now.isoformat(timespec="seconds")
+    # 只记录日期：同一天内重复上榜不会改变状态文件
+    today = now.date().isoformat()
+
+    # 旧状态中保存的是完整时间戳，前 10 个字符同样是日期，可以直接按字符串比较
+    cutoff = (now - timedelta(days=seen_days)).date().isoformat()
+    expired = [key for key, last_seen in seen.items() if last_seen[:10] < cutoff]
+    for key in expired:
+        del seen[key]
+    changed = bool(expired)
+
+    new_items = []
+    for record in records_from_dicts(repositories):
+        if record.key in seen:
+            if seen[record.key][:10] != today:
+                seen[record.key] = today
+                changed = True
+            continue
+        seen[record.key] = today
+        new_items.append({
+            "name": record.name,
+            "url": record.url,
+            "description": record.description,
+            "stars": record.stars,
+            "first_seen": first_seen,
+        })
+
+    if new_items:
+        state["items"] = (new_items + state["items"])[:max_items]
+    if new_items or changed:
+        write_if_changed(state_path, json.dumps(state, ensure_ascii=False, indent=2))
+
+    # 无新条目时内容不变，write_if_changed 会跳过写入
+    write_if_changed(feed_path, render_feed(state["items"]))
+    return len(new_items)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Trending 页面抓取层：对冲请求 + 抖动退避重试 + 熔断器
+请求超过最近 p95 延迟仍未返回时发出第二个（对冲）请求，取先成功的一个；
+连续失败后熔断，熔断期间直接返回上一次成功抓取的缓存结果，不再等待故障的上游；
+传输层协商 gzip/deflate（安装 brotli 时还有 br），按块流式读取并增量解压
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from urllib3.util.request import ACCEPT_ENCODING
+
+from output_writer import write_atomic
+from profiler import profiled
+from tracing import span, trace_event, wrap_context
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "github_trending.html")
+# 流式读取的块大小（解压后的字节数）
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchResult:
+    """抓取结果（与 requests.Response 一样提供 .content）"""
+
+    __slots__ = ("content", "fetched_at", "from_cache", "elapsed")
+
+    def __init__(self, content, fetched_at, from_cache=False, elapsed=0.0):
+        self.content = content
+        self.fetched_at = fetched_at
+        self.from_cache = from_cache
+        self.elapsed = elapsed
+
+
+class LatencyTracker:
+    """记录最近的请求延迟，用 p95 作为对冲阈值"""
+
+    def __init__(self, window=100, default=2.0, minimum=0.2, maximum=10.0, min_samples=10):
+        self.samples = deque(maxlen=window)
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self):
+        p95 = self.p95()
+        if p95 is None:
+            return self.default
+        return max(self.minimum, min(self.maximum, p95))
+
+
+class CircuitBreaker:
+    """closed -> (连续失败) open -> (冷却结束) half-open -> 成功则 closed
+
+    half-open 时只放行一个试探请求，它成功或失败之前其他调用方仍按熔断处理
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self):
+        """放行时返回当时的状态（"closed" 或 "half-open"，后者即本次为试探请求），拒绝时返回 None"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return state
+            if state == "open" or self._probing:
+                return None
+            self._probing = True
+            return state
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # half-open 状态下的失败会重新开始冷却
+                self.opened_at = time.monotonic()
+
+
+class TrendingFetcher:
+    """带对冲、重试、熔断和缓存的页面抓取器"""
+
+    def __init__(self, url="https://github.com/trending", headers=None, timeout=30, retries=2,
+                 backoff_base=1.0, cache_path=DEFAULT_CACHE_PATH, session=None):
+        self.url = url
+        self.headers = dict(headers or {"User-Agent": "Mozilla/5.0"})
+        # urllib3 的 ACCEPT_ENCODING 只包含当前环境能解压的编码（brotli 已安装时含 br）
+        self.headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.cache_path = cache_path
+        self.session = session or requests.Session()
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="trending-fetch")
+        self._cached = None
+
+    def _request(self):
+        started = time.monotonic()
+        with span("fetch.request", url=self.url) as request_span:
+            response = self.session.get(self.url, headers=self.headers, timeout=self.timeout, stream=True)
+            try:
+                request_span.set(status_code=response.status_code,
+                                 content_encoding=response.headers.get("Content-Encoding", "identity"))
+                response.raise_for_status()
+                # iter_content 边接收边解压，不需要先缓存整个压缩包体
+                content = b"".join(response.iter_content(CHUNK_SIZE))
+            finally:
+                response.close()
+            request_span.set(bytes=len(content))
+        elapsed = time.monotonic() - started
+        self.latency.record(elapsed)
+        return FetchResult(content, time.time(), elapsed=elapsed)
+
+    def _hedged_request(self):
+        """发出主请求；超过对冲阈值未返回时再发一个，返回先成功的结果"""
+        pending = {self._executor.submit(wrap_context(profiled(self._request)))}
+        done, pending = wait(pending, timeout=self.latency.hedge_delay())
+        if not done:
+            trace_event("⏱️  请求超过对冲阈值，发出对冲请求")
+            pending.add(self._executor.submit(wrap_context(profiled(self._request))))
+
+        error = None
+        while True:
+            for future in done:
+                try:
+                    return future.result()
+                except requests.exceptions.RequestException as e:
+                    error = e
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _store_cache(self, result):
+        self._cached = result
+        if self.cache_path:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+                write_atomic(self.cache_path, result.content)
+            except OSError as e:
+                trace_event(f"⚠️  写入页面缓存失败: {e}")
+
+    def cached(self):
+        """返回最近一次成功的结果（内存优先，其次磁盘），没有则返回 None"""
+        if self._cached is not None:
+            return FetchResult(self._cached.content, self._cached.fetched_at, from_cache=True)
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path, "rb") as f:
+                return FetchResult(f.read(), os.path.getmtime(self.cache_path), from_cache=True)
+        return None
+
+    def _serve_cache(self, reason):
+        result = self.cached()
+        if result is None:
+            trace_event(f"❌ {reason}，且没有可用的缓存")
+            return None
+        age = int(time.time() - result.fetched_at)
+        trace_event(f"⚠️  {reason}，返回 {age} 秒前的缓存结果", cache_age=age)
+        return result
+
+    def fetch(self):
+        """抓取页面，失败或熔断时返回缓存，都不可用时返回 None"""
+        with span("fetch", url=self.url, breaker=self.breaker.state) as fetch_span:
+            result = self._fetch()
+            fetch_span.set(ok=result is not None, from_cache=bool(result and result.from_cache))
+            return result
+
+    def _probe(self):
+        """half-open 时的单个试探请求：不对冲、不重试，成功则恢复，失败则重新开始冷却"""
+        trace_event("🔌 熔断冷却结束，发出试探请求")
+        try:
+            result = self._request()
+        except requests.exceptions.RequestException as e:
+            trace_event(f"❌ 试探请求失败: {e}")
+            self.breaker.record_failure()
+            return self._serve_cache("获取页面失败")
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        self._store_cache(result)
+        return result
+
+    def _fetch(self):
+        admitted = self.breaker.allow_request()
+        if admitted is None:
+            return self._serve_cache("上游熔断中")
+        if admitted == "half-open":
+            return self._probe()
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = self._hedged_request()
+            except requests.exceptions.Timeout:
+                trace_event("❌ 请求超时，请检查网络连接", attempt=attempt)
+            except requests.exceptions.RequestException as e:
+                trace_event(f"❌ 获取页面失败: {e}", attempt=attempt)
+            else:
+                self.breaker.record_success()
+                self._store_cache(result)
+                return result
+
+            if attempt < self.retries:
+                # full jitter 指数退避
+                time.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
+
+        self.breaker.record_failure()
+        return self._serve_cache("获取页面失败")
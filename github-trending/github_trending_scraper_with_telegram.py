@@ -7,15 +7,25 @@ GitHub Trending Scraper with Telegram Notification and Git Auto-Push
 """
 
 import requests
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
 import os
-import sys
 import subprocess
-import json
 from pathlib import Path
 
+from render_engine import render_all, ALL_FORMATS, VOLATILE_LINES
+from history_export import append_snapshot
+from output_writer import OutputWriter, write_if_changed
+from feed import update_feed
+from site_generator import update_site
+from history_store import HistoryStore
+from notified_set import NotifiedSet
+from fetch_layer import TrendingFetcher
+from trending_parser import parse_repositories
+from parse_executor import configure_shared_executor, shared_executor, shutdown_shared_executor
+from repo_merge import DEFAULT_SLICE, SliceMerger, slice_cache_path, slice_url
+from http_cassette import CASSETTE_MODES, eject_cassette, use_cassette
+from tracing import setup_tracing, span, trace_event
+from matchers import DEFAULT_AI_KEYWORDS, exclusion_index, keyword_matcher
+
 try:
     from dotenv import load_dotenv
     DOTENV_AVAILABLE = True
@@ -24,6 +34,9 @@ except ImportError:
     print("⚠️  python-dotenv 未安装，将使用系统环境变量")
     print("   安装: pip install python-dotenv")
 
+DEFAULT_TELEGRAM_API_BASE = "https://api.telegram.org"
+DEFAULT_GITHUB_TRENDING_URL = "https://github.com/trending"
+
 
 def load_environment():
     """从.env文件或环境变量加载配置"""
@@ -33,8 +46,31 @@ def load_environment():
         "git_auto_push": True,
         "git_commit_message": "自动更新每日 GitHub 趋势数据",
         "exclude_repos": ["openclaw/openclaw"],
+        "ai_keywords": list(DEFAULT_AI_KEYWORDS),
         "max_repos_in_telegram": 5,
-        "save_filename": "github_trending_ai.md"
+        "save_filename": "github_trending_ai.md",
+        "history_parquet_dir": "",
+        "render_formats": ["markdown", "telegram", "json"],
+        "feed_filename": "github_trending_ai.atom",
+        "feed_state_filename": "github_trending_feed_state.json",
+        "feed_max_items": 50,
+        "feed_seen_days": 90,
+        "site_dir": "",
+        "history_db": "github_trending_history.db",
+        "notify_new_only": False,
+        "notified_dir": "notified",
+        "job_queue_db": "",
+        "telegram_api_base": DEFAULT_TELEGRAM_API_BASE,
+        "github_trending_url": DEFAULT_GITHUB_TRENDING_URL,
+        "trending_slices": [],
+        "parse_workers": 0,
+        "http_cassette": "",
+        "http_cassette_mode": "replay",
+        "trace_file": "",
+        "trace_otlp_endpoint": "",
+        "trace_console": True,
+        "config_watch_files": [".env"],
+        "config_reload_interval": 5
     }
     
     # 尝试从.env文件加载
@@ -60,6 +96,11 @@ def load_environment():
     if exclude_repos_str:
         config["exclude_repos"] = [repo.strip() for repo in exclude_repos_str.split(",") if repo.strip()]
     
+    # AI 相关关键词（逗号分隔，不区分大小写，匹配名称或描述中的子串）
+    ai_keywords_str = os.getenv("AI_KEYWORDS", "")
+    if ai_keywords_str:
+        config["ai_keywords"] = [kw.strip().lower() for kw in ai_keywords_str.split(",") if kw.strip()]
+    
     # 其他配置
     max_repos = os.getenv("MAX_REPOS_IN_TELEGRAM")
     if max_repos and max_repos.isdigit():
@@ -67,203 +108,182 @@ def load_environment():
     
     config["save_filename"] = os.getenv("SAVE_FILENAME", config["save_filename"])
     
+    # 列式历史导出目录（为空则不导出）
+    config["history_parquet_dir"] = os.getenv("HISTORY_PARQUET_DIR", config["history_parquet_dir"])
+    
+    # 输出格式（markdown/telegram/json 始终生成，可额外启用 html、rss）
+    render_formats_str = os.getenv("RENDER_FORMATS", "")
+    if render_formats_str:
+        extra = [fmt.strip().lower() for fmt in render_formats_str.split(",") if fmt.strip().lower() in ALL_FORMATS]
+        config["render_formats"] = list(dict.fromkeys(config["render_formats"] + extra))
+    
+    # Atom 订阅源（FEED_FILENAME 为空则不生成）
+    config["feed_filename"] = os.getenv("FEED_FILENAME", config["feed_filename"])
+    config["feed_state_filename"] = os.getenv("FEED_STATE_FILENAME", config["feed_state_filename"])
+    feed_max_items = os.getenv("FEED_MAX_ITEMS")
+    if feed_max_items and feed_max_items.isdigit():
+        config["feed_max_items"] = int(feed_max_items)
+    feed_seen_days = os.getenv("FEED_SEEN_DAYS")
+    if feed_seen_days and feed_seen_days.isdigit():
+        config["feed_seen_days"] = int(feed_seen_days)
+    
+    # 静态归档站点目录（为空则不生成）
+    config["site_dir"] = os.getenv("SITE_DIR", config["site_dir"])
+    
+    # SQLite 历史库（全文搜索等功能使用，为空则不保存）
+    config["history_db"] = os.getenv("HISTORY_DB", config["history_db"])
+    
+    # 订阅通知只发送该聊天尚未收到过的仓库（按聊天保存的布隆过滤器目录）
+    notify_new_only = os.getenv("NOTIFY_NEW_ONLY", "false").lower()
+    config["notify_new_only"] = notify_new_only in ("true", "1", "yes", "y")
+    config["notified_dir"] = os.getenv("NOTIFIED_DIR", config["notified_dir"])
+    
+    # 任务队列数据库（job_queue.py 工作进程与 Bot 共用，为空时工作进程使用默认文件）
+    config["job_queue_db"] = os.getenv("JOB_QUEUE_DB", config["job_queue_db"])
+    
+    # 外部服务地址（指向本地模拟服务即可离线运行）
+    config["telegram_api_base"] = os.getenv("TELEGRAM_API_BASE", config["telegram_api_base"]).rstrip("/")
+    config["github_trending_url"] = os.getenv("GITHUB_TRENDING_URL", config["github_trending_url"])
+    
+    # 要抓取并合并的 trending 分片（逗号分隔，如 daily,weekly,python:daily；为空只抓取主页面）
+    slices_str = os.getenv("TRENDING_SLICES", "")
+    if slices_str:
+        config["trending_slices"] = list(dict.fromkeys(name.strip().lower() for name in slices_str.split(",") if name.strip()))
+    # 多个分片并行解析的进程数（0 表示按 CPU 核数）
+    parse_workers = os.getenv("PARSE_WORKERS")
+    if parse_workers and parse_workers.isdigit():
+        config["parse_workers"] = int(parse_workers)
+    
+    # HTTP 录制/回放文件（为空则关闭），模式为 record 或 replay
+    config["http_cassette"] = os.getenv("HTTP_CASSETTE", config["http_cassette"])
+    cassette_mode = os.getenv("HTTP_CASSETTE_MODE", config["http_cassette_mode"]).lower()
+    config["http_cassette_mode"] = cassette_mode if cassette_mode in CASSETTE_MODES else "replay"
+    
+    # 链路追踪：JSON 行文件和/或 OTLP collector 地址（为空则关闭），是否同时输出到控制台
+    config["trace_file"] = os.getenv("TRACE_FILE", config["trace_file"])
+    config["trace_otlp_endpoint"] = os.getenv("TRACE_OTLP_ENDPOINT", config["trace_otlp_endpoint"])
+    trace_console = os.getenv("TRACE_CONSOLE", "true").lower()
+    config["trace_console"] = trace_console in ("true", "1", "yes", "y")
+    
+    # 配置热加载：监视的 dotenv 文件（逗号分隔）和轮询间隔（秒，0 表示关闭）
+    watch_files_str = os.getenv("CONFIG_WATCH_FILES", "")
+    if watch_files_str:
+        config["config_watch_files"] = [path.strip() for path in watch_files_str.split(",") if path.strip()]
+    reload_interval = os.getenv("CONFIG_RELOAD_INTERVAL")
+    if reload_interval and reload_interval.isdigit():
+        config["config_reload_interval"] = int(reload_interval)
+    
     return config
 
 
-def scrape_github_trending():
-    """抓取GitHub Trending页面"""
-    url = "https://github.com/trending"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.Timeout:
-        print("❌ 请求超时，请检查网络连接")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 获取页面失败: {e}")
-        return None
+# 对冲请求 + 重试 + 熔断，失败时返回上一次成功的缓存页面
+trending_fetcher = TrendingFetcher(DEFAULT_GITHUB_TRENDING_URL, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+# 各分片的抓取器（按需创建，共享主抓取器的 session）
+slice_fetchers = {}
 
 
-def parse_repositories(html_content):
-    """解析HTML内容，提取仓库信息"""
-    soup = BeautifulSoup(html_content, "html.parser")
-    repo_elements = soup.find_all("article", class_="Box-row")
-    
-    repositories = []
-    
-    for repo in repo_elements:
-        info = extract_repository_info(repo)
-        if info:
-            repositories.append(info)
-    
-    return repositories
+def configure_fetcher(config):
+    """按配置设置抓取地址和解析进程池大小，并按需挂载 HTTP 录制/回放"""
+    trending_fetcher.url = config["github_trending_url"]
+    configure_shared_executor(config["parse_workers"])
+    slice_fetchers.clear()
+    if config["http_cassette"]:
+        use_cassette(trending_fetcher.session, config["http_cassette"], config["http_cassette_mode"])
+        trace_event(f"📼 HTTP cassette: {config['http_cassette']} ({config['http_cassette_mode']})")
+    else:
+        eject_cassette(trending_fetcher.session)
 
 
-def extract_repository_info(repo_element):
-    """从仓库元素中提取详细信息"""
-    try:
-        # 提取名称和URL
-        h2 = repo_element.find("h2", class_="h3")
-        if not h2:
-            return None
-        
-        a = h2.find("a")
-        if not a:
-            return None
-        
-        name = a.get_text(strip=True).replace(" ", "")
-        url = "https://github.com" + a["href"]
-        
-        # 验证URL
-        if not re.match(r'^https://github\.com/[^/]+/[^/]+$', url):
-            return None
-        
-        # 提取描述
-        description = "N/A"
-        p = repo_element.find("p", class_="col-9")
-        if p:
-            description = p.get_text(strip=True)
-        
-        # 提取星数
-        stars = "0"
-        star_link = repo_element.find("a", href=lambda x: x and "/stargazers" in x)
-        if star_link:
-            stars_text = star_link.get_text(strip=True)
-            stars = stars_text.replace(",", "")
-            if not stars.isdigit():
-                stars = "0"
-        
-        return {
-            "name": name,
-            "url": url,
-            "description": description,
-            "stars": stars
-        }
-    except Exception as e:
-        print(f"⚠️ 提取仓库信息时出错: {e}")
+def scrape_github_trending():
+    """抓取GitHub Trending页面（返回带 .content 的结果，失败且无缓存时返回 None）"""
+    return trending_fetcher.fetch()
+
+
+def slice_fetcher(name):
+    """返回分片对应的抓取器（各自独立的熔断状态和页面缓存）"""
+    fetcher = slice_fetchers.get(name)
+    if fetcher is None:
+        fetcher = TrendingFetcher(slice_url(trending_fetcher.url, name), headers={"User-Agent": "Mozilla/5.0"},
+                                  timeout=30, cache_path=slice_cache_path(name), session=trending_fetcher.session)
+        slice_fetchers[name] = fetcher
+    return fetcher
+
+
+def scrape_trending_slices(slices):
+    """抓取各个分片，返回 [(分片名, 抓取结果)]，失败且无缓存的分片被跳过；未配置分片时只抓取主页面"""
+    if not slices:
+        response = scrape_github_trending()
+        return [(DEFAULT_SLICE, response)] if response else []
+    pages = []
+    for name in slices:
+        response = slice_fetcher(name).fetch()
+        if response:
+            pages.append((name, response))
+        else:
+            trace_event(f"⚠️  分片 {name} 抓取失败，跳过", slice=name)
+    return pages
+
+
+def scrape_and_merge(slices):
+    """抓取并解析全部分片，按 owner/repo 合并为唯一仓库；全部抓取失败时返回 None"""
+    pages = scrape_trending_slices(slices)
+    if not pages:
         return None
+    with span("parse", pages=len(pages), bytes=sum(len(response.content) for _, response in pages)) as parse_span:
+        if len(pages) == 1:
+            parsed = {pages[0][0]: parse_repositories(pages[0][1].content)}
+        else:
+            parsed = shared_executor().parse_all((name, response.content) for name, response in pages)
+        # 按配置顺序合并：抓取时间相同时，靠前的分片的指标优先
+        merger = SliceMerger()
+        for name, response in pages:
+            merger.add(name, parsed[name], response.fetched_at, response.from_cache)
+        parse_span.set(rows=merger.rows, repos=len(merger), cached_slices=len(merger.cached_slices))
+    return merger
 
 
-def filter_ai_repositories(repositories):
-    """过滤AI/LLM/Agent相关仓库"""
-    ai_keywords = [
-        "ai", "llm", "agent", "machine learning", "deep learning",
-        "neural network", "transformer", "gpt", "chatgpt", "openai",
-        "anthropic", "claude", "gemini", "vector", "embedding", "rag",
-        "language model", "large language model", "ai agent"
-    ]
-    
-    filtered = []
-    
-    for repo in repositories:
-        desc_lower = repo["description"].lower()
-        name_lower = repo["name"].lower()
-        
-        for keyword in ai_keywords:
-            if keyword in desc_lower or keyword in name_lower:
-                filtered.append(repo)
-                break
-    
-    return filtered
+def cache_notice(cache_age):
+    """数据来自缓存页面时加在通知开头的说明"""
+    return f"⚠️ GitHub Trending 暂时无法访问，以下是 {cache_age} 秒前缓存的数据\n\n"
+
+
+def filter_ai_repositories(repositories, keywords=DEFAULT_AI_KEYWORDS):
+    """过滤AI/LLM/Agent相关仓库（名称或描述包含任一关键词）"""
+    return keyword_matcher(tuple(keywords)).filter(repositories)
 
 
 def exclude_repositories(repositories, exclude_names):
-    """排除特定仓库"""
+    """排除特定仓库（名称包含任一排除项，不区分大小写）"""
     if not exclude_names:
         return repositories
-    
-    filtered = []
-    
-    for repo in repositories:
-        exclude = False
-        for exclude_name in exclude_names:
-            if exclude_name.lower() in repo["name"].lower():
-                exclude = True
-                break
-        
-        if not exclude:
-            filtered.append(repo)
-    
-    return filtered
+    return exclusion_index(tuple(exclude_names)).apply(repositories)
 
 
 def create_markdown_table(repositories):
     """生成Markdown表格"""
-    if not repositories:
-        return "# GitHub Trending\n\n未找到相关仓库。"
-    
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 表格标题
-    markdown = f"# GitHub Trending (AI/LLM/Agent相关) - {current_date}\n\n"
-    markdown += "| 仓库名称 | URL | 描述（功能） | 星数 |\n"
-    markdown += "|----------|-----|--------------|------|\n"
-    
-    # 表格内容
-    for repo in repositories:
-        name = repo["name"].replace("|", "\\|")
-        url = repo["url"]
-        desc = repo["description"].replace("|", "\\|").replace("\n", " ")
-        stars = repo["stars"]
-        
-        markdown += f"| {name} | [{url}]({url}) | {desc} | {stars} |\n"
-    
-    # 统计信息
-    markdown += f"\n**总计: {len(repositories)} 个仓库**\n"
-    markdown += f"**更新时间: {current_date}**\n"
-    
-    return markdown
+    return render_all(repositories, formats=("markdown",))["markdown"]
 
 
 def create_telegram_message(repositories, max_repos=5):
     """创建适合Telegram的消息（限制在4096字符内）"""
-    if not repositories:
-        return "GitHub Trending: 今天没有找到AI/LLM/Agent相关仓库。"
-    
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-    
-    # 创建消息头
-    message = f"🚀 *GitHub Trending (AI/LLM/Agent相关) - {current_date}*\n\n"
-    
-    # 添加前几个仓库（避免消息过长）
-    max_repos = min(max_repos, len(repositories))
-    for i, repo in enumerate(repositories[:max_repos], 1):
-        # 缩短描述以避免消息过长
-        short_desc = repo["description"][:80] + "..." if len(repo["description"]) > 80 else repo["description"]
-        message += f"{i}. *{repo['name']}*\n"
-        message += f"   ⭐ {repo['stars']} | {short_desc}\n"
-        message += f"   🔗 {repo['url']}\n\n"
-    
-    if len(repositories) > max_repos:
-        message += f"... 还有 {len(repositories) - max_repos} 个仓库\n\n"
-    
-    message += f"📊 总计: {len(repositories)} 个仓库"
-    
-    # 检查消息长度（Telegram限制4096字符）
-    if len(message) > 4000:
-        # 如果太长，进一步缩短
-        message = message[:3900] + "\n\n...（消息过长，已截断）"
-    
-    return message
+    return render_all(repositories, formats=("telegram",), max_telegram_repos=max_repos)["telegram"]
 
 
-def send_telegram_message(bot_token, chat_id, message):
+def send_telegram_message(bot_token, chat_id, message, parse_mode="Markdown", api_base=DEFAULT_TELEGRAM_API_BASE):
     """通过Telegram Bot发送消息"""
     if not bot_token or not chat_id:
-        print("⚠️  Telegram配置不完整，跳过发送消息")
+        trace_event("⚠️  Telegram配置不完整，跳过发送消息")
         return False
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    api_url = f"{api_base}/bot{bot_token}/sendMessage"
     
     payload = {
         "chat_id": chat_id,
         "text": message,
-        "parse_mode": "Markdown",
         "disable_web_page_preview": True
     }
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
     
     try:
         response = requests.post(api_url, json=payload, timeout=30)
@@ -271,43 +291,74 @@ def send_telegram_message(bot_token, chat_id, message):
         
         result = response.json()
         if result.get("ok"):
-            print(f"✅ Telegram消息发送成功！消息ID: {result['result']['message_id']}")
+            trace_event(f"✅ Telegram消息发送成功！消息ID: {result['result']['message_id']}")
             return True
         else:
-            print(f"❌ Telegram API返回错误: {result.get('description', 'Unknown error')}")
+            trace_event(f"❌ Telegram API返回错误: {result.get('description', 'Unknown error')}")
             return False
             
     except requests.exceptions.Timeout:
-        print("❌ 发送Telegram消息超时")
+        trace_event("❌ 发送Telegram消息超时")
         return False
     except requests.exceptions.RequestException as e:
-        print(f"❌ 发送Telegram消息失败: {e}")
+        trace_event(f"❌ 发送Telegram消息失败: {e}")
         return False
     except Exception as e:
-        print(f"❌ 处理Telegram响应时出错: {e}")
+        trace_event(f"❌ 处理Telegram响应时出错: {e}")
         return False
 
 
 def save_markdown(content, filename="github_trending_ai.md"):
     """保存Markdown文件"""
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"✅ 数据已保存到 {filename}")
+        if write_if_changed(filename, content, ignore=VOLATILE_LINES):
+            trace_event(f"✅ 数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
         return True
     except Exception as e:
-        print(f"❌ 保存文件失败: {e}")
+        trace_event(f"❌ 保存文件失败: {e}")
+        return False
+
+
+def extra_format_files(rendered, base_filename="github_trending_ai.md"):
+    """额外启用的输出格式（HTML/RSS）对应的 {文件名: 内容}，文件名沿用Markdown文件名"""
+    suffixes = {"html": ".html", "rss": ".xml"}
+    return {
+        str(Path(base_filename).with_suffix(suffix)): rendered[fmt]
+        for fmt, suffix in suffixes.items()
+        if fmt in rendered
+    }
+
+
+def save_outputs(outputs):
+    """批量保存 {文件名: 内容}，相同内容只编码和哈希一次，除生成时间外未变化的文件跳过写入"""
+    writer = OutputWriter(ignore=VOLATILE_LINES)
+    for filename, content in outputs.items():
+        writer.add(filename, content)
+    
+    try:
+        results = writer.flush()
+    except Exception as e:
+        trace_event(f"❌ 保存文件失败: {e}")
         return False
+    
+    for filename, written in results.items():
+        if written:
+            trace_event(f"✅ 数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
+    return True
 
 
-def test_telegram_bot(bot_token, chat_id):
+def test_telegram_bot(bot_token, chat_id, api_base=DEFAULT_TELEGRAM_API_BASE):
     """测试Telegram Bot连接"""
     if not bot_token or not chat_id:
         return False
     
-    print("🔍 测试Telegram Bot连接...")
+    trace_event("🔍 测试Telegram Bot连接...")
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/getMe"
+    api_url = f"{api_base}/bot{bot_token}/getMe"
     
     try:
         response = requests.get(api_url, timeout=10)
@@ -316,22 +367,22 @@ def test_telegram_bot(bot_token, chat_id):
         result = response.json()
         if result.get("ok"):
             bot_info = result["result"]
-            print(f"✅ Bot连接成功！")
-            print(f"   Bot名称: {bot_info.get('first_name', 'N/A')}")
-            print(f"   Bot用户名: @{bot_info.get('username', 'N/A')}")
+            trace_event(f"✅ Bot连接成功！")
+            trace_event(f"   Bot名称: {bot_info.get('first_name', 'N/A')}")
+            trace_event(f"   Bot用户名: @{bot_info.get('username', 'N/A')}")
             return True
         else:
-            print(f"❌ Bot测试失败: {result.get('description', 'Unknown error')}")
+            trace_event(f"❌ Bot测试失败: {result.get('description', 'Unknown error')}")
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ 测试Bot连接失败: {e}")
+        trace_event(f"❌ 测试Bot连接失败: {e}")
         return False
 
 
 def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
     """自动执行Git添加、提交和推送操作"""
-    print("\n🔧 开始自动Git操作...")
+    trace_event("\n🔧 开始自动Git操作...")
     
     commands = [
         ["git", "add", "."],
@@ -343,7 +394,7 @@ def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
     
     for i, cmd in enumerate(commands):
         cmd_name = " ".join(cmd)
-        print(f"  执行: {cmd_name}")
+        trace_event(f"  执行: {cmd_name}")
         
         try:
             result = subprocess.run(
@@ -354,34 +405,34 @@ def git_auto_push(commit_message="自动更新每日 GitHub 趋势数据"):
             )
             
             if result.returncode == 0:
-                print(f"  ✅ 成功: {cmd_name}")
+                trace_event(f"  ✅ 成功: {cmd_name}")
                 results.append(True)
             else:
-                print(f"  ⚠️  警告: {cmd_name} 返回非零状态码")
-                print(f"     错误: {result.stderr[:200]}")
+                trace_event(f"  ⚠️  警告: {cmd_name} 返回非零状态码")
+                trace_event(f"     错误: {result.stderr[:200]}")
                 results.append(False)
                 
                 # 如果是git add失败，可能是没有更改
                 if i == 0 and "nothing to commit" in result.stdout.lower():
-                    print("  ℹ️  没有需要提交的更改")
+                    trace_event("  ℹ️  没有需要提交的更改")
                     return False
                     
         except subprocess.TimeoutExpired:
-            print(f"  ❌ 超时: {cmd_name} 执行超时")
+            trace_event(f"  ❌ 超时: {cmd_name} 执行超时")
             results.append(False)
         except FileNotFoundError:
-            print(f"  ❌ 错误: Git未安装或不在PATH中")
+            trace_event(f"  ❌ 错误: Git未安装或不在PATH中")
             results.append(False)
         except Exception as e:
-            print(f"  ❌ 异常: {cmd_name} 执行出错: {e}")
+            trace_event(f"  ❌ 异常: {cmd_name} 执行出错: {e}")
             results.append(False)
     
     # 检查所有命令是否成功
     if all(results):
-        print("✅ Git自动推送完成！")
+        trace_event("✅ Git自动推送完成！")
         return True
     else:
-        print("⚠️  Git操作部分失败，请手动检查")
+        trace_event("⚠️  Git操作部分失败，请手动检查")
         return False
 
 
@@ -398,129 +449,203 @@ def check_git_repository():
         return False
 
 
-def save_data_json(repositories, filename="github_trending_data.json"):
-    """保存原始数据为JSON文件（用于历史记录）"""
+def save_data_json(repositories, filename="github_trending_data.json", content=None):
+    """保存原始数据为JSON文件（用于历史记录），content 为渲染引擎已生成的JSON文本"""
     if not repositories:
         return False
     
     try:
-        data = {
-            "timestamp": datetime.now().isoformat(),
-            "total_repos": len(repositories),
-            "repositories": repositories
-        }
+        if content is None:
+            content = render_all(repositories, formats=("json",))["json"]
         
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ 原始数据已保存到 {filename}")
+        if write_if_changed(filename, content, ignore=VOLATILE_LINES):
+            trace_event(f"✅ 原始数据已保存到 {filename}")
+        else:
+            trace_event(f"ℹ️  {filename} 内容未变化，跳过写入")
         return True
     except Exception as e:
-        print(f"❌ 保存JSON数据失败: {e}")
+        trace_event(f"❌ 保存JSON数据失败: {e}")
         return False
 
 
-def main():
-    """主函数"""
-    print("=" * 60)
-    print("GitHub Trending Scraper with Telegram & Git Auto-Push")
-    print("=" * 60)
-    
-    # 加载配置
-    config = load_environment()
-    
+def run_pipeline(config):
+    """抓取 -> 过滤 -> 保存 -> 通知 -> Git推送，每个阶段一个 span；完整执行返回 True"""
     # 检查Telegram配置
     if not config["bot_token"]:
-        print("❌ 未配置 TELEGRAM_BOT_TOKEN")
-        print("   请在 .env 文件中设置或使用环境变量")
-        return
+        trace_event("❌ 未配置 TELEGRAM_BOT_TOKEN")
+        trace_event("   请在 .env 文件中设置或使用环境变量")
+        return False
     
     # 测试Bot连接
     if config["chat_id"]:
-        if not test_telegram_bot(config["bot_token"], config["chat_id"]):
-            print("❌ Telegram Bot测试失败，请检查配置")
-            return
+        with span("telegram.check"):
+            bot_ok = test_telegram_bot(config["bot_token"], config["chat_id"], config["telegram_api_base"])
+        if not bot_ok:
+            trace_event("❌ Telegram Bot测试失败，请检查配置")
+            return False
     else:
-        print("⚠️  未配置 TELEGRAM_CHAT_ID，跳过Telegram通知")
+        trace_event("⚠️  未配置 TELEGRAM_CHAT_ID，跳过Telegram通知")
     
-    print("\n🚀 正在抓取GitHub Trending页面...")
+    trace_event("\n🚀 正在抓取GitHub Trending页面...")
     
-    # 抓取页面
-    response = scrape_github_trending()
-    if not response:
-        return
-    
-    # 解析仓库
-    all_repos = parse_repositories(response.content)
-    print(f"📊 找到 {len(all_repos)} 个仓库")
+    # 抓取并解析全部分片，重复出现的仓库合并为一条
+    merged = scrape_and_merge(config["trending_slices"])
+    if merged is None:
+        return False
+    all_repos = merged.records()
+    merged_note = f"（{merged.rows} 行合并去重）" if merged.rows != len(all_repos) else ""
+    trace_event(f"📊 找到 {len(all_repos)} 个仓库{merged_note}", repos=len(all_repos), rows=merged.rows)
     
     if not all_repos:
-        print("❌ 未找到任何仓库，可能页面结构已更改")
-        return
+        trace_event("❌ 未找到任何仓库，可能页面结构已更改")
+        return False
     
-    # 过滤AI相关
-    ai_repos = filter_ai_repositories(all_repos)
-    print(f"🤖 找到 {len(ai_repos)} 个AI/LLM/Agent相关仓库")
+    # 上游不可用时抓取层返回缓存页面：过期数据不写入文件、订阅源和历史库，也不推送
+    cache_age = merged.cache_age()
+    if cache_age is not None:
+        trace_event(f"⚠️  使用 {cache_age} 秒前的缓存页面，跳过保存和推送", cache_age=cache_age)
     
-    # 排除特定仓库
-    if config["exclude_repos"]:
-        ai_repos = exclude_repositories(ai_repos, config["exclude_repos"])
-        print(f"🔍 排除 {len(config['exclude_repos'])} 个仓库后剩余 {len(ai_repos)} 个")
+    # 过滤AI相关
+    with span("filter") as filter_span:
+        ai_repos = filter_ai_repositories(all_repos, config["ai_keywords"])
+        trace_event(f"🤖 找到 {len(ai_repos)} 个AI/LLM/Agent相关仓库", repos=len(ai_repos))
+        
+        # 排除特定仓库
+        if config["exclude_repos"]:
+            ai_repos = exclude_repositories(ai_repos, config["exclude_repos"])
+            trace_event(f"🔍 排除 {len(config['exclude_repos'])} 个仓库后剩余 {len(ai_repos)} 个", repos=len(ai_repos))
+        filter_span.set(repos=len(ai_repos))
     
     if not ai_repos:
-        print("没有符合条件的仓库")
+        trace_event("没有符合条件的仓库")
         # 发送空结果通知
         if config["chat_id"]:
             message = "GitHub Trending: 今天没有找到AI/LLM/Agent相关仓库。"
-            send_telegram_message(config["bot_token"], config["chat_id"], message)
-        return
+            with span("notify"):
+                send_telegram_message(config["bot_token"], config["chat_id"], message, api_base=config["telegram_api_base"])
+        return False
     
-    # 生成Markdown
-    markdown = create_markdown_table(ai_repos)
+    # 单次遍历生成所有输出格式
+    with span("render", formats=",".join(config["render_formats"])):
+        rendered = render_all(ai_repos, formats=config["render_formats"], max_telegram_repos=config["max_repos_in_telegram"])
+    markdown = rendered["markdown"]
     
-    # 保存文件
-    if save_markdown(markdown, config["save_filename"]):
-        # 保存原始数据为JSON
-        save_data_json(ai_repos, "github_trending_data.json")
-    else:
-        print("❌ 保存文件失败")
+    # 保存文件（Markdown、原始JSON数据及额外格式，内容未变化的文件跳过写入）
+    outputs = {
+        config["save_filename"]: markdown,
+        "github_trending_data.json": rendered["json"],
+    }
+    outputs.update(extra_format_files(rendered, config["save_filename"]))
+    if cache_age is None:
+        with span("save", files=len(outputs)):
+            saved = save_outputs(outputs)
+        if saved:
+            # 更新Atom订阅源（只追加新上榜的仓库）
+            if config["feed_filename"]:
+                with span("feed"):
+                    new_items = update_feed(ai_repos, config["feed_filename"], config["feed_state_filename"], config["feed_max_items"],
+                                            seen_days=config["feed_seen_days"])
+                    trace_event(f"📰 订阅源新增 {new_items} 个仓库", new_items=new_items)
+            # 增量更新静态归档站点
+            if config["site_dir"]:
+                with span("site"):
+                    pages = update_site(ai_repos, site_dir=config["site_dir"])
+                    trace_event(f"🌐 归档站点更新了 {pages} 个页面", pages=pages)
+            # 保存快照到历史库（同时增量更新全文索引）
+            if config["history_db"]:
+                with span("history.sqlite"):
+                    store = HistoryStore(config["history_db"])
+                    store.add_snapshot(ai_repos)
+                    store.close()
+            # 追加列式历史分区
+            if config["history_parquet_dir"]:
+                with span("history.parquet"):
+                    append_snapshot(ai_repos, root=config["history_parquet_dir"])
+        else:
+            trace_event("❌ 保存文件失败")
     
     # 发送Telegram通知
     if config["chat_id"]:
-        print("\n📱 正在发送Telegram通知...")
-        telegram_message = create_telegram_message(ai_repos, config["max_repos_in_telegram"])
-        send_telegram_message(config["bot_token"], config["chat_id"], telegram_message)
+        trace_event("\n📱 正在发送Telegram通知...")
+        telegram_message = rendered["telegram"]
+        announced, notified, store = ai_repos, None, None
+        if config["notify_new_only"]:
+            # 只通知该聊天尚未收到过的仓库，布隆过滤器命中时再查历史库确认
+            store = HistoryStore(config["history_db"]) if config["history_db"] else None
+            notified = NotifiedSet(config["notified_dir"], exact=store)
+            announced = notified.unseen(config["chat_id"], ai_repos)
+            trace_event(f"🔔 其中 {len(announced)} 个仓库尚未通知过", repos=len(announced))
+            if announced:
+                telegram_message = render_all(announced, formats=("telegram",), max_telegram_repos=config["max_repos_in_telegram"])["telegram"]
+        if cache_age is not None:
+            telegram_message = cache_notice(cache_age) + telegram_message
+        if announced:
+            with span("notify", repos=len(announced)):
+                sent = send_telegram_message(config["bot_token"], config["chat_id"], telegram_message, api_base=config["telegram_api_base"])
+            if sent and notified:
+                # 消息只列出前 N 个仓库，其余的下次仍会通知
+                notified.mark(config["chat_id"], [repo.key for repo in announced[:config["max_repos_in_telegram"]]])
+        else:
+            trace_event("ℹ️  没有新的仓库，跳过通知")
+        if notified:
+            notified.close()
+        if store:
+            store.close()
     
     # 显示简要信息
-    print("\n📋 仓库列表:")
+    summary = ["\n📋 仓库列表:"]
     for i, repo in enumerate(ai_repos[:5], 1):
-        print(f"{i}. {repo['name']} - ★{repo['stars']}")
+        summary.append(f"{i}. {repo['name']} - ★{repo['stars']}")
     
     if len(ai_repos) > 5:
-        print(f"... 还有 {len(ai_repos) - 5} 个仓库")
+        summary.append(f"... 还有 {len(ai_repos) - 5} 个仓库")
+    trace_event("\n".join(summary), repos=len(ai_repos))
     
     # 自动Git推送
-    if config["git_auto_push"]:
+    if config["git_auto_push"] and cache_age is not None:
+        trace_event("\nℹ️  数据来自缓存，跳过自动Git推送")
+    elif config["git_auto_push"]:
         if check_git_repository():
-            print("\n" + "=" * 40)
-            print("🔄 执行自动Git推送")
-            print("=" * 40)
+            trace_event("\n" + "=" * 40 + "\n🔄 执行自动Git推送\n" + "=" * 40)
             
-            success = git_auto_push(config["git_commit_message"])
+            with span("git.push"):
+                success = git_auto_push(config["git_commit_message"])
             if not success:
-                print("⚠️  Git自动推送失败，请手动处理")
+                trace_event("⚠️  Git自动推送失败，请手动处理")
         else:
-            print("\n⚠️  当前目录不是Git仓库，跳过自动推送")
-            print("   如需自动推送，请先初始化Git仓库:")
-            print("   git init")
-            print("   git remote add origin <你的仓库URL>")
+            trace_event(
+                "\n⚠️  当前目录不是Git仓库，跳过自动推送\n"
+                "   如需自动推送，请先初始化Git仓库:\n"
+                "   git init\n"
+                "   git remote add origin <你的仓库URL>"
+            )
     else:
-        print("\nℹ️  Git自动推送已禁用（GIT_AUTO_PUSH=false）")
+        trace_event("\nℹ️  Git自动推送已禁用（GIT_AUTO_PUSH=false）")
     
-    print("\n" + "=" * 60)
-    print("✅ 脚本执行完成！")
-    print("=" * 60)
+    return True
 
 
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("GitHub Trending Scraper with Telegram & Git Auto-Push")
+    print("=" * 60)
+    
+    # 加载配置
+    config = load_environment()
+    configure_fetcher(config)
+    setup_tracing(config["trace_file"], config["trace_otlp_endpoint"], config["trace_console"])
+    
+    try:
+        with span("pipeline.run", source="cli"):
+            completed = run_pipeline(config)
+    finally:
+        shutdown_shared_executor()
+    
+    if completed:
+        print("\n" + "=" * 60)
+        print("✅ 脚本执行完成！")
+        print("=" * 60)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
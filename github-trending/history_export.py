@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+趋势历史列式导出（Parquet/Arrow）
+每次抓取追加一个按日期分区的 Parquet 文件，仓库名和 owner 使用字典编码，
+方便分析时按日期过滤（谓词下推）快速加载一整年的数据
+"""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from repo_record import records_from_dicts
+from tracing import trace_event
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DEFAULT_HISTORY_DIR = "history_parquet"
+
+
+def history_schema():
+    """快照表结构（date 作为 hive 分区列，不写入文件本身）"""
+    return pa.schema([
+        ("scraped_at", pa.timestamp("us")),
+        ("rank", pa.int16()),
+        ("owner", pa.dictionary(pa.int32(), pa.string())),
+        ("repo", pa.dictionary(pa.int32(), pa.string())),
+        ("description", pa.string()),
+        ("stars", pa.int64()),
+        ("forks", pa.int64()),
+        ("stars_today", pa.int64()),
+    ])
+
+
+def _partition_path(root, timestamp):
+    """返回 root/date=YYYY-MM-DD/part-HHMMSSffffff.parquet"""
+    partition_dir = os.path.join(root, f"date={timestamp.strftime('%Y-%m-%d')}")
+    return partition_dir, os.path.join(partition_dir, f"part-{timestamp.strftime('%H%M%S%f')}.parquet")
+
+
+def snapshot_to_table(records, timestamp):
+    """把一次抓取的记录转换为 Arrow 表"""
+    records = records_from_dicts(records)
+    columns = {
+        "scraped_at": [timestamp] * len(records),
+        "rank": list(range(1, len(records) + 1)),
+        "owner": [r.owner for r in records],
+        "repo": [r.repo for r in records],
+        "description": [r.description for r in records],
+        "stars": [r.stars for r in records],
+        "forks": [r.forks for r in records],
+        "stars_today": [r.stars_today for r in records],
+    }
+    return pa.table(columns, schema=history_schema())
+
+
+def append_snapshot(records, timestamp=None, root=DEFAULT_HISTORY_DIR):
+    """追加一次抓取结果作为新的分区文件，已存在同一时间戳的文件时跳过"""
+    if not PYARROW_AVAILABLE:
+        trace_event("⚠️  pyarrow 未安装，跳过列式历史导出\n   安装: pip install pyarrow", dependency="pyarrow")
+        return None
+    if not records:
+        return None
+
+    if timestamp is None:
+        timestamp = datetime.now()
+    elif isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+
+    partition_dir, path = _partition_path(root, timestamp)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(partition_dir, exist_ok=True)
+    table = snapshot_to_table(records, timestamp)
+
+    # 先写临时文件再替换，避免读者看到写了一半的分区
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd", use_dictionary=["owner", "repo"])
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_history(root=DEFAULT_HISTORY_DIR, start_date=None, end_date=None, columns=None, filter=None):
+    """加载历史数据，日期范围和 filter 表达式都会下推到分区/行组级别"""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow 未安装，无法读取列式历史数据")
+
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    schema = history_schema().append(pa.field("date", pa.string()))
+    dataset = ds.dataset(root, format="parquet", partitioning=partitioning, schema=schema)
+
+    expression = filter
+    if start_date:
+        clause = ds.field("date") >= str(start_date)
+        expression = clause if expression is None else expression & clause
+    if end_date:
+        clause = ds.field("date") <= str(end_date)
+        expression = clause if expression is None else expression & clause
+
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def iter_git_snapshots(data_file="github_trending_data.json"):
+    """按时间从旧到新遍历 data_file 在Git历史中的每个版本，产出解析后的JSON数据"""
+    result = subprocess.run(
+        ["git", "log", "--reverse", "--format=%H", "--", data_file],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(f"❌ 读取Git历史失败: {result.stderr[:200]}")
+        return
+
+    for commit in result.stdout.split():
+        show = subprocess.run(
+            ["git", "show", f"{commit}:./{data_file}"],
+            capture_output=True,
+            text=True
+        )
+        if show.returncode != 0:
+            continue
+        try:
+            yield json.loads(show.stdout)
+        except json.JSONDecodeError:
+            print(f"⚠️  跳过无法解析的版本: {commit[:8]}")
+
+
+def export_git_history(data_file="github_trending_data.json", root=DEFAULT_HISTORY_DIR):
+    """从Git历史中回填 data_file 的所有版本，返回新写入的分区数"""
+    written = 0
+    for data in iter_git_snapshots(data_file):
+        timestamp = datetime.fromisoformat(data["timestamp"])
+        if os.path.exists(_partition_path(root, timestamp)[1]):
+            continue
+        if append_snapshot(data.get("repositories", []), timestamp, root):
+            written += 1
+
+    return written
+
+
+def main():
+    """从Git历史回填列式历史数据"""
+    if not PYARROW_AVAILABLE:
+        print("❌ pyarrow 未安装")
+        print("   安装: pip install pyarrow")
+        return 1
+
+    root = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HISTORY_DIR
+    written = export_git_history(root=root)
+    print(f"✅ 已导出 {written} 个历史快照到 {root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+SQLite 趋势历史库
+保存每次抓取的快照，并维护 FTS5 全文索引（仓库名、描述；趋势页面不包含 topics），
+保存快照时增量更新索引，支持 BM25 排序和分页搜索；
+同时按 日/周/月 维护排行榜物化表，查询时只需一次索引读取。
+同一个 HistoryStore 会被事件循环和多个工作线程共用，所有访问连接的方法都持有同一把锁
+"""
+
+import functools
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from repo_record import records_from_dicts
+
+DEFAULT_HISTORY_DB = "github_trending_history.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    scraped_at TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    stars INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS repos_last_seen ON repos(last_seen);
+
+CREATE TABLE IF NOT EXISTS appearances (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    repo_id INTEGER NOT NULL REFERENCES repos(id),
+    rank INTEGER NOT NULL,
+    stars INTEGER NOT NULL,
+    forks INTEGER NOT NULL,
+    stars_today INTEGER NOT NULL,
+    PRIMARY KEY (snapshot_id, repo_id)
+);
+
+CREATE INDEX IF NOT EXISTS appearances_repo ON appearances(repo_id);
+
+CREATE TABLE IF NOT EXISTS leaderboard (
+    span TEXT NOT NULL,
+    period TEXT NOT NULL,
+    repo_id INTEGER NOT NULL REFERENCES repos(id),
+    appearances INTEGER NOT NULL,
+    peak_rank INTEGER NOT NULL,
+    first_at TEXT NOT NULL,
+    first_stars INTEGER NOT NULL,
+    first_stars_today INTEGER NOT NULL,
+    last_at TEXT NOT NULL,
+    last_stars INTEGER NOT NULL,
+    star_gain INTEGER NOT NULL,
+    PRIMARY KEY (span, period, repo_id)
+);
+
+CREATE INDEX IF NOT EXISTS leaderboard_gain ON leaderboard(span, period, star_gain DESC);
+
+-- 仓库在每个周期内上榜过的日期：同一天多次抓取只计一次上榜
+CREATE TABLE IF NOT EXISTS leaderboard_days (
+    span TEXT NOT NULL,
+    period TEXT NOT NULL,
+    repo_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (span, period, repo_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notified (
+    chat_id TEXT NOT NULL,
+    repo_key TEXT NOT NULL,
+    notified_at TEXT NOT NULL,
+    PRIMARY KEY (chat_id, repo_key)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS repo_fts USING fts5(
+    name, description,
+    content='repos', content_rowid='id', tokenize='unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS repos_ai AFTER INSERT ON repos BEGIN
+    INSERT INTO repo_fts(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS repos_ad AFTER DELETE ON repos BEGIN
+    INSERT INTO repo_fts(repo_fts, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS repos_au AFTER UPDATE OF name, description ON repos BEGIN
+    INSERT INTO repo_fts(repo_fts, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO repo_fts(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END;
+"""
+
+# 旧版本的库多一个始终为空的 topics 列：删除后按新结构重建全文索引
+DROP_TOPICS = """
+DROP TRIGGER IF EXISTS repos_ai;
+DROP TRIGGER IF EXISTS repos_ad;
+DROP TRIGGER IF EXISTS repos_au;
+DROP TABLE IF EXISTS repo_fts;
+ALTER TABLE repos DROP COLUMN topics;
+"""
+
+# 旧版本的排行榜按快照次数累计上榜次数：删除后由 appearances 表按时间重放重建
+DROP_LEADERBOARD = """
+DROP TABLE IF EXISTS leaderboard;
+DROP TABLE IF EXISTS leaderboard_days;
+"""
+
+LEADERBOARD_SPANS = ("day", "week", "month")
+
+
+def period_keys(timestamp):
+    """快照所属的各统计周期：{"day": "2026-02-21", "week": "2026-W08", "month": "2026-02"}"""
+    year, week, _ = timestamp.isocalendar()
+    return {
+        "day": timestamp.strftime("%Y-%m-%d"),
+        "week": f"{year}-W{week:02d}",
+        "month": timestamp.strftime("%Y-%m"),
+    }
+
+
+# BM25 列权重：仓库名 > 描述
+BM25_WEIGHTS = (10.0, 1.0)
+
+
+def build_match_query(query):
+    """把用户输入转换为安全的 FTS5 查询（每个词加引号并做前缀匹配，词之间为 AND）"""
+    terms = []
+    for term in query.split():
+        term = term.replace('"', '""')
+        if term:
+            terms.append(f'"{term}"*')
+    return " ".join(terms)
+
+
+def _locked(method):
+    """方法执行期间持有 self._lock（连接允许跨线程使用，但同一时刻只能有一个线程操作它）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class HistoryStore:
+    """趋势历史库（单个 SQLite 文件）"""
+
+    def __init__(self, path=DEFAULT_HISTORY_DB):
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        migrate = "topics" in self._columns("repos")
+        if migrate:
+            self.conn.executescript(DROP_TOPICS)
+        leaderboard_columns = self._columns("leaderboard")
+        rebuild_leaderboards = bool(leaderboard_columns) and "first_at" not in leaderboard_columns
+        if rebuild_leaderboards:
+            self.conn.executescript(DROP_LEADERBOARD)
+        self.conn.executescript(SCHEMA)
+        if migrate:
+            with self.conn:
+                self.conn.execute("INSERT INTO repo_fts(repo_fts) VALUES ('rebuild')")
+        if rebuild_leaderboards:
+            self._rebuild_leaderboards()
+
+    def _columns(self, table):
+        return {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+    def _rebuild_leaderboards(self):
+        """按快照时间重放 appearances，重新生成排行榜"""
+        with self.conn:
+            rows = self.conn.execute(
+                """
+                SELECT s.scraped_at, a.repo_id, a.rank, a.stars, a.stars_today
+                FROM appearances a JOIN snapshots s ON s.id = a.snapshot_id
+                ORDER BY s.scraped_at, a.rank
+                """
+            ).fetchall()
+            for row in rows:
+                periods = period_keys(datetime.fromisoformat(row["scraped_at"]))
+                self._update_leaderboards(periods, row["scraped_at"], row["repo_id"], row["rank"],
+                                          row["stars"], row["stars_today"])
+
+    @_locked
+    def close(self):
+        self.conn.close()
+
+    @_locked
+    def add_snapshot(self, repositories, timestamp=None):
+        """保存一次抓取快照并增量更新全文索引，返回快照ID（重复快照返回 None）"""
+        if timestamp is None:
+            timestamp = datetime.now()
+        elif isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        scraped_at = timestamp.isoformat()
+        date = timestamp.strftime("%Y-%m-%d")
+        periods = period_keys(timestamp)
+
+        records = records_from_dicts(repositories)
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO snapshots (scraped_at, date) VALUES (?, ?)",
+                (scraped_at, date)
+            )
+            if cursor.rowcount == 0:
+                return None
+            snapshot_id = cursor.lastrowid
+
+            for rank, record in enumerate(records, 1):
+                self.conn.execute(
+                    """
+                    INSERT INTO repos (key, name, url, description, stars, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        name = excluded.name,
+                        description = excluded.description,
+                        stars = excluded.stars,
+                        first_seen = MIN(repos.first_seen, excluded.first_seen),
+                        last_seen = MAX(repos.last_seen, excluded.last_seen)
+                    """,
+                    (record.key, record.name, record.url, record.description,
+                     record.stars, date, date)
+                )
+                repo_id = self.conn.execute("SELECT id FROM repos WHERE key = ?", (record.key,)).fetchone()[0]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO appearances VALUES (?, ?, ?, ?, ?, ?)",
+                    (snapshot_id, repo_id, rank, record.stars, record.forks, record.stars_today)
+                )
+                self._update_leaderboards(periods, scraped_at, repo_id, rank, record.stars, record.stars_today)
+
+        return snapshot_id
+
+    def _update_leaderboards(self, periods, scraped_at, repo_id, rank, stars, stars_today):
+        """快照写入时增量更新各周期排行榜
+
+        上榜次数按不同的日期计算，同一天重复抓取不会增加；first_* / last_* 按抓取时间取最早 / 最晚的快照，
+        快照不按时间顺序写入时结果也相同，star_gain = 最新星数 - 最早星数 + 最早快照当天的新增星数
+        """
+        for span in LEADERBOARD_SPANS:
+            new_day = self.conn.execute(
+                "INSERT OR IGNORE INTO leaderboard_days (span, period, repo_id, day) VALUES (?, ?, ?, ?)",
+                (span, periods[span], repo_id, periods["day"])
+            ).rowcount
+            self.conn.execute(
+                """
+                INSERT INTO leaderboard
+                    (span, period, repo_id, appearances, peak_rank,
+                     first_at, first_stars, first_stars_today, last_at, last_stars, star_gain)
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(span, period, repo_id) DO UPDATE SET
+                    appearances = appearances + ?,
+                    peak_rank = MIN(peak_rank, excluded.peak_rank),
+                    first_at = MIN(first_at, excluded.first_at),
+                    first_stars = IIF(excluded.first_at < first_at, excluded.first_stars, first_stars),
+                    first_stars_today = IIF(excluded.first_at < first_at, excluded.first_stars_today, first_stars_today),
+                    last_at = MAX(last_at, excluded.last_at),
+                    last_stars = IIF(excluded.last_at > last_at, excluded.last_stars, last_stars),
+                    star_gain = IIF(excluded.last_at > last_at, excluded.last_stars, last_stars)
+                              - IIF(excluded.first_at < first_at, excluded.first_stars, first_stars)
+                              + IIF(excluded.first_at < first_at, excluded.first_stars_today, first_stars_today)
+                """,
+                (span, periods[span], repo_id, rank,
+                 scraped_at, stars, stars_today, scraped_at, stars, stars_today, new_day)
+            )
+
+    @_locked
+    def top(self, span="week", limit=10, period=None):
+        """读取排行榜（默认最近一个有数据的周期），返回 (周期, 结果列表)"""
+        if span not in LEADERBOARD_SPANS:
+            raise ValueError(f"未知的统计周期: {span}")
+        if period is None:
+            period = self.conn.execute(
+                "SELECT MAX(period) FROM leaderboard WHERE span = ?", (span,)
+            ).fetchone()[0]
+            if period is None:
+                return None, []
+
+        rows = self.conn.execute(
+            """
+            SELECT r.name, r.url, r.description, l.appearances, l.peak_rank, l.star_gain, l.last_stars
+            FROM leaderboard l JOIN repos r ON r.id = l.repo_id
+            WHERE l.span = ? AND l.period = ?
+            ORDER BY l.star_gain DESC, l.appearances DESC, l.peak_rank
+            LIMIT ?
+            """,
+            (span, period, limit)
+        ).fetchall()
+        return period, [dict(row) for row in rows]
+
+    @_locked
+    def star_history(self, keys, limit=30):
+        """各仓库最近 limit 次上榜时的 (抓取时间, 星数)，按时间排序，返回 {key: 列表}"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self.conn.execute(
+            f"""
+            SELECT r.key, s.scraped_at, a.stars
+            FROM appearances a
+            JOIN repos r ON r.id = a.repo_id
+            JOIN snapshots s ON s.id = a.snapshot_id
+            WHERE r.key IN ({','.join('?' * len(keys))})
+            ORDER BY s.scraped_at
+            """,
+            keys
+        ).fetchall()
+        history = {}
+        for row in rows:
+            history.setdefault(row["key"], []).append((row["scraped_at"], row["stars"]))
+        return {key: points[-limit:] for key, points in history.items()}
+
+    @_locked
+    def notified_keys(self, chat_id, keys):
+        """keys 中已经通知过该聊天的仓库键（布隆过滤器命中后的精确确认）"""
+        keys = list(keys)
+        found = set()
+        # 分批查询，避免超过 SQLite 的参数个数上限
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT repo_key FROM notified WHERE chat_id = ? AND repo_key IN ({','.join('?' * len(chunk))})",
+                (str(chat_id), *chunk)
+            ).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    @_locked
+    def mark_notified(self, chat_id, keys, timestamp=None):
+        """记录已通知该聊天的仓库"""
+        notified_at = (timestamp or datetime.now()).isoformat(timespec="seconds")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO notified (chat_id, repo_key, notified_at) VALUES (?, ?, ?)",
+                [(str(chat_id), key, notified_at) for key in keys]
+            )
+
+    @_locked
+    def all_repos(self, since=None):
+        """出现过的仓库（名称、描述、最新星数），since 为日期（YYYY-MM-DD）时只返回此后上榜过的仓库"""
+        if since:
+            rows = self.conn.execute(
+                "SELECT name, description, stars FROM repos WHERE last_seen >= ?", (since,)
+            ).fetchall()
+        else:
+            rows = self.conn.execute("SELECT name, description, stars FROM repos").fetchall()
+        return [dict(row) for row in rows]
+
+    @_locked
+    def search(self, query, page=1, page_size=5, since_days=None):
+        """全文搜索，按 BM25 排序，返回 (结果列表, 总数)"""
+        match = build_match_query(query)
+        if not match:
+            return [], 0
+
+        where = "repo_fts MATCH ?"
+        params = [match]
+        if since_days:
+            where += " AND r.last_seen >= ?"
+            params.append((datetime.now() - timedelta(days=since_days)).strftime("%Y-%m-%d"))
+
+        total = self.conn.execute(
+            f"SELECT COUNT(*) FROM repo_fts JOIN repos r ON r.id = repo_fts.rowid WHERE {where}",
+            params
+        ).fetchone()[0]
+
+        rows = self.conn.execute(
+            f"""
+            SELECT r.name, r.url, r.description, r.stars, r.first_seen, r.last_seen,
+                   bm25(repo_fts, ?, ?) AS score
+            FROM repo_fts JOIN repos r ON r.id = repo_fts.rowid
+            WHERE {where}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            (*BM25_WEIGHTS, *params, page_size, (max(page, 1) - 1) * page_size)
+        ).fetchall()
+        return [dict(row) for row in rows], total
+
+
+def main():
+    """从Git历史回填历史库"""
+    from history_export import iter_git_snapshots
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HISTORY_DB
+    store = HistoryStore(path)
+    added = 0
+    for data in iter_git_snapshots():
+        if store.add_snapshot(data.get("repositories", []), data["timestamp"]):
+            added += 1
+    store.close()
+    print(f"✅ 已导入 {added} 个历史快照到 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+HTTP 录制/回放（cassette）传输层
+挂载到 requests.Session 上：record 模式下真实请求并把响应写入 JSON 文件，
+replay 模式下只从文件返回录制的响应，不访问网络（缺少录制时抛出 ConnectionError）
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from output_writer import write_atomic
+
+CASSETTE_MODES = ("record", "replay")
+
+# 录制的是解压后的响应体，这些头部回放时不再成立
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _body_digest(body):
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def _request_key(request):
+    return request.method.upper(), request.url, _body_digest(request.body)
+
+
+class Cassette:
+    """一组录制的请求/响应，按 (方法, URL, 请求体摘要) 匹配"""
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = []
+        self._lock = threading.Lock()
+        # 同一请求录制了多次时按顺序回放，最后一条重复使用
+        self._play_counts = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.interactions = json.load(f).get("interactions", [])
+
+    def find(self, request):
+        key = list(_request_key(request))
+        with self._lock:
+            matches = [item for item in self.interactions if item["request"]["key"] == key]
+            if not matches:
+                return None
+            index = self._play_counts.get(tuple(key), 0)
+            self._play_counts[tuple(key)] = index + 1
+            return matches[min(index, len(matches) - 1)]
+
+    def record(self, request, response):
+        item = {
+            "request": {"key": list(_request_key(request))},
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS},
+                "body": base64.b64encode(response.content).decode("ascii"),
+            },
+        }
+        with self._lock:
+            self.interactions.append(item)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            write_atomic(self.path, json.dumps({"interactions": self.interactions}, ensure_ascii=False, indent=1).encode("utf-8"))
+        return item
+
+
+def build_response(request, item):
+    """把录制的条目还原成 requests.Response"""
+    data = item["response"]
+    response = requests.Response()
+    response.status_code = data["status"]
+    response.reason = data.get("reason")
+    response.headers = CaseInsensitiveDict(data["headers"])
+    response._content = base64.b64decode(data["body"])
+    response._content_consumed = True
+    response.raw = io.BytesIO(response._content)
+    response.url = request.url
+    response.request = request
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests 传输适配器：按模式录制或回放"""
+
+    def __init__(self, cassette, mode="replay", **kwargs):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.mode = mode
+
+    def send(self, request, **kwargs):
+        if self.mode == "replay":
+            item = self.cassette.find(request)
+            if item is None:
+                raise requests.exceptions.ConnectionError(
+                    f"cassette {self.cassette.path} 中没有录制 {request.method} {request.url}", request=request
+                )
+            return build_response(request, item)
+
+        response = super().send(request, **kwargs)
+        try:
+            item = self.cassette.record(request, response)
+        finally:
+            response.close()
+        return build_response(request, item)
+
+
+def use_cassette(session, path, mode="replay"):
+    """在 session 上挂载 cassette（http 和 https），返回 Cassette"""
+    cassette = Cassette(path)
+    adapter = CassetteAdapter(cassette, mode)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return cassette
+
+
+def eject_cassette(session):
+    """移除 session 上挂载的 cassette，恢复普通的 HTTP 传输"""
+    for prefix in ("http://", "https://"):
+        if isinstance(session.get_adapter(prefix), CassetteAdapter):
+            session.mount(prefix, HTTPAdapter())
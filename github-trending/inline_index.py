@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+内联查询使用的内存前缀索引
+对仓库名和描述分词后存入有序数组，用 bisect 做前缀查找，
+每次抓取后只增量加入新的/变化的仓库，回答内联查询时不访问磁盘或网络；
+大批量加入（如启动时从历史库导入）时先追加再整体排序一次，少量加入时逐个 insort
+"""
+
+import re
+import threading
+from bisect import bisect_left, insort
+
+from repo_record import records_from_dicts
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+# 过短的词前缀匹配意义不大，且会让有序数组膨胀
+MIN_TOKEN_LENGTH = 2
+
+# 新增条目超过这个数量时改为 extend + sort（逐个 insort 是 O(n²)）
+BULK_THRESHOLD = 32
+
+
+def tokenize(text):
+    """小写后切分为字母数字词"""
+    return {token for token in _TOKEN_RE.findall(text.lower()) if len(token) >= MIN_TOKEN_LENGTH}
+
+
+class PrefixIndex:
+    """(词, 仓库键) 有序数组 + 仓库键 -> 记录 的映射"""
+
+    def __init__(self):
+        self._entries = []
+        self._records = {}
+        self._tokens = {}
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def add_records(self, repositories):
+        """增量加入记录；已存在且内容相同的仓库直接跳过，返回更新的仓库数"""
+        updated = 0
+        additions = []
+        # 同一批中重复出现的仓库以最后一条为准，每个键只处理一次
+        latest = {record.key: record for record in records_from_dicts(repositories)}
+        with self._lock:
+            for key, record in latest.items():
+                text = (record.name, record.description)
+                self._records[key] = record
+                if self._texts.get(key) == text:
+                    continue
+                self._texts[key] = text
+
+                tokens = tokenize(record.name) | tokenize(record.description)
+                old_tokens = self._tokens.get(key, set())
+                for token in old_tokens - tokens:
+                    position = bisect_left(self._entries, (token, key))
+                    if position < len(self._entries) and self._entries[position] == (token, key):
+                        del self._entries[position]
+                additions.extend((token, key) for token in tokens - old_tokens)
+                self._tokens[key] = tokens
+                updated += 1
+
+            if len(additions) > BULK_THRESHOLD:
+                self._entries.extend(additions)
+                self._entries.sort()
+            else:
+                for entry in additions:
+                    insort(self._entries, entry)
+        return updated
+
+    def search(self, query, limit=20):
+        """所有查询词都需要前缀匹配，结果按星数降序"""
+        terms = tokenize(query) or {term for term in _TOKEN_RE.findall(query.lower())}
+        if not terms:
+            return []
+
+        matched = None
+        with self._lock:
+            for term in terms:
+                keys = set()
+                position = bisect_left(self._entries, (term,))
+                while position < len(self._entries) and self._entries[position][0].startswith(term):
+                    keys.add(self._entries[position][1])
+                    position += 1
+                matched = keys if matched is None else matched & keys
+                if not matched:
+                    return []
+            records = [self._records[key] for key in matched]
+
+        records.sort(key=lambda record: record.stars, reverse=True)
+        return records[:limit]
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+SQLite 持久化任务队列和工作进程池
+Bot 前端只负责入队（scrape/enrich/render/push/notify），
+独立的工作进程并行消费任务，支持租约、确认（ack）和带抖动的指数退避重试。
+执行期间后台线程定期续约；租约被其他工作进程接管后，ack/fail 不再生效，推送前也会先确认仍持有租约
+
+运行工作进程: python3 job_queue.py [进程数]
+"""
+
+import fcntl
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+from config_watcher import ConfigWatcher
+from output_writer import write_atomic
+from parse_executor import configure_shared_executor, shutdown_shared_executor
+from repo_record import records_from_dicts
+from tracing import setup_tracing, span, trace_event
+
+DEFAULT_JOB_DB = "github_trending_jobs.db"
+
+JOB_KINDS = ("scrape", "enrich", "render", "push", "notify")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at REAL NOT NULL,
+    lease_expires REAL,
+    worker TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, available_at);
+"""
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+POLL_INTERVAL = 1.0
+LEASE_SECONDS = 300
+# 每经过租约时长的 1/3 续约一次
+RENEW_FRACTION = 3
+# 共享输出（订阅源、归档站点、输出文件）的写入与 Git 推送共用这把文件锁，同一工作目录内串行执行
+GIT_LOCK_FILENAME = ".git_push.lock"
+# 最近一次写入输出文件的快照时间：较旧的快照不覆盖较新的输出
+RENDER_STAMP_FILENAME = ".last_render"
+
+
+class JobQueue:
+    """基于 SQLite 的持久化任务队列（多进程安全）"""
+
+    def __init__(self, path=DEFAULT_JOB_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, kind, payload, max_attempts=3, delay=0):
+        """入队一个任务，返回任务ID"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        now = time.time()
+        cursor = self.conn.execute(
+            """
+            INSERT INTO jobs (kind, payload, max_attempts, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (kind, json.dumps(payload, ensure_ascii=False), max_attempts, now + delay, now, now)
+        )
+        return cursor.lastrowid
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """领取一个可执行的任务（包括租约过期的任务），没有任务时返回 None
+
+        租约过期说明上一次执行的工作进程崩溃或卡死，计为一次失败；达到最大次数的任务标记为 failed，不再领取
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = self.conn.execute(
+                    """
+                    SELECT * FROM jobs
+                    WHERE (status = 'queued' AND available_at <= ?)
+                       OR (status = 'running' AND lease_expires < ?)
+                    ORDER BY available_at, id
+                    LIMIT 1
+                    """,
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                attempts = row["attempts"]
+                if row["status"] == "running":
+                    attempts += 1
+                    if attempts >= row["max_attempts"]:
+                        self.conn.execute(
+                            """
+                            UPDATE jobs SET status = 'failed', attempts = ?, lease_expires = NULL,
+                                            last_error = ?, updated_at = ?
+                            WHERE id = ?
+                            """,
+                            (attempts, f"工作进程 {row['worker']} 的租约过期（第 {attempts} 次）", now, row["id"])
+                        )
+                        continue
+                self.conn.execute(
+                    """
+                    UPDATE jobs SET status = 'running', attempts = ?, worker = ?, lease_expires = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (attempts, worker_id, now + lease_seconds, now, row["id"])
+                )
+                self.conn.execute("COMMIT")
+                break
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        job = dict(row)
+        job["attempts"] = attempts
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def renew(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """延长租约，返回 False 表示租约已过期并被其他工作进程接管"""
+        now = time.time()
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET lease_expires = ?, updated_at = ?
+            WHERE id = ? AND worker = ? AND status = 'running' AND lease_expires >= ?
+            """,
+            (now + lease_seconds, now, job_id, worker_id, now)
+        )
+        return cursor.rowcount == 1
+
+    def ack(self, job_id, worker_id):
+        """确认任务完成，返回 False 表示已不再持有租约（结果被丢弃）"""
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET status = 'done', lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (time.time(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """记录失败：未超过最大次数时按指数退避重新排队，否则标记为 failed；不再持有租约时返回 None"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            attempts = row["attempts"] + 1
+            if attempts < row["max_attempts"]:
+                backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                delay = random.uniform(backoff / 2, backoff)
+                status, available_at = "queued", now + delay
+            else:
+                status, available_at = "failed", now
+            self.conn.execute(
+                """
+                UPDATE jobs SET status = ?, attempts = ?, available_at = ?, lease_expires = NULL,
+                                last_error = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (status, attempts, available_at, str(error)[:2000], now, job_id)
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def stats(self):
+        """各状态的任务数"""
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class LeaseLost(RuntimeError):
+    """任务的租约已被其他工作进程接管"""
+
+
+class Lease:
+    """任务执行期间的租约：后台线程（独立的数据库连接）定期续约"""
+
+    def __init__(self, db_path, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.held = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._renew_loop, name=f"lease-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _renew_loop(self):
+        queue = JobQueue(self.db_path)
+        try:
+            while self.held and not self._stop.wait(self.lease_seconds / RENEW_FRACTION):
+                self.held = queue.renew(self.job_id, self.worker_id, self.lease_seconds)
+                if not self.held:
+                    trace_event(f"⚠️  任务 #{self.job_id} 的租约已被接管", job_id=self.job_id)
+        except Exception as e:
+            trace_event(f"⚠️  任务 #{self.job_id} 续约失败: {e}", job_id=self.job_id)
+        finally:
+            queue.close()
+
+    def check(self):
+        """有副作用的操作（如 git push）之前确认仍持有租约"""
+        if not self.held:
+            raise LeaseLost(f"任务 #{self.job_id} 的租约已被接管")
+
+
+# --- 任务处理函数（在工作进程中执行） ---
+
+def _child_payload(payload, **fields):
+    """后续任务的载荷，沿用同一个 trace_id"""
+    return dict(fields, trace_id=payload.get("trace_id"))
+
+
+def _pipeline():
+    """工作进程里复用命令行脚本的抓取/保存逻辑（不依赖 python-telegram-bot）"""
+    import github_trending_scraper_with_telegram as pipeline
+    return pipeline
+
+
+@contextmanager
+def _notified_set(pipeline, config):
+    """打开按聊天的已通知集合（有历史库时用它做精确确认）"""
+    store = pipeline.HistoryStore(config["history_db"]) if config["history_db"] else None
+    notified = pipeline.NotifiedSet(config["notified_dir"], exact=store)
+    try:
+        yield notified
+    finally:
+        notified.close()
+        if store:
+            store.close()
+
+
+@contextmanager
+def _shared_writes(lease):
+    """持有共享写入锁；等锁期间租约可能已被接管，此时由接管的工作进程执行"""
+    with open(GIT_LOCK_FILENAME, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        lease.check()
+        yield
+
+
+def _newer_than_last_render(timestamp):
+    """timestamp 不早于上一次写入的快照时返回 True（须持有共享写入锁）"""
+    try:
+        with open(RENDER_STAMP_FILENAME, encoding="utf-8") as f:
+            last = f.read().strip()
+    except FileNotFoundError:
+        return True
+    return timestamp >= last
+
+
+def handle_scrape(queue, payload, config, lease):
+    pipeline = _pipeline()
+    merged = pipeline.scrape_and_merge(config["trending_slices"])
+    if merged is None:
+        raise RuntimeError("获取 GitHub Trending 页面失败")
+
+    all_repos = merged.records()
+    if not all_repos:
+        raise RuntimeError("未找到任何仓库，可能页面结构已更改")
+
+    ai_repos = pipeline.filter_ai_repositories(all_repos, config["ai_keywords"])
+    if config["exclude_repos"]:
+        ai_repos = pipeline.exclude_repositories(ai_repos, config["exclude_repos"])
+
+    if not ai_repos:
+        if payload.get("chat_id"):
+            queue.enqueue("notify", _child_payload(payload, chat_id=payload["chat_id"], text=pipeline.render_all([], formats=("telegram",))["telegram"]))
+        return
+
+    next_payload = dict(payload, timestamp=datetime.now().isoformat(),
+                        repositories=[repo.to_dict() for repo in ai_repos])
+    cache_age = merged.cache_age()
+    if cache_age is not None:
+        # 缓存页面的数据已过期：不写入历史库/订阅源，也不保存文件和推送，只通知
+        trace_event(f"⚠️  使用 {cache_age} 秒前的缓存页面，跳过入库和推送", cache_age=cache_age)
+        queue.enqueue("render", dict(next_payload, cache_age=cache_age))
+        return
+    queue.enqueue("enrich", next_payload)
+
+
+def handle_enrich(queue, payload, config, lease):
+    """写入历史库、订阅源、归档站点和列式历史"""
+    pipeline = _pipeline()
+    repos = payload["repositories"]
+    timestamp = payload["timestamp"]
+
+    # 订阅源状态和站点清单都是读-改-写，多个工作进程并发执行会丢失更新
+    with _shared_writes(lease):
+        if config["history_db"]:
+            store = pipeline.HistoryStore(config["history_db"])
+            store.add_snapshot(repos, timestamp)
+            store.close()
+        if config["feed_filename"]:
+            pipeline.update_feed(repos, config["feed_filename"], config["feed_state_filename"], config["feed_max_items"],
+                                 seen_days=config["feed_seen_days"])
+        if config["site_dir"]:
+            pipeline.update_site(repos, timestamp, config["site_dir"])
+        if config["history_parquet_dir"]:
+            pipeline.append_snapshot(repos, timestamp, config["history_parquet_dir"])
+
+    queue.enqueue("render", payload)
+
+
+def handle_render(queue, payload, config, lease):
+    """渲染并保存输出文件，然后入队通知和推送任务（数据来自缓存时只通知）"""
+    pipeline = _pipeline()
+    repos = records_from_dicts(payload["repositories"])
+    rendered = pipeline.render_all(
+        repos,
+        formats=config["render_formats"],
+        max_telegram_repos=config["max_repos_in_telegram"],
+        now=datetime.fromisoformat(payload["timestamp"])
+    )
+    outputs = {
+        config["save_filename"]: rendered["markdown"],
+        "trending_today.md": rendered["markdown"],
+        "github_trending_data.json": rendered["json"],
+    }
+    outputs.update(pipeline.extra_format_files(rendered, config["save_filename"]))
+    cache_age = payload.get("cache_age")
+    notice = pipeline.cache_notice(cache_age) if cache_age is not None else ""
+    if cache_age is None:
+        with _shared_writes(lease):
+            if _newer_than_last_render(payload["timestamp"]):
+                if not pipeline.save_outputs(outputs):
+                    raise RuntimeError("保存输出文件失败")
+                write_atomic(RENDER_STAMP_FILENAME, payload["timestamp"].encode("utf-8"))
+            else:
+                trace_event("ℹ️  已有更新的快照写入输出文件，跳过保存", timestamp=payload["timestamp"])
+
+    chat_id = payload.get("chat_id") or config["chat_id"]
+    if chat_id and payload.get("new_only") and config["notify_new_only"]:
+        # 定时订阅只通知尚未发送给该聊天的仓库，发送成功后由 notify 任务记录
+        with _notified_set(pipeline, config) as notified:
+            announced = notified.unseen(chat_id, repos)
+        if announced:
+            text = pipeline.render_all(announced, formats=("telegram",), max_telegram_repos=config["max_repos_in_telegram"])["telegram"]
+            keys = [repo.key for repo in announced[:config["max_repos_in_telegram"]]]
+            queue.enqueue("notify", _child_payload(payload, chat_id=chat_id, text=notice + text, parse_mode="Markdown", announce=keys))
+        else:
+            trace_event("ℹ️  没有新的仓库，跳过通知", chat_id=chat_id)
+    elif chat_id:
+        queue.enqueue("notify", _child_payload(payload, chat_id=chat_id, text=notice + rendered["telegram"], parse_mode="Markdown"))
+    if config["git_auto_push"] and cache_age is None:
+        queue.enqueue("push", _child_payload(payload, chat_id=chat_id))
+
+
+def handle_push(queue, payload, config, lease):
+    """Git 推送（与共享输出的写入共用文件锁，不会推送写了一半的文件）"""
+    pipeline = _pipeline()
+    if not pipeline.check_git_repository():
+        raise RuntimeError("当前目录不是Git仓库")
+
+    with _shared_writes(lease):
+        success = pipeline.git_auto_push(config["git_commit_message"])
+
+    if payload.get("chat_id"):
+        text = "✅ Git push completed successfully!" if success else "⚠️ Git push failed. Please check logs manually."
+        queue.enqueue("notify", _child_payload(payload, chat_id=payload["chat_id"], text=text))
+
+
+def handle_notify(queue, payload, config, lease):
+    """通过 Bot API 发送消息"""
+    pipeline = _pipeline()
+    if not pipeline.send_telegram_message(config["bot_token"], payload["chat_id"], payload["text"],
+                                          parse_mode=payload.get("parse_mode"), api_base=config["telegram_api_base"]):
+        raise RuntimeError("发送Telegram消息失败")
+    if payload.get("announce"):
+        with _notified_set(pipeline, config) as notified:
+            notified.mark(payload["chat_id"], payload["announce"])
+
+
+HANDLERS = {
+    "scrape": handle_scrape,
+    "enrich": handle_enrich,
+    "render": handle_render,
+    "push": handle_push,
+    "notify": handle_notify,
+}
+
+
+def _configure(pipeline, config, worker_count):
+    """设置抓取层；未配置 PARSE_WORKERS 时各工作进程平分 CPU 核数，解析子进程总数不超过核数"""
+    pipeline.configure_fetcher(config)
+    configure_shared_executor(config["parse_workers"] or max(1, (os.cpu_count() or 1) // worker_count))
+
+
+def run_worker(db_path=DEFAULT_JOB_DB, worker_id=None, stop_when_idle=False, worker_count=1):
+    """工作进程主循环：领取任务 -> 执行 -> ack / fail"""
+    worker_id = worker_id or f"{os.uname().nodename}:{os.getpid()}"
+    pipeline = _pipeline()
+    config = pipeline.load_environment()
+    watcher = ConfigWatcher(pipeline.load_environment, config["config_watch_files"], config)
+    config = watcher.current.config
+    _configure(pipeline, config, worker_count)
+    setup_tracing(config["trace_file"], config["trace_otlp_endpoint"], config["trace_console"])
+    queue = JobQueue(db_path)
+    trace_event(f"👷 工作进程 {worker_id} 已启动", worker=worker_id)
+    last_check = time.monotonic()
+
+    try:
+        while True:
+            # 只在两个任务之间切换配置，每个任务从头到尾使用领取时的快照
+            if config["config_reload_interval"] and time.monotonic() - last_check >= config["config_reload_interval"]:
+                last_check = time.monotonic()
+                reloaded = watcher.check()
+                if reloaded:
+                    snapshot, changed = reloaded
+                    config = snapshot.config
+                    if {"github_trending_url", "http_cassette", "http_cassette_mode", "parse_workers"} & set(changed):
+                        _configure(pipeline, config, worker_count)
+                    trace_event(f"🔄 工作进程 {worker_id} 已加载配置 v{snapshot.version}: {', '.join(changed)}",
+                                worker=worker_id, version=snapshot.version, changed=",".join(changed))
+
+            job = queue.claim(worker_id)
+            if job is None:
+                if stop_when_idle:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            try:
+                with span(f"job.{job['kind']}", trace_id=job["payload"].get("trace_id"),
+                          job_id=job["id"], attempt=job["attempts"] + 1, worker=worker_id), \
+                        Lease(db_path, job["id"], worker_id) as lease:
+                    HANDLERS[job["kind"]](queue, job["payload"], config, lease)
+            except Exception as e:
+                status = queue.fail(job["id"], worker_id, f"{e}\n{traceback.format_exc()}")
+                if status is None:
+                    trace_event(f"⚠️  任务 #{job['id']} ({job['kind']}) 失败，但租约已被接管，不再记录: {e}", job_id=job["id"])
+                else:
+                    trace_event(f"❌ 任务 #{job['id']} ({job['kind']}) 失败: {e}（{status}）", job_id=job["id"], status=status)
+            else:
+                if queue.ack(job["id"], worker_id):
+                    trace_event(f"✅ 任务 #{job['id']} ({job['kind']}) 完成", job_id=job["id"])
+                else:
+                    trace_event(f"⚠️  任务 #{job['id']} ({job['kind']}) 完成，但租约已被接管，结果未确认", job_id=job["id"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+        shutdown_shared_executor()
+
+
+def start_workers(count=None, db_path=DEFAULT_JOB_DB):
+    """启动工作进程池（默认按CPU核数），返回进程列表"""
+    count = count or os.cpu_count() or 1
+    processes = []
+    for i in range(count):
+        process = multiprocessing.Process(target=run_worker, args=(db_path,), kwargs={"worker_count": count}, name=f"trending-worker-{i}")
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    # 与 Bot 相同，经由 load_environment() 读取（包括 .env 中的 JOB_QUEUE_DB）
+    db_path = _pipeline().load_environment()["job_queue_db"] or DEFAULT_JOB_DB
+    JobQueue(db_path).close()
+
+    processes = start_workers(count, db_path)
+    print(f"🚀 已启动 {len(processes)} 个工作进程，队列: {db_path}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+两条通道的更新分发
+python-telegram-bot 的 UpdateProcessor 扩展点：按命令把更新分到快通道（/start、/help、搜索、内联查询等
+常数时间的处理）和重通道（/git、/profile 等完整流水线），每条通道有自己的并发上限和排队统计。
+重通道的排队长度有上限，超出时直接回复繁忙，不再占用等待位置，快通道的延迟不受重任务影响
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+HEAVY_COMMANDS = frozenset({"git", "profile"})
+# 等待时间分位数使用的最近样本数
+WAIT_SAMPLES = 512
+
+
+def command_of(update):
+    """更新中的命令名（不含 / 和 @bot 后缀），不是命令时返回 None"""
+    if not isinstance(update, Update) or not update.effective_message:
+        return None
+    text = update.effective_message.text or ""
+    if not text.startswith("/"):
+        return None
+    return text.split()[0][1:].split("@")[0].lower()
+
+
+class Lane:
+    """一条通道：并发上限 + 排队统计"""
+
+    def __init__(self, name, limit, max_waiting=None):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.processed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    @property
+    def full(self):
+        """排队已达上限（只有设置了 max_waiting 的通道会拒绝）"""
+        return self.max_waiting is not None and self.waiting >= self.max_waiting and self.semaphore.locked()
+
+    async def run(self, coroutine):
+        queued_at = time.monotonic()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.waits.append(time.monotonic() - queued_at)
+        self.active += 1
+        try:
+            await coroutine
+        finally:
+            self.active -= 1
+            self.processed += 1
+            self.semaphore.release()
+
+    def metrics(self):
+        waits = sorted(self.waits)
+
+        def pick(q):
+            return round(waits[min(len(waits) - 1, int(len(waits) * q))] * 1000, 2) if waits else None
+
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "wait_ms_p50": pick(0.50),
+            "wait_ms_p99": pick(0.99),
+        }
+
+
+class LaneUpdateProcessor(BaseUpdateProcessor):
+    """按命令把更新分配到快/重两条通道"""
+
+    def __init__(self, fast_limit=32, heavy_limit=2, heavy_queue=8, heavy_commands=HEAVY_COMMANDS):
+        # 外层信号量只是总上限：两条通道都满载并且重通道排满时仍有余量
+        super().__init__(fast_limit + heavy_limit + heavy_queue + 1)
+        self.fast = Lane("fast", fast_limit)
+        self.heavy = Lane("heavy", heavy_limit, max_waiting=heavy_queue)
+        self.heavy_commands = frozenset(heavy_commands)
+
+    def lane_for(self, update):
+        return self.heavy if command_of(update) in self.heavy_commands else self.fast
+
+    async def do_process_update(self, update, coroutine):
+        lane = self.lane_for(update)
+        if lane.full:
+            lane.rejected += 1
+            # 不执行处理函数，也不占用排队位置
+            coroutine.close()
+            await update.effective_message.reply_text("⏳ The bot is busy with other heavy requests. Please try again in a minute.")
+            return
+        await lane.run(coroutine)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def metrics(self):
+        return {"fast": self.fast.metrics(), "heavy": self.heavy.metrics()}
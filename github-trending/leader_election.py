@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+基于 SQLite 租约的主节点选举
+多个 bot_server 副本共享同一个数据库文件，只有持有租约的副本执行定时抓取和 Git 推送；
+租约通过心跳续期，每次易主时 fencing token 递增，写操作前校验 token 防止旧主节点误写
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from tracing import trace_event
+
+DEFAULT_LEADER_DB = "github_trending_leader.db"
+DEFAULT_LEASE_NAME = "trending-writer"
+DEFAULT_TTL = 30
+
+
+class LeadershipLost(RuntimeError):
+    """fencing token 已失效（租约过期或已被其他副本接管）"""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    token INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class LeaderElector:
+    """租约式选主：try_acquire() 获取或续期租约，后台线程定期心跳"""
+
+    def __init__(self, path=DEFAULT_LEADER_DB, name=DEFAULT_LEASE_NAME, ttl=DEFAULT_TTL, holder_id=None):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.holder_id = holder_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.token = None
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def is_leader(self):
+        """本地判断是否仍持有租约（留出一个心跳的安全余量）"""
+        return self.token is not None and time.monotonic() < self._valid_until
+
+    def try_acquire(self):
+        """获取或续期租约，返回是否为主节点"""
+        with self._lock:
+            started = time.monotonic()
+            now = time.time()
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # 数据库繁忙：保持当前状态，等下次心跳
+                return self.is_leader
+            try:
+                row = self.conn.execute(
+                    "SELECT holder, token, expires_at FROM leases WHERE name = ?", (self.name,)
+                ).fetchone()
+                if row is None:
+                    token = 1
+                    self.conn.execute(
+                        "INSERT INTO leases (name, holder, token, expires_at) VALUES (?, ?, ?, ?)",
+                        (self.name, self.holder_id, token, now + self.ttl)
+                    )
+                elif row[0] == self.holder_id or row[2] < now:
+                    # 续期保持 token 不变；接管过期租约时 token 递增
+                    token = row[1] if row[0] == self.holder_id else row[1] + 1
+                    self.conn.execute(
+                        "UPDATE leases SET holder = ?, token = ?, expires_at = ? WHERE name = ?",
+                        (self.holder_id, token, now + self.ttl, self.name)
+                    )
+                else:
+                    token = None
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            if token is None:
+                self.token = None
+                self._valid_until = 0.0
+            else:
+                if self.token != token:
+                    trace_event(f"👑 成为主节点 (fencing token {token})", token=token, holder=self.holder_id)
+                self.token = token
+                self._valid_until = started + self.ttl * 2 / 3
+            return token is not None
+
+    def check_token(self, token=None):
+        """写操作前校验 fencing token 仍是当前有效的租约"""
+        token = token if token is not None else self.token
+        if token is None:
+            return False
+        # 与心跳线程共用同一个连接
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT holder, token, expires_at FROM leases WHERE name = ?", (self.name,)
+            ).fetchone()
+        return row is not None and row[0] == self.holder_id and row[1] == token and row[2] > time.time()
+
+    def ensure_token(self, token=None):
+        """check_token 的断言形式：token 失效时抛出 LeadershipLost"""
+        if not self.check_token(token):
+            raise LeadershipLost(f"fencing token {token if token is not None else self.token} 已失效")
+
+    def release(self):
+        """主动释放租约（正常退出时调用，其他副本无需等待过期）"""
+        with self._lock:
+            if self.token is not None:
+                self.conn.execute(
+                    "UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?",
+                    (self.name, self.holder_id)
+                )
+            self.token = None
+            self._valid_until = 0.0
+
+    def start_heartbeat(self):
+        """启动后台心跳线程（每 ttl/3 秒尝试获取或续期一次）"""
+        if self._thread:
+            return
+        self.try_acquire()
+        self._thread = threading.Thread(target=self._heartbeat, name="leader-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.ttl)
+        self.release()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.try_acquire()
+            except sqlite3.Error as e:
+                trace_event(f"⚠️  租约心跳失败: {e}", holder=self.holder_id, error=str(e))
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+bot_server 并发用户压测
+每秒向 bot_server 的 Application 投递 N 条合成的 Telegram 更新（经由本地模拟的 Bot API 长轮询），
+GitHub 页面由 fake_github.py 提供；统计 "命令 -> 回复" 延迟分位数、事件循环延迟和内存增长，
+并把报告写成 JSON，便于在版本之间对比
+
+运行: python3 load_test.py [--rate 5] [--duration 30] [--command /git [--command /help ...]] [--report load_test_report.json] [--compare 旧报告.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from fake_github import DEFAULT_FIXTURE, FakeGitHubServer
+from fake_telegram import FakeTelegramServer, make_command_update
+
+FAKE_TOKEN = "123456:LOAD-TEST"
+# /git 的最后一条回复（完整运行或被限流时的缓存回复）；其他命令以第一条回复为完成
+DONE_MARKERS = {"/git": ("Process completed", "served from cache")}
+LAG_INTERVAL = 0.05
+CHAT_ID_BASE = 500_000
+
+# 报告中用于版本对比的指标
+COMPARED_METRICS = (
+    ("first_reply_ms", "p50"), ("first_reply_ms", "p95"), ("first_reply_ms", "p99"),
+    ("done_ms", "p50"), ("done_ms", "p95"), ("done_ms", "p99"),
+    ("loop_lag_ms", "p99"), ("loop_lag_ms", "max"),
+    ("memory_mb", "growth"),
+)
+
+
+def percentiles(values):
+    """返回 p50/p95/p99/max/mean（毫秒），样本为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "max": round(ordered[-1], 2), "mean": round(statistics.fmean(ordered), 2)}
+
+
+def current_rss_mb():
+    """当前进程常驻内存（MB），非 Linux 平台退回到峰值 RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+class LoopMonitor:
+    """在机器人所在的事件循环里定期醒来，记录实际唤醒时间与预期的差值（事件循环延迟）和内存"""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.lags = []
+        self.rss = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected) * 1000)
+            self.rss.append(current_rss_mb())
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class Driver:
+    """在独立线程的事件循环中运行模拟服务和负载生成器，避免被机器人阻塞的事件循环影响投递节奏"""
+
+    def __init__(self, fixture, telegram_latency, rate_limit_every):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="load-driver", daemon=True)
+        self.thread.start()
+        self.github = self.call(FakeGitHubServer(default_fixture=fixture).start())
+        self.telegram = self.call(FakeTelegramServer(latency=telegram_latency, rate_limit_every=rate_limit_every).start())
+
+    def call(self, coro):
+        """在驱动线程中执行协程并同步等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro):
+        """在驱动线程中执行协程，返回可在当前事件循环 await 的 Future"""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def _measure_one(self, index, command, timeout):
+        chat_id = CHAT_ID_BASE + index
+        markers = DONE_MARKERS.get(command.split()[0])
+        first = self.telegram.expect_message(chat_id)
+        done = self.telegram.expect_message(chat_id, lambda text: any(m in text for m in markers)) if markers else first
+        started = time.perf_counter()
+        await self.telegram.push_update(make_command_update(self.telegram.next_update_id(), chat_id, command))
+        try:
+            first_at = await asyncio.wait_for(first, timeout)
+            done_at = await asyncio.wait_for(done, max(0.0, timeout - (time.perf_counter() - started)))
+        except asyncio.TimeoutError:
+            return None
+        return (first_at - started) * 1000, (done_at - started) * 1000
+
+    async def generate(self, rate, duration, commands, timeout):
+        """按固定速率轮流投递各条命令，返回每条更新的 (命令, (首条回复延迟, 完成延迟))，超时时延迟为 None"""
+        total = max(1, int(rate * duration))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        for index in range(total):
+            delay = start + index / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(loop.create_task(self._measure_one(index, commands[index % len(commands)], timeout)))
+        results = await asyncio.gather(*tasks)
+        return [(commands[index % len(commands)], result) for index, result in enumerate(results)]
+
+    async def _shutdown(self):
+        await self.telegram.stop()
+        await self.github.stop()
+        # 关闭仍保持 keep-alive 的连接处理任务
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        self.call(self._shutdown())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+
+
+def prepare_environment(driver, workdir):
+    """在临时目录中运行 bot_server，所有外部服务指向本地模拟服务"""
+    os.chdir(workdir)
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": FAKE_TOKEN,
+        "TELEGRAM_CHAT_ID": "",
+        "TELEGRAM_API_BASE": driver.telegram.api_base,
+        "GITHUB_TRENDING_URL": driver.github.trending_url,
+        "GIT_AUTO_PUSH": "false",
+        "JOB_QUEUE_DB": "",
+        "LEADER_DB": "",
+        "SCRAPE_INTERVAL_MINUTES": "0",
+        "HTTP_CASSETTE": "",
+    })
+
+
+async def run_load(args, driver):
+    import bot_server
+
+    application = bot_server.build_application(FAKE_TOKEN, driver.telegram.base_url)
+    monitor = LoopMonitor()
+    rss_start = current_rss_mb()
+
+    await application.initialize()
+    await application.updater.start_polling(poll_interval=0.0, timeout=10)
+    await application.start()
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        tagged = await driver.submit(driver.generate(args.rate, args.duration, args.command, args.timeout))
+    finally:
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+
+    results = [result for _, result in tagged]
+    completed = [r for r in results if r is not None]
+    rss_samples = monitor.rss or [rss_start]
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "params": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "command": ", ".join(args.command),
+            "timeout": args.timeout,
+            "telegram_latency": args.telegram_latency,
+            "rate_limit_every": args.rate_limit_every,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "sent": len(results),
+        "completed": len(completed),
+        "timeouts": len(results) - len(completed),
+        "throughput_per_s": round(len(completed) / elapsed, 2) if elapsed else None,
+        "first_reply_ms": percentiles([r[0] for r in completed]),
+        "done_ms": percentiles([r[1] for r in completed]),
+        "loop_lag_ms": percentiles(monitor.lags),
+        "memory_mb": {
+            "start": round(rss_start, 1),
+            "end": round(rss_samples[-1], 1),
+            "peak": round(max(rss_samples), 1),
+            "growth": round(rss_samples[-1] - rss_start, 1),
+        },
+        "by_command": {
+            command: {
+                "completed": len(done),
+                "first_reply_ms": percentiles([r[0] for r in done]),
+                "done_ms": percentiles([r[1] for r in done]),
+            }
+            for command in args.command
+            for done in [[r for c, r in tagged if c == command and r is not None]]
+        },
+        "lanes": application.update_processor.metrics(),
+        "telegram_calls": dict(driver.telegram.calls),
+        "telegram_429s": driver.telegram.rate_limited,
+        "github_requests": driver.github.requests,
+    }
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"Load test: {report['params']['command']} at {report['params']['rate']}/s "
+          f"for {report['params']['duration']}s (rev {report['revision']})")
+    print("=" * 60)
+    print(f"sent={report['sent']}  completed={report['completed']}  timeouts={report['timeouts']}  "
+          f"throughput={report['throughput_per_s']}/s")
+    for name in ("first_reply_ms", "done_ms", "loop_lag_ms"):
+        stats = report[name]
+        if stats:
+            print(f"{name:<15} p50={stats['p50']:9.2f}  p95={stats['p95']:9.2f}  "
+                  f"p99={stats['p99']:9.2f}  max={stats['max']:9.2f}")
+    if len(report.get("by_command", {})) > 1:
+        for command, stats in report["by_command"].items():
+            done = stats["done_ms"]
+            if done:
+                print(f"  {command:<13} done p50={done['p50']:9.2f}  p95={done['p95']:9.2f}  "
+                      f"p99={done['p99']:9.2f}  max={done['max']:9.2f}")
+    for lane, stats in report.get("lanes", {}).items():
+        print(f"lane {lane:<10} processed={stats['processed']}  peak_waiting={stats['peak_waiting']}  "
+              f"rejected={stats['rejected']}  wait_p99={stats['wait_ms_p99']}ms")
+    memory = report["memory_mb"]
+    print(f"{'memory_mb':<15} start={memory['start']}  end={memory['end']}  peak={memory['peak']}  growth={memory['growth']}")
+
+
+def compare_reports(previous, current):
+    """打印两份报告关键指标的变化"""
+    print("-" * 60)
+    print(f"Compared with {previous.get('revision')} ({previous.get('created_at')}):")
+    for section, key in COMPARED_METRICS:
+        before = (previous.get(section) or {}).get(key)
+        after = (current.get(section) or {}).get(key)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"  {section}.{key:<7} {before:>10} -> {after:<10} ({change})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for bot_server")
+    parser.add_argument("--rate", type=float, default=5.0, help="updates per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--command", action="append", help="command text sent by the synthetic users (repeat to mix commands round-robin; default /git)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each reply")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="extra latency of the fake Bot API")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="fake Bot API returns 429 every N sendMessage calls")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="HTML served as the trending page")
+    parser.add_argument("--report", default="load_test_report.json", help="where to write the JSON report")
+    parser.add_argument("--compare", help="previous report to compare against")
+    args = parser.parse_args()
+    args.command = args.command or ["/git"]
+
+    report_path = os.path.abspath(args.report)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    driver = Driver(os.path.abspath(args.fixture), args.telegram_latency, args.rate_limit_every)
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        with tempfile.TemporaryDirectory(prefix="trending-load-") as workdir:
+            prepare_environment(driver, workdir)
+            try:
+                report = asyncio.run(run_load(args, driver))
+            finally:
+                os.chdir(cwd)
+    finally:
+        driver.stop()
+
+    print_report(report)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📝 报告已保存到: {report_path}")
+
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
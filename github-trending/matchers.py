@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+编译后的关键词匹配器和排除索引
+按输入（关键词/排除列表）缓存：配置热加载时只有内容变化的那一个会被重新编译，
+其余直接复用；匹配语义与原来的逐个子串比较完全相同
+"""
+
+import re
+from functools import lru_cache
+
+# AI/LLM/Agent 相关关键词（可通过 AI_KEYWORDS 覆盖）
+DEFAULT_AI_KEYWORDS = (
+    "ai", "llm", "agent", "machine learning", "deep learning",
+    "neural network", "transformer", "gpt", "chatgpt", "openai",
+    "anthropic", "claude", "gemini", "vector", "embedding", "rag",
+    "language model", "large language model", "ai agent"
+)
+
+
+def _alternation(terms):
+    """把若干小写子串编译成一个正则（长的在前），没有有效子串时返回 None"""
+    terms = sorted({term.lower() for term in terms if term}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(term) for term in terms))
+
+
+class KeywordMatcher:
+    """名称或描述中包含任一关键词即匹配"""
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self._pattern = _alternation(self.keywords)
+
+    def matches(self, repo):
+        if self._pattern is None:
+            return False
+        return bool(self._pattern.search(repo["description"].lower()) or self._pattern.search(repo["name"].lower()))
+
+    def filter(self, repositories):
+        return [repo for repo in repositories if self.matches(repo)]
+
+
+class ExclusionIndex:
+    """仓库名（不区分大小写）包含任一排除项即排除"""
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self._pattern = _alternation(self.names)
+
+    def excludes(self, repo):
+        return self._pattern is not None and bool(self._pattern.search(repo["name"].lower()))
+
+    def apply(self, repositories):
+        if self._pattern is None:
+            return repositories
+        return [repo for repo in repositories if not self.excludes(repo)]
+
+
+@lru_cache(maxsize=8)
+def keyword_matcher(keywords=DEFAULT_AI_KEYWORDS):
+    """返回关键词元组对应的匹配器（相同输入复用已编译的实例）"""
+    return KeywordMatcher(keywords)
+
+
+@lru_cache(maxsize=8)
+def exclusion_index(names):
+    """返回排除列表元组对应的索引（相同输入复用已编译的实例）"""
+    return ExclusionIndex(names)
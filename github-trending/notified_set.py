@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+"已通知" 集合：按聊天保存的可扩展布隆过滤器
+每个聊天一组位数组文件（<目录>/<chat_id>.<层号>.bloom），启动后按需 mmap 映射，只有访问到的页才会占用内存；
+当前层写满后追加一层容量翻倍、误判率减半的新层，整体误判率保持在设定值以下。
+查询是 O(1) 的位运算；布隆过滤器命中时可再用历史库的 notified 表做精确确认，排除误判。
+多个进程可以共享同一目录：写入时持有文件锁，其他进程新建的层会在下次访问时被发现
+
+运行: python3 notified_set.py <目录> [chat_id]
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAGIC = b"TBLM"
+VERSION = 1
+# 魔数, 版本, 哈希函数个数, 容量, 已加入数量, 位数
+HEADER = struct.Struct("<4sHHIIQ")
+COUNT_OFFSET = 12
+
+DEFAULT_CAPACITY = 1024
+DEFAULT_ERROR_RATE = 0.001
+GROWTH = 2
+TIGHTENING = 0.5
+MAX_OPEN_FILTERS = 256
+
+
+def key_hashes(key):
+    """一次哈希得到两个 64 位值，各层用（增强）双重哈希派生 k 个位置"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return struct.unpack("<QQ", digest)
+
+
+class BloomLayer:
+    """单层布隆过滤器，位数组以 mmap 映射在文件中"""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, capacity, error_rate)
+        with open(path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        magic, version, self.k, self.capacity, _, self.m = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"不是有效的布隆过滤器文件: {path}")
+
+    @staticmethod
+    def _create(path, capacity, error_rate):
+        m = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        k = max(1, round(m / capacity * math.log(2)))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, k, capacity, 0, m))
+            f.truncate(HEADER.size + (m + 7) // 8)
+        try:
+            # 另一个进程可能同时创建了同一层，以先创建的为准
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+
+    @property
+    def count(self):
+        return struct.unpack_from("<I", self._mm, COUNT_OFFSET)[0]
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def _positions(self, hashes):
+        # 增强双重哈希：多出的立方项避免 m 与 h2 有公因子时位置重复，实测误判率接近理论值
+        h1, h2 = hashes
+        return ((h1 + i * h2 + (i ** 3 - i) // 6) % self.m for i in range(self.k))
+
+    def contains(self, hashes):
+        mm = self._mm
+        return all(mm[HEADER.size + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(hashes))
+
+    def add(self, hashes):
+        mm = self._mm
+        for pos in self._positions(hashes):
+            mm[HEADER.size + (pos >> 3)] |= 1 << (pos & 7)
+        struct.pack_into("<I", mm, COUNT_OFFSET, self.count + 1)
+
+    def close(self):
+        self._mm.close()
+
+
+class ScalableBloomFilter:
+    """按需追加层的布隆过滤器（文件前缀相同，层号递增）"""
+
+    def __init__(self, prefix, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.prefix = prefix
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.layers = []
+        self.refresh()
+
+    def _layer_path(self, index):
+        return f"{self.prefix}.{index}.bloom"
+
+    def refresh(self):
+        """加载其他进程新建的层"""
+        while os.path.exists(self._layer_path(len(self.layers))):
+            self.layers.append(BloomLayer(self._layer_path(len(self.layers))))
+
+    def _add_layer(self):
+        index = len(self.layers)
+        # 第 i 层误判率为 p*(1-r)*r^i，各层之和不超过 p
+        error_rate = self.error_rate * (1 - TIGHTENING) * TIGHTENING ** index
+        self.layers.append(BloomLayer(self._layer_path(index), self.capacity * GROWTH ** index, error_rate))
+
+    def __len__(self):
+        return sum(layer.count for layer in self.layers)
+
+    def contains(self, hashes):
+        return any(layer.contains(hashes) for layer in self.layers)
+
+    def add(self, hashes):
+        """加入一个键，已存在（或误判为存在）时返回 False"""
+        if self.contains(hashes):
+            return False
+        if not self.layers or self.layers[-1].full:
+            self._add_layer()
+        self.layers[-1].add(hashes)
+        return True
+
+    def close(self):
+        for layer in self.layers:
+            layer.close()
+        self.layers = []
+
+
+class NotifiedSet:
+    """每个聊天已经通知过的仓库；exact 为提供 notified_keys/mark_notified 的精确存储（如 HistoryStore）"""
+
+    def __init__(self, directory, exact=None, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE,
+                 max_open=MAX_OPEN_FILTERS):
+        self.directory = directory
+        self.exact = exact
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_open = max_open
+        # 最近使用的聊天保持映射，超出上限时关闭最久未用的
+        self._filters = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def _prefix(self, chat_id):
+        return os.path.join(self.directory, str(chat_id).replace(os.sep, "_"))
+
+    def _filter(self, chat_id):
+        chat_id = str(chat_id)
+        bloom = self._filters.get(chat_id)
+        if bloom is None:
+            bloom = ScalableBloomFilter(self._prefix(chat_id), self.capacity, self.error_rate)
+            self._filters[chat_id] = bloom
+            while len(self._filters) > self.max_open:
+                self._filters.popitem(last=False)[1].close()
+        else:
+            self._filters.move_to_end(chat_id)
+            bloom.refresh()
+        return bloom
+
+    @contextmanager
+    def _locked(self, chat_id):
+        with open(self._prefix(chat_id) + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def unseen(self, chat_id, records):
+        """返回尚未通知过该聊天的记录（保持原顺序）"""
+        bloom = self._filter(chat_id)
+        hits = [record.key for record in records if bloom.contains(key_hashes(record.key))]
+        if not hits:
+            return list(records)
+        # 没有精确存储时，布隆过滤器命中即视为已通知（误判率为 error_rate）
+        seen = self.exact.notified_keys(chat_id, hits) if self.exact else set(hits)
+        return [record for record in records if record.key not in seen]
+
+    def mark(self, chat_id, keys):
+        """记录已通知的仓库键，返回新加入的数量"""
+        keys = list(keys)
+        with self._locked(chat_id):
+            bloom = self._filter(chat_id)
+            added = sum(bloom.add(key_hashes(key)) for key in keys)
+        if self.exact and keys:
+            self.exact.mark_notified(chat_id, keys)
+        return added
+
+    def close(self):
+        for bloom in self._filters.values():
+            bloom.close()
+        self._filters.clear()
+
+
+def main():
+    """显示某个目录中各聊天过滤器的层数、已加入数量和占用空间"""
+    if len(sys.argv) < 2:
+        print("用法: python3 notified_set.py <目录> [chat_id]")
+        return
+    directory = sys.argv[1]
+    chats = sorted({name.split(".")[0] for name in os.listdir(directory) if name.endswith(".bloom")})
+    if len(sys.argv) > 2:
+        chats = [sys.argv[2]]
+    for chat_id in chats:
+        bloom = ScalableBloomFilter(os.path.join(directory, chat_id))
+        size = sum(os.path.getsize(layer.path) for layer in bloom.layers)
+        print(f"{chat_id}: {len(bloom.layers)} 层, {len(bloom)} 个仓库, {size:,} 字节")
+        bloom.close()
+
+
+if __name__ == "__main__":
+    main()
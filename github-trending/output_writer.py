@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+原子化、按内容哈希去重的输出写入
+内容与磁盘上的文件相同时跳过写入（Git 不需要重新哈希），
+否则先写临时文件再 os.replace，避免进程中途崩溃留下半截文件。
+可传入 ignore 正则（字节模式），比较时忽略匹配的部分（如生成时间），只有这部分不同也视为未变化
+"""
+
+import hashlib
+import os
+import tempfile
+
+# (路径, 忽略的模式) -> ((mtime_ns, size), 内容哈希)，避免重复读取磁盘
+_hash_cache = {}
+
+
+def _default_mode():
+    """新文件的权限（与 open() 创建文件时一致，遵循 umask）"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# 启动时计算一次，避免运行中修改 umask 影响其他线程
+_DEFAULT_MODE = _default_mode()
+
+
+def content_hash(data, ignore=None):
+    """计算内容的 SHA-256 哈希（ignore 匹配的部分不参与计算）"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if ignore is not None:
+        data = ignore.sub(b"", data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_key(path, ignore):
+    return os.path.abspath(path), ignore.pattern if ignore is not None else None
+
+
+def file_hash(path, ignore=None):
+    """返回磁盘文件的内容哈希，文件不存在时返回 None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = _cache_key(path, ignore)
+    cached = _hash_cache.get(key)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+
+    with open(path, "rb") as f:
+        digest = content_hash(f.read(), ignore)
+    _hash_cache[key] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return digest
+
+
+def write_atomic(path, data):
+    """先写同目录下的临时文件并 fsync，再用 os.replace 原子替换"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = _DEFAULT_MODE
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_if_changed(path, content, digest=None, ignore=None):
+    """内容变化时原子写入，返回 True 表示实际写入，False 表示内容相同已跳过
+
+    digest 为预先计算的哈希（须使用同一个 ignore）
+    """
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    digest = digest or content_hash(data, ignore)
+
+    if file_hash(path, ignore) == digest:
+        return False
+
+    write_atomic(path, data)
+    stat = os.stat(path)
+    _hash_cache[_cache_key(path, ignore)] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return True
+
+
+class OutputWriter:
+    """收集一批输出文件后统一写入，相同内容只编码和哈希一次；ignore 作用于这一批的所有文件"""
+
+    def __init__(self, ignore=None):
+        self.ignore = ignore
+        self._pending = {}
+
+    def add(self, path, content):
+        """登记一个待写入的文件（同一路径以最后一次为准）"""
+        self._pending[path] = content
+
+    def flush(self):
+        """写入所有登记的文件，返回 {路径: 是否实际写入}"""
+        encoded = {}
+        results = {}
+
+        for path, content in self._pending.items():
+            if content not in encoded:
+                data = content.encode("utf-8") if isinstance(content, str) else content
+                encoded[content] = (data, content_hash(data, self.ignore))
+            data, digest = encoded[content]
+            results[path] = write_if_changed(path, data, digest, self.ignore)
+
+        self._pending.clear()
+        return results
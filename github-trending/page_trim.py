@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+解析前的页面裁剪
+Trending 页面大部分是导航、脚本和页脚，仓库列表只占一小段；
+在字节层面定位第一个 <article class="Box-row"> 到最后一个 </article>，只把这一段交给 HTML 解析器
+"""
+
+REPO_LIST_START = b'<article class="Box-row"'
+REPO_LIST_END = b"</article>"
+
+
+def trim_repo_list(html_content):
+    """返回仓库列表所在的片段（bytes 或 str，与输入类型一致）；找不到标记时原样返回"""
+    start_marker, end_marker = REPO_LIST_START, REPO_LIST_END
+    if isinstance(html_content, str):
+        start_marker, end_marker = start_marker.decode("ascii"), end_marker.decode("ascii")
+
+    start = html_content.find(start_marker)
+    if start < 0:
+        return html_content
+    end = html_content.rfind(end_marker)
+    if end < start:
+        return html_content
+    return html_content[start:end + len(end_marker)]
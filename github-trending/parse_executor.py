@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+多页面并行解析
+BeautifulSoup 解析是 CPU 密集型且受 GIL 限制，批量抓取多个 trending 分片时
+把页面分发到按 CPU 核数大小的进程池中解析；子进程只回传紧凑的记录元组，
+父进程限制同时在途的页面数量，并按完成顺序流式产出结果，内存占用保持有界。
+长期运行的进程通过 shared_executor() 复用同一个进程池（大小由 configure_shared_executor() 设置），
+退出时调用 shutdown_shared_executor()。
+子进程经 forkserver（不支持时用 spawn）启动，不从多线程的父进程直接 fork，且只导入轻量的 trending_parser
+
+运行: python3 parse_executor.py [HTML文件...]
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from repo_record import RepoRecord
+
+
+def _parse_page(key, html_content):
+    """子进程：解析一个页面，返回 (key, 记录元组列表)"""
+    from trending_parser import parse_repositories
+    return key, [record.to_tuple() for record in parse_repositories(html_content)]
+
+
+def _mp_context():
+    """子进程的启动方式：父进程（机器人）有多个线程，直接 fork 可能继承被其他线程持有的锁"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        # forkserver 进程预先导入主模块（默认行为，否则每个子进程都会重新导入一次）和解析模块，
+        # 之后的子进程由它 fork，不必各自重新导入
+        context.set_forkserver_preload(["__main__", "trending_parser"])
+    return context
+
+
+class ParseExecutor:
+    """进程池解析器：parse_pages() 按完成顺序产出 (key, RepoRecord 列表)"""
+
+    def __init__(self, max_workers=None, max_in_flight=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 在途页面数上限：父进程最多同时持有这么多份 HTML 和结果
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def pool(self):
+        # 共享实例可能被多个线程同时使用，只创建一个进程池
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_mp_context())
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def parse_pages(self, pages):
+        """pages 为 (key, html) 的可迭代对象（可以是惰性生成器），按完成顺序产出 (key, 记录列表)"""
+        pages = iter(pages)
+        pending = set()
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < self.max_in_flight:
+                try:
+                    key, html_content = next(pages)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(self.pool.submit(_parse_page, key, html_content))
+
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, rows = future.result()
+                yield key, [RepoRecord.from_tuple(row) for row in rows]
+
+    def parse_all(self, pages):
+        """解析全部页面，返回 {key: 记录列表}"""
+        return dict(self.parse_pages(pages))
+
+
+_shared_executor = None
+_shared_max_workers = None
+_shared_lock = threading.Lock()
+
+
+def configure_shared_executor(max_workers=None):
+    """设置共享进程池的大小（None/0 表示 CPU 核数）；大小变化时关闭旧池，下次解析时按新大小创建"""
+    global _shared_max_workers
+    with _shared_lock:
+        _shared_max_workers = max_workers or None
+        executor = _shared_executor
+    if executor is not None and executor.max_workers != (max_workers or os.cpu_count() or 1):
+        shutdown_shared_executor()
+
+
+def shared_executor():
+    """进程内共享的解析器（首次解析时才启动子进程），多次批量抓取复用同一个进程池"""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ParseExecutor(max_workers=_shared_max_workers)
+        return _shared_executor
+
+
+def shutdown_shared_executor():
+    """关闭共享进程池（应用退出时调用；之后再次使用会重新创建）"""
+    global _shared_executor
+    with _shared_lock:
+        executor, _shared_executor = _shared_executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def _read_pages(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield path, f.read()
+
+
+def main():
+    paths = sys.argv[1:] or ["github_trending_structure.html"] * 16
+    started = time.perf_counter()
+    with ParseExecutor() as executor:
+        total = 0
+        for path, records in executor.parse_pages(_read_pages(paths)):
+            total += len(records)
+        workers = executor.max_workers
+    elapsed = time.perf_counter() - started
+    print(f"✅ 使用 {workers} 个进程解析 {len(paths)} 个页面，共 {total} 个仓库，耗时 {elapsed:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
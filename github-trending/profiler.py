@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+按需性能分析
+profile_call() 在 cProfile 和 tracemalloc 下运行一次协程，生成累计耗时最高的函数和分配最多的代码位置报告；
+cProfile 只分析启用它的线程，协程经 to_thread() / profiled() 交给工作线程的调用在各自线程中单独分析，最后合并进同一份报告。
+StackSampler 是低开销的持续采样模式：后台线程定期采样所有线程（或指定线程）的调用栈，
+保留最近一段时间窗口内的样本，定期写出折叠栈（folded stacks）文件，可直接交给 flamegraph.pl / speedscope 生成火焰图
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+from output_writer import write_atomic
+from tracing import trace_event
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+TRACEMALLOC_FRAMES = 10
+
+# 当前 profile_call() 的会话；asyncio.to_thread 和 tracing.wrap_context 会把它复制到工作线程
+_session = contextvars.ContextVar("profile_session", default=None)
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class _ProfileSession:
+    """一次 profile_call() 期间各工作线程的 cProfile 结果"""
+
+    def __init__(self):
+        self.profiles = []
+        # 正在被分析的线程（事件循环线程由 profile_call 自己的 Profile 负责）
+        self.threads = {threading.get_ident()}
+        self.lock = threading.Lock()
+
+
+def profiled(func):
+    """profile_call() 期间提交到其他线程的函数用它包装：在工作线程中单独运行一个 cProfile，结束后并入报告
+
+    在会话之外调用时原样返回 func，没有额外开销
+    """
+    session = _session.get()
+    if session is None:
+        return func
+
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        with session.lock:
+            # 同一线程已经在被分析（嵌套调用），再启用一个 Profile 会替换掉外层的钩子
+            nested = ident in session.threads
+            session.threads.add(ident)
+        if nested:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with session.lock:
+                session.threads.discard(ident)
+                session.profiles.append(profile)
+    return wrapper
+
+
+async def to_thread(func, /, *args, **kwargs):
+    """asyncio.to_thread 的替代：在 profile_call() 期间，工作线程中的调用也会被分析"""
+    return await asyncio.to_thread(profiled(func), *args, **kwargs)
+
+
+async def profile_call(coro, top_functions=TOP_FUNCTIONS, top_allocations=TOP_ALLOCATIONS):
+    """在 cProfile + tracemalloc 下等待 coro 完成，返回 (报告文本, 一行摘要)
+
+    分析器按线程工作：等待期间事件循环里运行的其他任务也会被计入；
+    coro 经 to_thread() / profiled() 交给工作线程的调用单独分析后合并（其他线程池里未包装的调用不会被计入）
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profile = cProfile.Profile()
+    session = _ProfileSession()
+    token = _session.set(session)
+    started = time.perf_counter()
+
+    profile.enable()
+    try:
+        await coro
+    finally:
+        profile.disable()
+        _session.reset(token)
+        elapsed = time.perf_counter() - started
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+
+    # 过滤掉 tracemalloc 自身的分配
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    allocations = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+
+    out = io.StringIO()
+    out.write(f"Wall time: {elapsed:.3f}s\n")
+    out.write(f"Traced memory: current {format_size(current)}, peak {format_size(peak)}\n")
+    with session.lock:
+        thread_profiles = list(session.profiles)
+    out.write(f"Worker-thread calls merged: {len(thread_profiles)}\n\n")
+    out.write(f"=== Top {top_functions} functions by cumulative time (all threads) ===\n")
+    stats = pstats.Stats(profile, stream=out)
+    if thread_profiles:
+        stats.add(*thread_profiles)
+    stats.sort_stats("cumulative").print_stats(top_functions)
+    out.write(f"\n=== Top {top_allocations} allocation sites (net change during the run) ===\n")
+    for stat in allocations[:top_allocations]:
+        frame = stat.traceback[0]
+        out.write(f"{format_size(stat.size_diff):>12}  {stat.count_diff:+8d} blocks  {frame.filename}:{frame.lineno}\n")
+
+    summary = f"{elapsed:.2f}s wall, peak traced memory {format_size(peak)}"
+    return out.getvalue(), summary
+
+
+def _fold_stack(frame):
+    """把帧链折叠成 "文件:函数;文件:函数" 形式（根在前）"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    """后台采样调用栈，滚动保留最近 window 秒的样本并定期写出折叠栈文件
+
+    默认采样除自身以外的所有线程，每个栈以线程名开头，火焰图里按线程分开；传入 thread_id 时只采样该线程
+    """
+
+    def __init__(self, path, thread_id=None, interval=0.01, window=300, flush_interval=10):
+        self.path = path
+        self.thread_id = thread_id
+        self.interval = interval
+        self.window = window
+        self.flush_interval = flush_interval
+        # 每秒一个计数桶，超出时间窗口的桶被丢弃
+        self._buckets = deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval)
+            self._thread = None
+        self.flush()
+
+    def folded(self):
+        """合并时间窗口内的全部样本"""
+        total = Counter()
+        for _, bucket in list(self._buckets):
+            total.update(bucket)
+        return total
+
+    def flush(self):
+        lines = [f"{stack} {count}" for stack, count in self.folded().most_common()]
+        try:
+            write_atomic(self.path, ("\n".join(lines) + "\n").encode("utf-8"))
+        except OSError as e:
+            trace_event(f"⚠️  写入采样文件失败: {e}", path=self.path, error=str(e))
+
+    def _frames(self):
+        """本次要采样的 (线程名, 栈顶帧)"""
+        frames = sys._current_frames()
+        if self.thread_id is not None:
+            frame = frames.get(self.thread_id)
+            return [] if frame is None else [(None, frame)]
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        # 折叠栈格式以空格分隔栈和计数，线程名里的空格替换掉
+        return [(names.get(ident, str(ident)).replace(" ", "_"), frame) for ident, frame in frames.items() if ident != own]
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            samples = self._frames()
+            if not samples:
+                continue
+            second = int(time.monotonic())
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append((second, Counter()))
+                while self._buckets[0][0] <= second - self.window:
+                    self._buckets.popleft()
+            bucket = self._buckets[-1][1]
+            for name, frame in samples:
+                stack = _fold_stack(frame)
+                bucket[stack if name is None else f"{name};{stack}"] += 1
+            del samples
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
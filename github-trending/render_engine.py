@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+单次遍历的多格式渲染引擎
+遍历一次仓库列表，同时生成 Markdown 表格、Telegram 消息、HTML、JSON 和 RSS，
+每种格式写入独立的缓冲列表，最后一次性 join，避免循环里反复字符串拼接
+"""
+
+import json
+import re
+from datetime import datetime
+from email.utils import format_datetime
+from html import escape
+
+from repo_record import RepoRecord
+
+ALL_FORMATS = ("markdown", "telegram", "html", "json", "rss")
+DEFAULT_FORMATS = ("markdown", "telegram", "json")
+
+EMPTY_MARKDOWN = "# GitHub Trending\n\n未找到相关仓库。"
+EMPTY_TELEGRAM = "GitHub Trending: 今天没有找到AI/LLM/Agent相关仓库。"
+
+TELEGRAM_MAX_LENGTH = 4000
+TELEGRAM_TRUNCATE_AT = 3900
+
+# 预编译模板（绑定的 str.format 方法，避免每行重复解析格式串）
+MD_HEADER = (
+    "# GitHub Trending (AI/LLM/Agent相关) - {date}\n\n"
+    "| 仓库名称 | URL | 描述（功能） | 星数 |\n"
+    "|----------|-----|--------------|------|\n"
+).format
+MD_ROW = "| {name} | [{url}]({url}) | {desc} | {stars} |\n".format
+MD_FOOTER = "\n**总计: {total} 个仓库**\n**更新时间: {date}**\n".format
+
+TG_HEADER = "🚀 *GitHub Trending (AI/LLM/Agent相关) - {date}*\n\n".format
+TG_ROW = "{index}. *{name}*\n   ⭐ {stars} | {desc}\n   🔗 {url}\n\n".format
+TG_MORE = "... 还有 {count} 个仓库\n\n".format
+TG_FOOTER = "📊 总计: {total} 个仓库".format
+
+HTML_HEADER = (
+    "<!DOCTYPE html>\n<html lang=\"zh\">\n<head>\n<meta charset=\"utf-8\">\n"
+    "<title>GitHub Trending (AI/LLM/Agent相关) - {date}</title>\n</head>\n<body>\n"
+    "<h1>GitHub Trending (AI/LLM/Agent相关) - {date}</h1>\n"
+    "<table>\n<thead><tr><th>仓库名称</th><th>描述（功能）</th><th>星数</th></tr></thead>\n<tbody>\n"
+).format
+HTML_ROW = "<tr><td><a href=\"{url}\">{name}</a></td><td>{desc}</td><td>{stars}</td></tr>\n".format
+HTML_FOOTER = "</tbody>\n</table>\n<p>总计: {total} 个仓库 | 更新时间: {date}</p>\n</body>\n</html>\n".format
+
+JSON_HEADER = "{{\n  \"timestamp\": {timestamp},\n  \"total_repos\": {total},\n  \"repositories\": [\n".format
+JSON_FOOTER = "\n  ]\n}"
+
+RSS_HEADER = (
+    "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<rss version=\"2.0\">\n<channel>\n"
+    "<title>GitHub Trending (AI/LLM/Agent相关)</title>\n"
+    "<link>https://github.com/trending</link>\n"
+    "<description>GitHub Trending AI/LLM/Agent 相关仓库</description>\n"
+    "<lastBuildDate>{date}</lastBuildDate>\n"
+).format
+RSS_ITEM = (
+    "<item><title>{name}</title><link>{url}</link><guid>{url}</guid>"
+    "<description>⭐ {stars} | {desc}</description></item>\n"
+).format
+RSS_FOOTER = "</channel>\n</rss>\n"
+
+# 各格式中只包含生成时间的行：比较内容是否变化时忽略它们，否则每次运行都会重写文件
+VOLATILE_LINES = re.compile(
+    r"^(?:# GitHub Trending \(AI/LLM/Agent相关\) - |\*\*更新时间: |  \"timestamp\": |"
+    r"<title>GitHub Trending \(AI/LLM/Agent相关\) - |<h1>GitHub Trending \(AI/LLM/Agent相关\) - |"
+    r"<p>总计: \d+ 个仓库 \| 更新时间: |<lastBuildDate>).*$".encode("utf-8"),
+    re.MULTILINE,
+)
+
+
+def _json_row(record):
+    """与 json.dump(indent=2) 输出一致的单行仓库片段（位于 repositories 列表内）"""
+    return "    " + json.dumps(record.to_dict(), ensure_ascii=False, indent=2).replace("\n", "\n    ")
+
+
+def render_all(repositories, formats=DEFAULT_FORMATS, max_telegram_repos=5, now=None):
+    """单次遍历渲染所有请求的格式，返回 {格式: 字符串}"""
+    formats = set(formats)
+    unknown = formats.difference(ALL_FORMATS)
+    if unknown:
+        raise ValueError(f"未知的输出格式: {', '.join(sorted(unknown))}")
+
+    now = now or datetime.now()
+    total = len(repositories)
+    md_date = now.strftime("%Y-%m-%d %H:%M:%S")
+    tg_date = now.strftime("%Y-%m-%d %H:%M")
+
+    want_md = "markdown" in formats
+    want_tg = "telegram" in formats
+    want_html = "html" in formats
+    want_json = "json" in formats
+    want_rss = "rss" in formats
+
+    md, tg, html_parts, json_rows, rss = [], [], [], [], []
+    tg_limit = min(max_telegram_repos, total)
+
+    if want_md and total:
+        md.append(MD_HEADER(date=md_date))
+    if want_tg and total:
+        tg.append(TG_HEADER(date=tg_date))
+    if want_html:
+        html_parts.append(HTML_HEADER(date=escape(md_date)))
+    if want_rss:
+        rss.append(RSS_HEADER(date=format_datetime(now.astimezone())))
+
+    for index, repo in enumerate(repositories, 1):
+        name = repo["name"]
+        url = repo["url"]
+        description = repo["description"]
+        stars = repo["stars"]
+
+        if want_md:
+            md.append(MD_ROW(
+                name=name.replace("|", "\\|"),
+                url=url,
+                desc=description.replace("|", "\\|").replace("\n", " "),
+                stars=stars,
+            ))
+        if want_tg and index <= tg_limit:
+            short_desc = description[:80] + "..." if len(description) > 80 else description
+            tg.append(TG_ROW(index=index, name=name, stars=stars, desc=short_desc, url=url))
+        if want_html or want_rss:
+            safe_name = escape(name)
+            safe_url = escape(url)
+            safe_desc = escape(description)
+            if want_html:
+                html_parts.append(HTML_ROW(url=safe_url, name=safe_name, desc=safe_desc, stars=stars))
+            if want_rss:
+                rss.append(RSS_ITEM(name=safe_name, url=safe_url, desc=safe_desc, stars=stars))
+        if want_json:
+            record = repo if isinstance(repo, RepoRecord) else RepoRecord.from_dict(repo)
+            json_rows.append(_json_row(record))
+
+    output = {}
+
+    if want_md:
+        if total:
+            md.append(MD_FOOTER(total=total, date=md_date))
+            output["markdown"] = "".join(md)
+        else:
+            output["markdown"] = EMPTY_MARKDOWN
+
+    if want_tg:
+        if total:
+            if total > tg_limit:
+                tg.append(TG_MORE(count=total - tg_limit))
+            tg.append(TG_FOOTER(total=total))
+            message = "".join(tg)
+            # 检查消息长度（Telegram限制4096字符）
+            if len(message) > TELEGRAM_MAX_LENGTH:
+                message = message[:TELEGRAM_TRUNCATE_AT] + "\n\n...（消息过长，已截断）"
+            output["telegram"] = message
+        else:
+            output["telegram"] = EMPTY_TELEGRAM
+
+    if want_html:
+        html_parts.append(HTML_FOOTER(total=total, date=escape(md_date)))
+        output["html"] = "".join(html_parts)
+
+    if want_json:
+        header = JSON_HEADER(timestamp=json.dumps(now.isoformat()), total=total)
+        if json_rows:
+            output["json"] = header + ",\n".join(json_rows) + JSON_FOOTER
+        else:
+            output["json"] = header.rstrip("\n") + "]\n}"
+
+    if want_rss:
+        rss.append(RSS_FOOTER)
+        output["rss"] = "".join(rss)
+
+    return output
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+多分片抓取结果的去重合并
+同时抓取 daily/weekly、按语言等多个 trending 分片时，同一个仓库会在多个页面中出现，星数略有不同。
+SliceMerger 以规范化的 owner/repo（RepoRecord.key）为键合并：保留抓取时间最新的那一份指标，
+之后的过滤、渲染和入库只处理唯一仓库。weekly/monthly 页面的 "stars this week/month" 按时间范围分开记录，
+合并后的 stars_today 只取 daily 分片的值（仓库只出现在 weekly/monthly 分片时为 0）。
+抓取层在上游不可用时会返回缓存页面，合并结果记录哪些分片来自缓存，调用方据此跳过入库和推送
+"""
+
+import os
+import time
+from urllib.parse import quote
+
+from fetch_layer import DEFAULT_CACHE_PATH
+
+# 未配置分片时只抓取主页面（即 GITHUB_TRENDING_URL 本身）
+DEFAULT_SLICE = ""
+PERIODS = ("daily", "weekly", "monthly")
+
+
+def parse_slice(name):
+    """把 "python:weekly"、"weekly"、"rust" 这样的分片名解析为 (语言, 时间范围)，缺省部分为 None"""
+    language, since = None, None
+    for part in name.lower().split(":"):
+        part = part.strip()
+        if not part:
+            continue
+        if part in PERIODS:
+            since = part
+        else:
+            language = part
+    return language, since
+
+
+def slice_url(base_url, name):
+    """分片对应的 trending 页面地址"""
+    language, since = parse_slice(name)
+    url = base_url.rstrip("/")
+    if language:
+        url += "/" + quote(language, safe="+#")
+    if since:
+        url += f"?since={since}"
+    return url if (language or since) else base_url
+
+
+def slice_cache_path(name, base_path=DEFAULT_CACHE_PATH):
+    """每个分片单独的页面缓存文件"""
+    if not name:
+        return base_path
+    root, ext = os.path.splitext(base_path)
+    slug = "".join(ch if ch.isalnum() else "-" for ch in name.lower())
+    return f"{root}-{slug}{ext}"
+
+
+class SliceMerger:
+    """按 owner/repo 合并多个分片的记录"""
+
+    def __init__(self):
+        # key -> [记录, 抓取时间, {时间范围: 该范围内新增星数}]（dict 保持首次出现的顺序）
+        self._entries = {}
+        self.rows = 0
+        # 来自缓存（而不是本次实际抓取）的分片 -> 缓存的抓取时间
+        self.cached_slices = {}
+
+    def add(self, slice_name, records, fetched_at=0.0, from_cache=False):
+        """加入一个分片的记录；抓取时间相同时保留先加入的分片的指标"""
+        if from_cache:
+            self.cached_slices[slice_name] = fetched_at
+        # GitHub 未指定 since 时即 daily
+        period = parse_slice(slice_name)[1] or "daily"
+        for record in records:
+            self.rows += 1
+            entry = self._entries.get(record.key)
+            if entry is None:
+                self._entries[record.key] = [record, fetched_at, {period: record.stars_today}]
+                continue
+            if period not in entry[2] or fetched_at > entry[1]:
+                entry[2][period] = record.stars_today
+            if fetched_at > entry[1]:
+                entry[0], entry[1] = record, fetched_at
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def from_cache(self):
+        """是否有分片使用了缓存页面（数据可能已过期）"""
+        return bool(self.cached_slices)
+
+    def cache_age(self, now=None):
+        """最旧的缓存分片距今的秒数，没有使用缓存时返回 None"""
+        if not self.cached_slices:
+            return None
+        return max(0, int((now or time.time()) - min(self.cached_slices.values())))
+
+    def records(self):
+        """唯一仓库列表（按首次出现的顺序），stars_today 取 daily 分片的值（需要时生成新记录，不修改输入）"""
+        records = []
+        for record, _, gains in self._entries.values():
+            stars_today = gains.get("daily", 0)
+            records.append(record if record.stars_today == stars_today else record.replace(stars_today=stars_today))
+        return records
+
+
+def merge_slices(slices):
+    """slices 为 (分片名, 记录列表, 抓取时间[, 是否来自缓存]) 的可迭代对象，返回 SliceMerger"""
+    merger = SliceMerger()
+    for slice_name, records, fetched_at, *from_cache in slices:
+        merger.add(slice_name, records, fetched_at, *from_cache)
+    return merger
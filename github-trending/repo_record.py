@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+紧凑的仓库记录类型
+使用 __slots__ 存储仓库信息，星数/Fork数/今日新增星数均为整数，
+owner 与仓库名经过 intern，可与 github_trending_data.json 的格式互相转换
+"""
+
+import json
+import re
+import sys
+from operator import attrgetter
+
+# JSON 中的字段（与 github_trending_data.json 保持一致）
+RECORD_FIELDS = ("name", "url", "description", "stars", "forks", "stars_today")
+
+_COUNT_RE = re.compile(r"[\d,]+")
+
+
+def parse_count(text):
+    """把 "5,008" 或 "502 stars today" 这样的文本解析为整数"""
+    if text is None:
+        return 0
+    if isinstance(text, int):
+        return text
+    match = _COUNT_RE.search(str(text))
+    if not match:
+        return 0
+    digits = match.group(0).replace(",", "")
+    return int(digits) if digits else 0
+
+
+class RepoRecord:
+    """单个趋势仓库的紧凑记录"""
+
+    __slots__ = ("owner", "repo", "description", "stars", "forks", "stars_today")
+
+    def __init__(self, owner, repo, description="N/A", stars=0, forks=0, stars_today=0):
+        self.owner = sys.intern(owner)
+        self.repo = sys.intern(repo)
+        self.description = description
+        self.stars = stars
+        self.forks = forks
+        self.stars_today = stars_today
+
+    @property
+    def name(self):
+        """owner/repo 形式的完整名称"""
+        return f"{self.owner}/{self.repo}"
+
+    @property
+    def url(self):
+        return f"https://github.com/{self.owner}/{self.repo}"
+
+    @property
+    def key(self):
+        """用于去重和索引的规范化键（小写 owner/repo）"""
+        return f"{self.owner}/{self.repo}".lower()
+
+    # 兼容旧代码中 repo["name"] / repo["stars"] 的字典式访问
+    def __getitem__(self, field):
+        if field not in RECORD_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def to_tuple(self):
+        """紧凑元组表示（跨进程传输时比对象或字典更小）"""
+        return (self.owner, self.repo, self.description, self.stars, self.forks, self.stars_today)
+
+    def replace(self, **changes):
+        """返回修改了部分字段的新记录（记录参与哈希，不原地修改）"""
+        fields = dict(zip(self.__slots__, self.to_tuple()))
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, RepoRecord):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __hash__(self):
+        return hash(self.to_tuple())
+
+    def __repr__(self):
+        return f"RepoRecord({self.name!r}, stars={self.stars}, forks={self.forks}, stars_today={self.stars_today})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """从JSON字典（stars等字段可能是字符串）创建记录"""
+        owner, _, repo = data["name"].partition("/")
+        return cls(
+            owner,
+            repo,
+            data.get("description", "N/A"),
+            parse_count(data.get("stars")),
+            parse_count(data.get("forks")),
+            parse_count(data.get("stars_today")),
+        )
+
+    @classmethod
+    def from_tuple(cls, values):
+        """从 to_tuple() 的结果恢复记录"""
+        return cls(*values)
+
+    def to_dict(self):
+        """转换为 github_trending_data.json 使用的字典格式"""
+        return {
+            "name": self.name,
+            "url": self.url,
+            "description": self.description,
+            "stars": str(self.stars),
+            "forks": str(self.forks),
+            "stars_today": str(self.stars_today),
+        }
+
+
+def records_from_dicts(repositories):
+    """把字典列表转换为记录列表（已是记录的元素原样保留）"""
+    return [repo if isinstance(repo, RepoRecord) else RepoRecord.from_dict(repo) for repo in repositories]
+
+
+def records_to_dicts(repositories):
+    """把记录列表转换回可JSON序列化的字典列表"""
+    return [repo.to_dict() if isinstance(repo, RepoRecord) else repo for repo in repositories]
+
+
+def sort_by_stars(records, reverse=True):
+    """按整数星数排序（不再按字符串比较）"""
+    return sorted(records, key=attrgetter("stars"), reverse=reverse)
+
+
+def load_records(filename="github_trending_data.json"):
+    """读取JSON数据文件，返回 (时间戳, 记录列表)"""
+    with open(filename, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("timestamp"), records_from_dicts(data.get("repositories", []))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+趋势历史静态站点生成器（增量）
+每天一个页面、每个仓库一个页面，加一个索引页；
+依赖清单记录 "日期 -> 仓库" 和 "仓库 -> 上榜记录"，每次只重建最新快照影响到的页面
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+from html import escape
+
+from output_writer import content_hash, write_if_changed
+from repo_record import records_from_dicts
+
+DEFAULT_SITE_DIR = "site"
+MANIFEST_FILENAME = ".manifest.json"
+
+PAGE_HEADER = (
+    "<!DOCTYPE html>\n<html lang=\"zh\">\n<head>\n<meta charset=\"utf-8\">\n"
+    "<title>{title}</title>\n</head>\n<body>\n"
+    "<p><a href=\"{root}index.html\">GitHub Trending 归档</a></p>\n"
+    "<h1>{title}</h1>\n"
+).format
+PAGE_FOOTER = "</body>\n</html>\n"
+
+INDEX_ROW = "<li><a href=\"days/{date}.html\">{date}</a> ({count} 个仓库)</li>\n".format
+DAY_ROW = (
+    "<tr><td>{rank}</td><td><a href=\"../repos/{path}\">{name}</a></td>"
+    "<td>{desc}</td><td>{stars}</td></tr>\n"
+).format
+REPO_ROW = "<tr><td><a href=\"../../days/{date}.html\">{date}</a></td><td>{rank}</td><td>{stars}</td></tr>\n".format
+
+
+def repo_page_path(key):
+    """仓库页面相对 repos/ 的路径（owner/repo.html）"""
+    return f"{key}.html"
+
+
+def load_manifest(site_dir=DEFAULT_SITE_DIR):
+    """读取依赖清单"""
+    try:
+        with open(os.path.join(site_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"days": {}, "repos": {}}
+    manifest.setdefault("days", {})
+    manifest.setdefault("repos", {})
+    return manifest
+
+
+def render_index(manifest):
+    """索引页：按日期倒序列出所有归档日"""
+    parts = [PAGE_HEADER(title="GitHub Trending (AI/LLM/Agent相关) 归档", root="")]
+    parts.append("<ul>\n")
+    for date in sorted(manifest["days"], reverse=True):
+        parts.append(INDEX_ROW(date=date, count=len(manifest["days"][date]["repos"])))
+    parts.append("</ul>\n")
+    parts.append(PAGE_FOOTER)
+    return "".join(parts)
+
+
+def render_day(date, records):
+    """某一天的趋势页面"""
+    parts = [PAGE_HEADER(title=f"GitHub Trending (AI/LLM/Agent相关) - {date}", root="../")]
+    parts.append("<table>\n<tr><th>#</th><th>仓库名称</th><th>描述（功能）</th><th>星数</th></tr>\n")
+    for rank, record in enumerate(records, 1):
+        parts.append(DAY_ROW(
+            rank=rank,
+            path=escape(repo_page_path(record.key)),
+            name=escape(record.name),
+            desc=escape(record.description),
+            stars=record.stars,
+        ))
+    parts.append("</table>\n")
+    parts.append(PAGE_FOOTER)
+    return "".join(parts)
+
+
+def render_repo(entry):
+    """单个仓库的上榜历史页面"""
+    parts = [PAGE_HEADER(title=escape(entry["name"]), root="../../")]
+    parts.append(f"<p><a href=\"{escape(entry['url'])}\">{escape(entry['url'])}</a></p>\n")
+    parts.append(f"<p>{escape(entry['description'])}</p>\n")
+    parts.append("<table>\n<tr><th>日期</th><th>排名</th><th>星数</th></tr>\n")
+    for date, rank, stars in sorted(entry["appearances"], reverse=True):
+        parts.append(REPO_ROW(date=date, rank=rank, stars=stars))
+    parts.append("</table>\n")
+    parts.append(PAGE_FOOTER)
+    return "".join(parts)
+
+
+def _write_page(site_dir, relative_path, content):
+    path = os.path.join(site_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return write_if_changed(path, content)
+
+
+def update_site(repositories, timestamp=None, site_dir=DEFAULT_SITE_DIR):
+    """用一次快照增量更新站点，返回实际重写的页面数"""
+    if timestamp is None:
+        timestamp = datetime.now()
+    elif isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    date = timestamp.strftime("%Y-%m-%d")
+
+    records = records_from_dicts(repositories)
+    manifest = load_manifest(site_dir)
+    snapshot_hash = content_hash("\n".join(f"{r.key}\t{r.stars}\t{r.description}" for r in records))
+
+    previous = manifest["days"].get(date)
+    if previous and previous["hash"] == snapshot_hash:
+        return 0
+
+    # 同一天的新快照替换旧快照：先移除旧的上榜记录
+    affected = set(previous["repos"]) if previous else set()
+    for key in affected:
+        entry = manifest["repos"].get(key)
+        if entry:
+            entry["appearances"] = [a for a in entry["appearances"] if a[0] != date]
+
+    for rank, record in enumerate(records, 1):
+        entry = manifest["repos"].setdefault(record.key, {"appearances": []})
+        entry["name"] = record.name
+        entry["url"] = record.url
+        entry["description"] = record.description
+        entry["appearances"].append([date, rank, record.stars])
+        affected.add(record.key)
+
+    manifest["days"][date] = {"hash": snapshot_hash, "repos": [r.key for r in records]}
+
+    written = 0
+    written += _write_page(site_dir, f"days/{date}.html", render_day(date, records))
+    for key in sorted(affected):
+        entry = manifest["repos"][key]
+        if not entry["appearances"]:
+            # 该仓库已不在任何一天的快照里
+            del manifest["repos"][key]
+            try:
+                os.remove(os.path.join(site_dir, "repos", repo_page_path(key)))
+            except FileNotFoundError:
+                pass
+            continue
+        written += _write_page(site_dir, os.path.join("repos", repo_page_path(key)), render_repo(entry))
+    written += _write_page(site_dir, "index.html", render_index(manifest))
+
+    write_if_changed(
+        os.path.join(site_dir, MANIFEST_FILENAME),
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    )
+    return written
+
+
+def main():
+    """从Git历史回填整个站点"""
+    from history_export import iter_git_snapshots
+
+    site_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SITE_DIR
+    pages = 0
+    for data in iter_git_snapshots():
+        pages += update_site(data.get("repositories", []), data["timestamp"], site_dir)
+    print(f"✅ 站点已生成到 {site_dir}（写入 {pages} 个页面）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,12 +8,15 @@ import os
 import requests
 import sys
 
+# 可指向本地模拟服务（python3 fake_telegram.py）离线测试
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+
 
 def test_bot_token(bot_token):
     """测试 Bot Token 是否有效"""
     print("🔍 测试 Bot Token...")
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/getMe"
+    api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getMe"
     
     try:
         response = requests.get(api_url, timeout=10)
@@ -40,7 +43,7 @@ def test_chat_id(bot_token, chat_id):
     """测试 Chat ID 是否有效"""
     print(f"\n🔍 测试 Chat ID ({chat_id})...")
     
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage"
     
     payload = {
         "chat_id": chat_id,
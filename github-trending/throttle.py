@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+昂贵命令的限流
+每个用户、每个聊天各一个令牌桶（容量 burst，每 refill_seconds 秒补充一个令牌），两个桶都有令牌时才放行；
+PipelineSlots 限制同时运行的完整流水线数量。被限流的调用不排队，由调用方直接回复缓存的结果
+"""
+
+import time
+from collections import OrderedDict
+
+# 满的桶与不存在的桶等价，超过这个数量时清理
+MAX_TRACKED_KEYS = 10000
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity, now):
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, capacity, refill_seconds, now):
+        self.tokens = min(float(capacity), self.tokens + (now - self.updated) / refill_seconds)
+        self.updated = now
+
+
+class KeyedBuckets:
+    """按键（用户ID/聊天ID）分配的令牌桶；burst 为 0 表示不限制"""
+
+    def __init__(self, burst, refill_seconds, max_keys=MAX_TRACKED_KEYS):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(self.burst, self.refill_seconds, now)
+        return bucket
+
+    def _prune(self, now):
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            bucket.refill(self.burst, self.refill_seconds, now)
+            if bucket.tokens >= self.burst:
+                del self._buckets[key]
+        # 仍然太多时丢弃最久未用的
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def wait_time(self, key, now):
+        """还需等待多少秒才有一个令牌（0 表示现在就有）"""
+        if not self.burst or key is None:
+            return 0.0
+        bucket = self._bucket(key, now)
+        return max(0.0, (1 - bucket.tokens) * self.refill_seconds)
+
+    def take(self, key, now):
+        if self.burst and key is not None:
+            self._bucket(key, now).tokens -= 1
+
+
+class Throttle:
+    """用户桶 + 聊天桶"""
+
+    def __init__(self, user_burst, user_refill_seconds, chat_burst, chat_refill_seconds):
+        self.users = KeyedBuckets(user_burst, user_refill_seconds)
+        self.chats = KeyedBuckets(chat_burst, chat_refill_seconds)
+
+    def configure(self, user_burst, user_refill_seconds, chat_burst, chat_refill_seconds):
+        """配置热加载时调整参数，已有的桶保留当前令牌"""
+        self.users.burst, self.users.refill_seconds = user_burst, user_refill_seconds
+        self.chats.burst, self.chats.refill_seconds = chat_burst, chat_refill_seconds
+
+    def acquire(self, user_id, chat_id, now=None):
+        """两个桶都有令牌时各取一个并返回 None，否则不取令牌，返回需要等待的秒数"""
+        now = time.monotonic() if now is None else now
+        wait = max(self.users.wait_time(user_id, now), self.chats.wait_time(chat_id, now))
+        if wait > 0:
+            return wait
+        self.users.take(user_id, now)
+        self.chats.take(chat_id, now)
+        return None
+
+
+class PipelineSlots:
+    """同时运行的重量级流水线数量上限（单个事件循环内使用，不需要锁）；limit 为 0 表示不限制"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self):
+        if self.limit and self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+轻量级基于 span 的链路追踪
+span() 为每个流水线阶段生成带 trace_id/span_id 的 span，记录耗时、属性和状态；
+trace_event() 取代原来的 print 诊断：控制台照常输出，同时作为事件挂到当前 span 上。
+结束的 span 以 JSON 行的形式经 QueueHandler 交给后台线程写出（不阻塞调用方），
+可选的 OTLP/HTTP（JSON 编码）导出器把 span 批量发送到本地 collector
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+import requests
+
+SERVICE_NAME = "github-trending"
+OTLP_BATCH_SIZE = 64
+OTLP_FLUSH_INTERVAL = 5.0
+
+logger = logging.getLogger("trending.trace")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+
+_current_span = contextvars.ContextVar("trending_current_span", default=None)
+_listener = None
+_console = True
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """一次操作的耗时、属性和事件"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "events", "start_ns", "end_ns", "status", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, message, **attributes):
+        self.events.append({"time_ns": time.time_ns(), "message": message, "attributes": attributes})
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "type": "span",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id():
+    span_obj = _current_span.get()
+    return span_obj.trace_id if span_obj else None
+
+
+@contextmanager
+def span(name, trace_id=None, **attributes):
+    """开始一个 span（同步和异步代码都可用）；trace_id 用于把跨进程的任务接到同一条链路上"""
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else _new_id(16)
+    parent_id = parent.span_id if parent and parent.trace_id == trace_id else None
+    span_obj = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(span_obj)
+    try:
+        yield span_obj
+    except BaseException as e:
+        span_obj.status = "error"
+        span_obj.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span_obj.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _emit(span_obj.to_dict())
+
+
+def trace_event(message, **attributes):
+    """输出诊断信息：打印到控制台（可关闭），并记录到当前 span"""
+    if _console:
+        print(message)
+    span_obj = _current_span.get()
+    if span_obj is not None:
+        span_obj.event(message, **attributes)
+    elif _listener is not None:
+        _emit({"type": "event", "time_ns": time.time_ns(), "message": message, "attributes": attributes})
+
+
+def _emit(record):
+    if _listener is not None:
+        logger.info(record)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """保留原始 dict，由后台线程中的各个 handler 自行格式化"""
+
+    def prepare(self, record):
+        return record
+
+
+class JSONLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp_span(record):
+    """把 span 记录转换为 OTLP/JSON 的 Span 对象"""
+    otlp = {
+        "traceId": record["trace_id"],
+        "spanId": record["span_id"],
+        "name": record["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(record["start_ns"]),
+        "endTimeUnixNano": str(record["end_ns"]),
+        "attributes": _otlp_attributes(record["attributes"]),
+        "events": [
+            {"timeUnixNano": str(e["time_ns"]), "name": e["message"], "attributes": _otlp_attributes(e["attributes"])}
+            for e in record["events"]
+        ],
+        "status": {"code": 2, "message": record["error"]} if record["status"] == "error" else {"code": 1},
+    }
+    if record["parent_id"]:
+        otlp["parentSpanId"] = record["parent_id"]
+    return otlp
+
+
+class OTLPExporter(logging.Handler):
+    """批量把 span 以 OTLP/HTTP JSON 发送到 collector（例如 http://localhost:4318）"""
+
+    def __init__(self, endpoint, service_name=SERVICE_NAME, batch_size=OTLP_BATCH_SIZE, flush_interval=OTLP_FLUSH_INTERVAL):
+        super().__init__()
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session = requests.Session()
+        self._batch = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        if not isinstance(record.msg, dict) or record.msg.get("type") != "span":
+            return
+        self._batch.append(to_otlp_span(record.msg))
+        if len(self._batch) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": logger.name}, "spans": batch}],
+            }]
+        }
+        try:
+            self.session.post(self.url, json=payload, timeout=5).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # 导出失败不能影响流水线，丢弃这一批
+            trace_event(f"⚠️  OTLP 导出失败（丢弃 {len(batch)} 个 span）: {e}", dropped=len(batch), error=str(e))
+
+
+def setup_tracing(trace_file=None, otlp_endpoint=None, console=True, service_name=SERVICE_NAME):
+    """配置输出：JSON 行文件和/或 OTLP collector；两者都未配置时只保留控制台输出"""
+    global _listener, _console
+    shutdown_tracing()
+    _console = console
+
+    handlers = []
+    if trace_file:
+        os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+        file_handler = logging.FileHandler(trace_file, encoding="utf-8")
+        file_handler.setFormatter(JSONLineFormatter())
+        handlers.append(file_handler)
+    if otlp_endpoint:
+        handlers.append(OTLPExporter(otlp_endpoint, service_name))
+    if not handlers:
+        return
+
+    record_queue = queue.SimpleQueue()
+    logger.addHandler(_RecordQueueHandler(record_queue))
+    _listener = QueueListener(record_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_tracing():
+    """停止后台线程并刷新所有 handler（进程退出时自动调用）"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+        handler.close()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+def wrap_context(func):
+    """让提交到线程池的函数继承当前 span（线程池默认不复制 contextvars）"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+atexit.register(shutdown_tracing)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Trending 页面解析
+把 HTML 解析为 RepoRecord 列表。只依赖 BeautifulSoup 和几个小模块，
+解析进程池的子进程只导入本模块，不会加载抓取器、Telegram 等命令行脚本的其余部分
+"""
+
+import re
+
+from bs4 import BeautifulSoup
+
+from page_trim import trim_repo_list
+from repo_record import RepoRecord, parse_count
+from tracing import trace_event
+
+
+def parse_repositories(html_content, trim=True):
+    """解析HTML内容，提取仓库信息（默认先裁剪出仓库列表片段再解析）"""
+    if trim:
+        html_content = trim_repo_list(html_content)
+    # 裁剪后的片段不含 <meta charset>，显式指定编码
+    from_encoding = "utf-8" if isinstance(html_content, bytes) else None
+    soup = BeautifulSoup(html_content, "html.parser", from_encoding=from_encoding)
+    repo_elements = soup.find_all("article", class_="Box-row")
+    
+    repositories = []
+    
+    for repo in repo_elements:
+        info = extract_repository_info(repo)
+        if info:
+            repositories.append(RepoRecord.from_dict(info))
+    
+    return repositories
+
+
+def extract_repository_info(repo_element):
+    """从仓库元素中提取详细信息"""
+    try:
+        # 提取名称和URL
+        h2 = repo_element.find("h2", class_="h3")
+        if not h2:
+            return None
+        
+        a = h2.find("a")
+        if not a:
+            return None
+        
+        name = a.get_text(strip=True).replace(" ", "")
+        url = "https://github.com" + a["href"]
+        
+        # 验证URL
+        if not re.match(r'^https://github\.com/[^/]+/[^/]+$', url):
+            return None
+        
+        # 提取描述
+        description = "N/A"
+        p = repo_element.find("p", class_="col-9")
+        if p:
+            description = p.get_text(strip=True)
+        
+        # 提取星数
+        stars = "0"
+        star_link = repo_element.find("a", href=lambda x: x and "/stargazers" in x)
+        if star_link:
+            stars_text = star_link.get_text(strip=True)
+            stars = stars_text.replace(",", "")
+            if not stars.isdigit():
+                stars = "0"
+        
+        # 提取Fork数
+        forks = "0"
+        fork_link = repo_element.find("a", href=lambda x: x and x.endswith("/forks"))
+        if fork_link:
+            forks = str(parse_count(fork_link.get_text(strip=True)))
+        
+        # 提取今日新增星数（"502 stars today"）
+        stars_today = "0"
+        today_span = repo_element.find("span", class_="float-sm-right")
+        if today_span:
+            stars_today = str(parse_count(today_span.get_text(strip=True)))
+        
+        return {
+            "name": name,
+            "url": url,
+            "description": description,
+            "stars": stars,
+            "forks": forks,
+            "stars_today": stars_today
+        }
+    except Exception as e:
+        trace_event(f"⚠️ 提取仓库信息时出错: {e}")
+        return None
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Webhook 模式的内置异步 HTTP 服务
+Telegram 把更新 POST 到本地端点，校验 secret token、按 update_id 去重后
+直接放入 Application.update_queue，省去长轮询的延迟，也可以在负载均衡后运行多个副本
+"""
+
+import asyncio
+import hmac
+import json
+import signal
+from collections import deque
+
+from telegram import Update
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+async def read_http_request(reader):
+    """读取一个 HTTP/1.1 请求，返回 (方法, 路径, 头部字典, 请求体)，连接关闭时返回 None"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        return None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_SIZE:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def write_http_response(writer, status=200, body=b"", content_type="application/json", headers=None):
+    """写出一个保持连接的 HTTP/1.1 响应"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"{extra}"
+        "Connection: keep-alive\r\n\r\n".encode("latin-1") + body
+    )
+
+
+class UpdateDeduplicator:
+    """记住最近 N 个 update_id，过滤 Telegram 重试造成的重复投递"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._order = deque()
+        self._seen = set()
+
+    def is_duplicate(self, update_id):
+        if update_id in self._seen:
+            return True
+        self._seen.add(update_id)
+        self._order.append(update_id)
+        if len(self._order) > self.capacity:
+            self._seen.discard(self._order.popleft())
+        return False
+
+
+class WebhookServer:
+    """接收 Telegram webhook 请求并投递到 Application"""
+
+    def __init__(self, application, path="/telegram", secret_token=None):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.dedup = UpdateDeduplicator()
+        self.stats = {"accepted": 0, "duplicates": 0, "rejected": 0}
+        self._server = None
+
+    async def start(self, host="0.0.0.0", port=8443):
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_http_request(reader)
+                except ValueError:
+                    write_http_response(writer, 413, b"{}")
+                    break
+                if request is None:
+                    break
+                status = await self._handle_request(*request)
+                write_http_response(writer, status, b"{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, method, path, headers, body):
+        if path.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret_token and not hmac.compare_digest(
+            headers.get(SECRET_HEADER, "").encode("utf-8"), self.secret_token.encode("utf-8")
+        ):
+            self.stats["rejected"] += 1
+            return 403
+
+        try:
+            data = json.loads(body)
+            update_id = data["update_id"]
+        except (ValueError, KeyError, TypeError):
+            return 400
+
+        # 重复投递也返回 200，否则 Telegram 会继续重试
+        if self.dedup.is_duplicate(update_id):
+            self.stats["duplicates"] += 1
+            return 200
+
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+        self.stats["accepted"] += 1
+        return 200
+
+
+async def run_webhook(application, webhook_url, listen="0.0.0.0", port=8443, path="/telegram", secret_token=None):
+    """以 webhook 模式运行 Application，直到收到 SIGINT/SIGTERM"""
+    server = WebhookServer(application, path=path, secret_token=secret_token)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    # 与 run_polling 一样在启动前后调用 post_init / post_shutdown 钩子
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start(listen, port)
+    if webhook_url:
+        await application.bot.set_webhook(
+            url=webhook_url.rstrip("/") + path,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES
+        )
+    print(f"🌐 Webhook server listening on {listen}:{port}{path}")
+
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)